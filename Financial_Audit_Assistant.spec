@@ -8,7 +8,27 @@ a = Analysis(
     binaries=[],
     datas=[
         ('sector_data.py', '.'),
+        ('sector_catalog.py', '.'),
+        ('sectors', 'sectors'),
         ('pdf_generator.py', '.'),
+        ('report_cache.py', '.'),
+        ('pdf_jobs.py', '.'),
+        ('artifact_store.py', '.'),
+        ('report_downloads.py', '.'),
+        ('instrumentation.py', '.'),
+        ('team_roster.py', '.'),
+        ('allocation.py', '.'),
+        ('scheduler.py', '.'),
+        ('engagement_store.py', '.'),
+        ('ledger_ingest.py', '.'),
+        ('je_tests.py', '.'),
+        ('duplicate_payments.py', '.'),
+        ('sampling.py', '.'),
+        ('risk_dashboard.py', '.'),
+        ('data_sources.py', '.'),
+        ('analytical_review.py', '.'),
+        ('related_parties.py', '.'),
+        ('planning.py', '.'),
         ('requirements.txt', '.')
     ],
     hiddenimports=[
@@ -34,6 +54,11 @@ a = Analysis(
         'grpcio',
         'altair',
         'pyarrow',
+        'pyarrow.compute',
+        'pyarrow.csv',
+        'pyarrow.ipc',
+        'pyarrow.parquet',
+        'sqlite3',
         'markdown',
         'tornado',
         'werkzeug',
@@ -0,0 +1,98 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Release build tuned for launch time:
+#   pyinstaller Financial_Audit_Assistant_release.spec
+# produces dist/Financial_Audit_Assistant/Financial_Audit_Assistant.exe
+# (one-dir: nothing is unpacked to a temp dir on launch). The debug one-file
+# build stays in Financial_Audit_Assistant.spec.
+from PyInstaller.utils.hooks import collect_data_files, copy_metadata
+
+block_cipher = None
+
+# Modules imported by app.py. They are bundled as compiled bytecode in the
+# archive instead of .py data files that would be compiled on every launch.
+APP_MODULES = [
+    'allocation',
+    'analytical_review',
+    'artifact_store',
+    'data_sources',
+    'duplicate_payments',
+    'engagement_store',
+    'instrumentation',
+    'je_tests',
+    'ledger_ingest',
+    'pdf_generator',
+    'pdf_jobs',
+    'planning',
+    'related_parties',
+    'report_cache',
+    'report_downloads',
+    'risk_dashboard',
+    'sampling',
+    'scheduler',
+    'sector_catalog',
+    'sector_data',
+    'team_roster',
+]
+
+a = Analysis(
+    ['launcher.py'],
+    pathex=[],
+    binaries=[],
+    datas=[
+        ('app.py', '.'),
+        ('sectors', 'sectors'),
+    ] + collect_data_files('streamlit') + copy_metadata('streamlit'),
+    hiddenimports=APP_MODULES + [
+        'streamlit.web.cli',
+        'streamlit.runtime.scriptrunner.magic_funcs',
+    ],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    # Installed alongside streamlit but never used by the app
+    excludes=[
+        'plotly',
+        'pydeck',
+        'git',
+        'matplotlib',
+        'scipy',
+        'IPython',
+        'tkinter',
+        'pytest',
+    ],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='Financial_Audit_Assistant',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    # UPX-compressed DLLs have to be decompressed on every launch
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    name='Financial_Audit_Assistant',
+)
@@ -0,0 +1,119 @@
+"""Vectorized staff and hours allocation across risk levels.
+
+Each risk level's share of the team is its severity weight (the
+``Severity Weight`` entry of ``RISK_ASSESSMENT_CRITERIA``) times the number
+of risks the sector lists at that level. Staff are apportioned with the
+largest-remainder method, so every team member is assigned. Every level
+that has risks gets at least one person whenever the team is large enough.
+
+All functions work on whole arrays. ``allocate_batch`` solves thousands of
+engagements in one call, and ``allocate_team`` is the single-engagement
+convenience used by the planning page.
+"""
+import datetime
+
+import numpy as np
+
+RISK_LEVELS = ("High", "Medium", "Low")
+TEAM_KEYS = ("high_risk", "medium_risk", "low_risk")
+DEFAULT_WEIGHTS = {"High": 5.0, "Medium": 3.0, "Low": 1.0}
+WEIGHT_CRITERION = "Severity Weight"
+HOURS_PER_DAY = 8.0
+
+
+def level_weights(risk_criteria=None):
+    """Return the High/Medium/Low severity weights as an array."""
+    weights = []
+    for level in RISK_LEVELS:
+        criteria = (risk_criteria or {}).get(level, {})
+        weights.append(float(criteria.get(WEIGHT_CRITERION, DEFAULT_WEIGHTS[level])))
+    return np.asarray(weights)
+
+
+def apportion(totals, scores):
+    """Split integer ``totals`` across columns in proportion to ``scores``.
+
+    ``totals`` has shape ``(n,)`` and ``scores`` has shape ``(n, k)``. Every
+    column with a positive score first receives one unit when the row's total
+    covers all of them. The remainder is apportioned by largest remainder.
+    Each row of the result sums exactly to its total.
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    scores = np.asarray(scores, dtype=float)
+    active = scores > 0
+    active_count = active.sum(axis=1)
+    # Rows with no scored levels fall back to an even split.
+    scores = np.where(active_count[:, None] == 0, 1.0, scores)
+    active = np.where(active_count[:, None] == 0, True, active)
+    active_count = active.sum(axis=1)
+
+    base = (active & (totals >= active_count)[:, None]).astype(np.int64)
+    rest = totals - base.sum(axis=1)
+    shares = scores / scores.sum(axis=1, keepdims=True)
+    quotas = shares * rest[:, None]
+    floors = np.floor(quotas).astype(np.int64)
+    leftover = rest - floors.sum(axis=1)
+
+    # Rank each row's fractional parts (ties go to the more severe level).
+    fractions = quotas - floors
+    order = np.argsort(-fractions, axis=1, kind="stable")
+    ranks = np.argsort(order, axis=1)
+    return base + floors + (ranks < leftover[:, None])
+
+
+def available_hours(start_dates, end_dates, hours_per_day=HOURS_PER_DAY):
+    """Return the working hours per person between inclusive date ranges."""
+    start = np.asarray(start_dates, dtype="datetime64[D]")
+    end = np.asarray(end_dates, dtype="datetime64[D]") + np.timedelta64(1, "D")
+    days = np.busday_count(start, np.maximum(start, end))
+    return days * float(hours_per_day)
+
+
+def allocate_batch(team_sizes, risk_counts, hours_per_person=None, weights=None):
+    """Allocate staff and hours for many engagements at once.
+
+    ``team_sizes`` has shape ``(n,)``. ``risk_counts`` has shape ``(n, 3)`` and
+    holds the number of High, Medium and Low risks per engagement.
+    ``hours_per_person`` has shape ``(n,)`` and defaults to zero. Returns a
+    dict of ``(n, 3)`` arrays: ``staff``, ``hours`` and ``hours_per_risk``.
+    """
+    team_sizes = np.asarray(team_sizes, dtype=np.int64)
+    risk_counts = np.asarray(risk_counts, dtype=float).reshape(len(team_sizes), len(RISK_LEVELS))
+    weights = level_weights() if weights is None else np.asarray(weights, dtype=float)
+    if hours_per_person is None:
+        hours_per_person = np.zeros(len(team_sizes))
+    hours_per_person = np.asarray(hours_per_person, dtype=float)
+
+    staff = apportion(team_sizes, risk_counts * weights[None, :])
+    hours = staff * hours_per_person[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hours_per_risk = np.where(risk_counts > 0, hours / risk_counts, 0.0)
+    return {"staff": staff, "hours": hours, "hours_per_risk": hours_per_risk}
+
+
+def allocate_team(team_size, risks, audit_start_date=None, audit_end_date=None, risk_criteria=None):
+    """Allocate one engagement's team across its sector's risk levels.
+
+    ``risks`` maps ``High``/``Medium``/``Low`` to the sector's risk lists.
+    Returns ``{team_key: {"staff", "hours", "hours_per_risk"}}`` ready for the
+    ``resource_allocation`` section of an ``audit_plan``.
+    """
+    counts = [[len(risks.get(level, ())) for level in RISK_LEVELS]]
+    hours = None
+    if audit_start_date is not None and audit_end_date is not None:
+        hours = available_hours([_as_date(audit_start_date)], [_as_date(audit_end_date)])
+    result = allocate_batch([team_size], counts, hours, level_weights(risk_criteria))
+    return {
+        key: {
+            "staff": int(result["staff"][0, index]),
+            "hours": float(result["hours"][0, index]),
+            "hours_per_risk": float(result["hours_per_risk"][0, index]),
+        }
+        for index, key in enumerate(TEAM_KEYS)
+    }
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
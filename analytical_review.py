@@ -0,0 +1,528 @@
+"""Analytical review and materiality over multi-entity, multi-year trial balances.
+
+Usage:
+    python analytical_review.py tb_2023.csv tb_2024.csv --json review.json
+    python analytical_review.py group_tb.parquet --column balance="Closing Bal"
+
+Trial balances (CSV, Excel or Parquet) are stacked into one long table with a
+row per entity, account and fiscal year. Balances are signed the trial
+balance way: debits positive, credits negative. The account category (asset,
+liability, equity, revenue, expense) is taken from a category column when
+there is one. Otherwise it is inferred from the first digit of the account
+code, 1-5 in that order, 6-9 expense.
+
+For every entity and year the review computes:
+- overall materiality from profit before tax, or revenue when there is no
+  profit, or total assets when there is no revenue; performance materiality
+  and the clearly trivial threshold follow from it
+- net margin, expense ratio, return on assets, asset turnover and debt to
+  equity
+- each account's change from the prior year and from budget
+
+All of it is whole-column pandas/NumPy work: group sums, pivots, shifts and
+merges, with no loop over accounts. A variance is flagged when it is at least
+``VARIANCE_MIN_PCT`` of the comparison amount and reaches the entity's
+performance materiality or the lowest positive ``Financial Impact
+Threshold`` band, whichever is lower. Its level is the band its amount falls
+in.
+
+Results are cached per dataset hash and review options, so a rerun over the
+same files does not recompute anything.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_sources import ResultCache, dataset_hash, match_columns, normalize_header
+from planning import DEFAULT_IMPACT_THRESHOLDS, FINDING_LEVELS, IMPACT_CRITERION, make_finding
+
+SOURCE = "Analytical review"
+CATEGORIES = ("asset", "liability", "equity", "revenue", "expense")
+# Leading digit of the account code -> category, for charts of accounts
+# without a category column
+DIGIT_CATEGORIES = {"1": "asset", "2": "liability", "3": "equity", "4": "revenue",
+                    "5": "expense", "6": "expense", "7": "expense", "8": "expense", "9": "expense"}
+CATEGORY_ALIASES = {
+    "asset": ("asset", "assets", "current_asset", "current_assets", "non_current_assets", "fixed_assets"),
+    "liability": ("liability", "liabilities", "current_liabilities", "non_current_liabilities"),
+    "equity": ("equity", "capital", "shareholders_equity", "reserves", "retained_earnings"),
+    "revenue": ("revenue", "revenues", "income", "sales", "turnover", "other_income"),
+    "expense": ("expense", "expenses", "cost", "costs", "cost_of_sales", "cogs", "operating_expenses"),
+}
+COLUMN_ALIASES = {
+    "entity": ("entity", "entity_name", "entity_id", "company", "company_code", "company_name",
+               "legal_entity", "subsidiary", "business_unit"),
+    "account": ("account", "account_number", "account_no", "account_code", "account_id", "gl_account", "acct"),
+    "account_name": ("account_name", "account_description", "description", "account_title"),
+    "category": ("category", "account_type", "account_category", "type", "class", "account_class",
+                 "fs_category"),
+    "year": ("year", "fiscal_year", "fy", "financial_year", "period", "period_end", "year_end"),
+    "balance": ("balance", "closing_balance", "ending_balance", "amount", "net_balance", "actual"),
+    "budget": ("budget", "budget_amount", "budget_balance", "plan", "forecast"),
+    "debit": ("debit", "debit_balance", "dr"),
+    "credit": ("credit", "credit_balance", "cr"),
+}
+REQUIRED_COLUMNS = ("account", "year")
+TEXT_FIELDS = ("entity", "account", "account_name", "category")
+DEFAULT_ENTITY = "Entity"
+
+# Overall materiality as a share of each benchmark, in order of preference
+MATERIALITY_BENCHMARKS = (
+    ("profit_before_tax", 0.05),
+    ("revenue", 0.005),
+    ("total_assets", 0.01),
+)
+PERFORMANCE_MATERIALITY = 0.75
+CLEARLY_TRIVIAL = 0.05
+VARIANCE_MIN_PCT = 0.10
+MAX_RISK_ITEMS = 10
+MAX_APPENDIX_ROWS = 500
+APPENDIX_COLUMNS = ("Entity", "Account", "Year", "Balance", "Compared to", "Change", "Change %", "Level")
+APPENDIX_WIDTHS = (78, 110, 36, 72, 72, 72, 48, 44)
+MAX_CACHED_REVIEWS = 8
+
+
+class TrialBalanceError(ValueError):
+    """Raised when a trial balance cannot be read or mapped to the columns."""
+
+
+def resolve_columns(names, column_map=None):
+    """Map review fields (plus ``debit``/``credit``) to source column names.
+
+    ``column_map`` overrides the aliases with explicit ``{field: source}``
+    pairs. Raises ``TrialBalanceError`` when a required field has no column.
+    """
+    resolved = match_columns(names, COLUMN_ALIASES, column_map, TrialBalanceError, "the trial balance")
+    missing = [field for field in REQUIRED_COLUMNS if field not in resolved]
+    if "balance" not in resolved and not ("debit" in resolved or "credit" in resolved):
+        missing.append("balance (or debit/credit)")
+    if missing:
+        raise TrialBalanceError(f"Trial balance is missing required columns: {', '.join(missing)}")
+    return resolved
+
+
+def read_table(source, filename=None, sheet=None, column_map=None):
+    """Read one CSV, Excel or Parquet file (path or binary file object) into a DataFrame.
+
+    CSV text columns (entity, account, names, categories) are kept as
+    strings so account codes keep their leading zeros; amounts are parsed
+    as numbers.
+    """
+    filename = filename or (source if isinstance(source, str) else getattr(source, "name", ""))
+    lowered = filename.lower()
+    if lowered.endswith((".parquet", ".pq")):
+        return pd.read_parquet(source)
+    if lowered.endswith((".xlsx", ".xlsm")):
+        try:
+            return pd.read_excel(source, sheet_name=sheet or 0)
+        except ImportError:
+            raise TrialBalanceError("Reading Excel trial balances requires openpyxl (pip install openpyxl)") from None
+    if lowered.endswith((".csv", ".txt", ".tsv")):
+        separator = "\t" if lowered.endswith(".tsv") else ","
+        start = None if isinstance(source, (str, os.PathLike)) else source.tell()
+        header = list(pd.read_csv(source, sep=separator, nrows=0).columns)
+        if start is not None:
+            source.seek(start)
+        columns = resolve_columns(header, column_map)
+        text = {columns[field] for field in TEXT_FIELDS if field in columns}
+        return pd.read_csv(source, sep=separator, dtype={name: str for name in text})
+    raise TrialBalanceError(f"Unsupported trial balance file type: {filename}")
+
+
+def normalize_trial_balance(frame, column_map=None):
+    """Return ``frame`` as the review's long table.
+
+    Columns: ``entity``, ``account``, ``account_name``, ``category``,
+    ``year`` (int), ``balance`` and ``budget`` (float, NaN when absent). Rows
+    for the same entity, account and year are summed.
+    """
+    columns = resolve_columns(list(frame.columns), column_map)
+
+    def text(field, default=""):
+        if field not in columns:
+            return pd.Series(default, index=frame.index, dtype=object)
+        return frame[columns[field]].astype("string").str.strip().fillna(default).astype(object)
+
+    def number(field):
+        if field not in columns:
+            return pd.Series(np.nan, index=frame.index)
+        values = frame[columns[field]]
+        if values.dtype == object or pd.api.types.is_string_dtype(values):
+            values = values.astype("string").str.replace(r"[,\s$]", "", regex=True)
+            # Accounting negatives: (1,234.00)
+            values = values.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+        return pd.to_numeric(values, errors="coerce")
+
+    if "balance" in columns:
+        balance = number("balance").fillna(0.0)
+    else:
+        balance = number("debit").fillna(0.0) - number("credit").fillna(0.0)
+    table = pd.DataFrame({
+        "entity": text("entity", DEFAULT_ENTITY),
+        "account": text("account"),
+        "account_name": text("account_name"),
+        "category": _categories(text("category"), text("account")),
+        "year": _years(frame[columns["year"]]),
+        "balance": balance.astype(float),
+        "budget": number("budget").astype(float),
+    })
+    table = table[(table["account"] != "") & table["year"].notna()]
+    return _combine(table.astype({"year": int}))
+
+
+def _combine(table):
+    """Sum rows that share an entity, account and year."""
+    grouped = table.groupby(["entity", "account", "year"], sort=True)
+    combined = grouped[["account_name", "category"]].first()
+    combined["balance"] = grouped["balance"].sum()
+    # A budget stays NaN unless at least one row has one
+    combined["budget"] = grouped["budget"].sum(min_count=1)
+    return combined.reset_index()
+
+
+def _map_distinct(values, convert):
+    """Apply ``convert`` to each distinct value of ``values`` and broadcast the results back."""
+    codes, distinct = pd.factorize(values, use_na_sentinel=False)
+    return pd.Series(np.asarray(convert(pd.Series(distinct)), dtype=object)[codes], index=values.index)
+
+
+def _categories(category, account):
+    lookup = {alias: name for name, aliases in CATEGORY_ALIASES.items() for alias in aliases}
+    lookup.update({name: name for name in CATEGORIES})
+    named = _map_distinct(category, lambda names: names.map(normalize_header).map(lookup))
+    from_code = _map_distinct(account, lambda codes: codes.str[:1].map(DIGIT_CATEGORIES))
+    return named.fillna(from_code).fillna("other")
+
+
+def _parse_years(values):
+    numeric = pd.to_numeric(values, errors="coerce")
+    plain_year = numeric.notna() & (numeric >= 1900) & (numeric <= 2999)
+    if plain_year.all():
+        return numeric
+    dated = pd.to_datetime(values.where(~plain_year), errors="coerce", format="mixed").dt.year
+    return numeric.where(plain_year).fillna(dated)
+
+
+def _years(values):
+    # A trial balance has a handful of distinct periods, so parse each once
+    return pd.to_numeric(_map_distinct(values, _parse_years))
+
+
+def load_trial_balances(sources, column_map=None):
+    """Read and stack trial balances from ``sources`` (paths or file objects)."""
+    frames = [normalize_trial_balance(read_table(source, column_map=column_map), column_map)
+              for source in sources]
+    if not frames:
+        raise TrialBalanceError("No trial balance files were given")
+    if len(frames) == 1:
+        return frames[0]
+    # The same account and year may come from more than one file (e.g. an
+    # actuals file and a budget file); combine them.
+    return _combine(pd.concat(frames, ignore_index=True))
+
+
+def category_totals(table):
+    """Return one row per entity and year with reporting-sign category totals.
+
+    Credit-natured categories (liability, equity, revenue) are flipped to
+    positive, so ``profit_before_tax`` is revenue less expenses.
+    """
+    totals = table.pivot_table(index=["entity", "year"], columns="category", values="balance",
+                               aggfunc="sum", fill_value=0.0)
+    totals = totals.reindex(columns=list(CATEGORIES), fill_value=0.0)
+    totals[["liability", "equity", "revenue"]] *= -1
+    totals = totals.rename(columns={"asset": "total_assets", "liability": "total_liabilities",
+                                    "equity": "total_equity", "expense": "expenses"})
+    totals["profit_before_tax"] = totals["revenue"] - totals["expenses"]
+    totals.columns.name = None
+    return totals.reset_index()
+
+
+def materiality(totals):
+    """Return overall, performance and clearly trivial materiality per entity and year.
+
+    The first benchmark of ``MATERIALITY_BENCHMARKS`` that is positive is
+    used.
+    """
+    conditions = [totals[name] > 0 for name, _ in MATERIALITY_BENCHMARKS]
+    basis = np.select(conditions, [name for name, _ in MATERIALITY_BENCHMARKS], default="none")
+    benchmark = np.select(conditions, [totals[name] for name, _ in MATERIALITY_BENCHMARKS], default=0.0)
+    rate = np.select(conditions, [share for _, share in MATERIALITY_BENCHMARKS], default=0.0)
+    overall = benchmark * rate
+    return pd.DataFrame({
+        "entity": totals["entity"],
+        "year": totals["year"],
+        "basis": basis,
+        "benchmark": benchmark,
+        "overall": overall,
+        "performance": overall * PERFORMANCE_MATERIALITY,
+        "clearly_trivial": overall * CLEARLY_TRIVIAL,
+    })
+
+
+def _ratio(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    result = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def key_ratios(totals):
+    """Return key financial ratios per entity and year (NaN when undefined)."""
+    return pd.DataFrame({
+        "entity": totals["entity"],
+        "year": totals["year"],
+        "net_margin": _ratio(totals["profit_before_tax"], totals["revenue"]),
+        "expense_ratio": _ratio(totals["expenses"], totals["revenue"]),
+        "return_on_assets": _ratio(totals["profit_before_tax"], totals["total_assets"]),
+        "asset_turnover": _ratio(totals["revenue"], totals["total_assets"]),
+        "debt_to_equity": _ratio(totals["total_liabilities"], totals["total_equity"]),
+    })
+
+
+def impact_bands(risk_criteria=None):
+    """Return ``(levels, lower bounds)`` of the financial-impact bands, highest first."""
+    bounds = [
+        float((risk_criteria or {}).get(level, {}).get(IMPACT_CRITERION, DEFAULT_IMPACT_THRESHOLDS[level]))
+        for level in FINDING_LEVELS
+    ]
+    return list(FINDING_LEVELS), np.array(bounds)
+
+
+def variances(table, materiality_table, risk_criteria=None, min_pct=VARIANCE_MIN_PCT):
+    """Return every account-year with its prior-year and budget variances and flags.
+
+    ``yoy_flagged``/``budget_flagged`` mark variances over the flag
+    threshold, and ``yoy_level``/``budget_level`` give their impact band.
+    """
+    table = table.sort_values(["entity", "account", "year"], kind="stable")
+    by_account = table.groupby(["entity", "account"], sort=False)
+    prior_year = by_account["year"].shift()
+    prior = by_account["balance"].shift().where(prior_year == table["year"] - 1)
+    result = table.assign(
+        prior=prior,
+        yoy_change=table["balance"] - prior,
+        yoy_pct=_ratio(table["balance"] - prior, prior.abs()),
+        budget_change=table["balance"] - table["budget"],
+        budget_pct=_ratio(table["balance"] - table["budget"], table["budget"].abs()),
+    )
+    result = result.merge(materiality_table[["entity", "year", "performance"]],
+                          on=["entity", "year"], how="left")
+    levels, bounds = impact_bands(risk_criteria)
+    positive = bounds[bounds > 0]
+    band_floor = positive.min() if len(positive) else np.inf
+    performance = result["performance"].to_numpy()
+    threshold = np.fmin(np.where(performance > 0, performance, np.nan), band_floor)
+    for kind in ("yoy", "budget"):
+        change = result[f"{kind}_change"].abs().to_numpy()
+        pct = result[f"{kind}_pct"].abs().to_numpy()
+        # NaN comparisons are False, so accounts without a comparison never flag
+        # A NaN percentage means the comparison amount was zero
+        flagged = (change >= threshold) & ((pct >= min_pct) | (np.isnan(pct) & (change > 0)))
+        level = np.select([change >= bound for bound in bounds], levels, default=levels[-1])
+        result[f"{kind}_flagged"] = flagged
+        result[f"{kind}_level"] = np.where(flagged, level, None)
+    return result.reset_index(drop=True)
+
+
+def analytical_review(table, risk_criteria=None, min_pct=VARIANCE_MIN_PCT):
+    """Run the review over a normalized table.
+
+    Returns a dict with ``totals``, ``materiality``, ``ratios`` and
+    ``variances`` DataFrames.
+    """
+    totals = category_totals(table)
+    materiality_table = materiality(totals)
+    return {
+        "entities": int(table["entity"].nunique()),
+        "accounts": int(table[["entity", "account"]].drop_duplicates().shape[0]),
+        "years": sorted(int(year) for year in table["year"].unique()),
+        "totals": totals,
+        "materiality": materiality_table,
+        "ratios": key_ratios(totals),
+        "variances": variances(table, materiality_table, risk_criteria, min_pct),
+    }
+
+
+def run_analytical_review(sources, risk_criteria=None, column_map=None, min_pct=VARIANCE_MIN_PCT):
+    """Load ``sources`` and review them, reusing a cached result for the same data.
+
+    File objects are rewound before they are read, so Streamlit uploads can
+    be passed directly.
+    """
+    sources = list(sources)
+    key = (
+        dataset_hash(sources),
+        json.dumps(risk_criteria, sort_keys=True, default=str),
+        json.dumps(column_map, sort_keys=True),
+        min_pct,
+    )
+
+    def build():
+        for source in sources:
+            if hasattr(source, "seek"):
+                source.seek(0)
+        return analytical_review(load_trial_balances(sources, column_map), risk_criteria, min_pct)
+
+    return _cache.get_or_build(key, build)
+
+
+def flagged_variances(review, year=None):
+    """Return flagged variances, largest first, in the latest year unless ``year`` is given.
+
+    Each row is one account and comparison (``prior year`` or ``budget``).
+    """
+    table = review["variances"]
+    if year is None and review["years"]:
+        year = review["years"][-1]
+    table = table[table["year"] == year]
+    parts = []
+    for kind, label in (("yoy", "prior year"), ("budget", "budget")):
+        selected = table[table[f"{kind}_flagged"]]
+        parts.append(pd.DataFrame({
+            "entity": selected["entity"],
+            "account": selected["account"],
+            "account_name": selected["account_name"],
+            "year": selected["year"],
+            "balance": selected["balance"],
+            "comparison": label,
+            "compared_to": selected["prior"] if kind == "yoy" else selected["budget"],
+            "change": selected[f"{kind}_change"],
+            "change_pct": selected[f"{kind}_pct"],
+            "level": selected[f"{kind}_level"],
+        }))
+    flagged = pd.concat(parts, ignore_index=True)
+    order = np.argsort(-flagged["change"].abs().to_numpy(), kind="stable")
+    return flagged.iloc[order].reset_index(drop=True)
+
+
+def _account_label(row, with_entity):
+    label = row.account if not row.account_name else f"{row.account} {row.account_name}"
+    return f"{row.entity}: {label}" if with_entity else label
+
+
+def review_findings(review, risk_criteria=None):
+    """Summarize the latest year's flagged accounts as one plan finding per level.
+
+    An account flagged against both the prior year and the budget counts
+    once, with its largest change, at that change's level.
+    """
+    flagged = flagged_variances(review).drop_duplicates(["entity", "account"])
+    findings = []
+    for level in FINDING_LEVELS:
+        selected = flagged[flagged["level"] == level]
+        if selected.empty:
+            continue
+        accounts = len(selected)
+        findings.append(make_finding(
+            SOURCE,
+            "Account variances above materiality",
+            selected["change"].abs().sum(),
+            accounts,
+            f"{accounts:,} {'account' if accounts == 1 else 'accounts'} moved by at least "
+            f"{VARIANCE_MIN_PCT:.0%} against the prior year or budget and by more than the flag "
+            f"threshold",
+            risk_criteria,
+            level=level
+        ))
+    return findings
+
+
+def review_risks(review, limit=MAX_RISK_ITEMS):
+    """Return ``{level: [risk area, ...]}`` for the largest flagged accounts.
+
+    The items are meant for ``build_audit_plan(added_risks=...)``; each
+    account appears once, at the level of its largest variance.
+    """
+    flagged = flagged_variances(review).drop_duplicates(["entity", "account"])
+    with_entity = review["entities"] > 1
+    risks = {level: [] for level in FINDING_LEVELS}
+    for row in flagged.itertuples(index=False):
+        items = risks[row.level]
+        if len(items) < limit:
+            items.append(
+                f"Account variance: {_account_label(row, with_entity)} "
+                f"({row.change:+,.0f} vs {row.comparison})"
+            )
+    return {level: items for level, items in risks.items() if items}
+
+
+def review_appendix(review, limit=MAX_APPENDIX_ROWS):
+    """Return the latest year's flagged variances as an ``audit_plan`` appendix table."""
+    flagged = flagged_variances(review)
+    rows = [
+        [
+            row.entity,
+            row.account if not row.account_name else f"{row.account} {row.account_name}",
+            str(row.year),
+            f"{row.balance:,.0f}",
+            f"{row.compared_to:,.0f} ({row.comparison})",
+            f"{row.change:+,.0f}",
+            "-" if np.isnan(row.change_pct) else f"{row.change_pct:+.0%}",
+            row.level,
+        ]
+        for row in flagged.head(limit).itertuples(index=False)
+    ]
+    latest = review["materiality"]
+    latest = latest[latest["year"] == (review["years"][-1] if review["years"] else None)]
+    note = "Performance materiality: " + "; ".join(
+        f"{row.entity} {row.performance:,.0f} ({row.basis.replace('_', ' ')})"
+        for row in latest.itertuples(index=False)
+    ) + "."
+    if len(flagged) > limit:
+        note += f" Showing the {limit:,} largest of {len(flagged):,} flagged variances."
+    return {
+        "title": "Analytical Review - Flagged Account Variances",
+        "columns": list(APPENDIX_COLUMNS),
+        "widths": list(APPENDIX_WIDTHS),
+        "rows": rows,
+        "note": note,
+    }
+
+
+_cache = ResultCache(MAX_CACHED_REVIEWS)
+
+
+def clear_cache():
+    """Drop every cached review."""
+    _cache.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analytical review of multi-entity trial balances.")
+    parser.add_argument("sources", nargs="+", help="Trial balance files (CSV, Excel or Parquet)")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=SOURCE",
+                        help="Map a review field to a source column, e.g. balance=\"Closing Bal\"")
+    parser.add_argument("--json", dest="json_path", help="Write materiality, ratios and flagged variances here")
+    args = parser.parse_args(argv)
+
+    column_map = dict(item.split("=", 1) for item in args.column)
+    try:
+        review = run_analytical_review(args.sources, column_map=column_map or None)
+    except (OSError, TrialBalanceError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    flagged = flagged_variances(review)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "materiality": review["materiality"].to_dict("records"),
+                "ratios": review["ratios"].replace({np.nan: None}).to_dict("records"),
+                "flagged": flagged.replace({np.nan: None}).to_dict("records"),
+            }, f, indent=2)
+    print(json.dumps({
+        "entities": review["entities"],
+        "accounts": review["accounts"],
+        "years": review["years"],
+        "flagged": len(flagged),
+    }, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Headless HTTP/JSON API for audit plans and PDF reports.
+
+Usage:
+    python api_server.py --port 8765
+    python api_server.py --host 0.0.0.0 --port 8765 --workers 4 --max-renders 32
+
+Endpoints:
+    GET  /healthz                 liveness and pool status
+    GET  /metrics                 Prometheus text exposition
+    GET  /v1/sectors              sector names
+    GET  /v1/sectors/<name>       one sector template
+    POST /v1/allocation           staff and hours per risk team
+    POST /v1/plans                the ``audit_plan`` the planning page would build
+    POST /v1/reports              the rendered PDF (``application/pdf``)
+
+Plan and report requests take the same fields as a ``batch_plans`` roster
+row: ``company_name``, ``sector``, ``audit_start_date``,
+``audit_end_date``, and either ``team_members`` (a list or a ``;``
+separated string) or ``high_risk_team``/``medium_risk_team``/``low_risk_team``.
+``team_size`` is optional. ``/v1/reports`` also accepts a prebuilt plan as
+``{"audit_plan": {...}}``.
+
+JSON endpoints answer on the event loop. Renders run in a process pool that
+is started and warmed before the port opens. Repeat plans are served from the
+report cache without touching the pool. At most ``max_renders`` renders may
+be queued or running; further render requests get ``503`` with
+``Retry-After`` instead of waiting. Connections are HTTP/1.1 keep-alive.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import tornado.httpserver
+import tornado.web
+
+from batch_plans import plan_from_row, report_filename
+from instrumentation import REGISTRY, configure_from_env, span
+from planning import team_allocation
+from report_cache import get_default_cache, plan_fingerprint
+from sector_catalog import get_catalog
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_RENDERS_PER_WORKER = 8
+MAX_BODY_BYTES = 16 * 1024 * 1024
+IDLE_CONNECTION_TIMEOUT = 60.0
+RETRY_AFTER_SECONDS = 1
+
+
+def _init_worker():
+    # Import reportlab and compile the report template once per worker process.
+    from pdf_generator import get_report_template
+    get_report_template()
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render(audit_plan):
+    from pdf_generator import generate_pdf_download
+    return generate_pdf_download(audit_plan, use_cache=False)
+
+
+class RenderPool:
+    """Process pool for PDF renders with a cap on queued and running work."""
+
+    def __init__(self, workers=None, max_renders=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_renders = max_renders or self.workers * DEFAULT_MAX_RENDERS_PER_WORKER
+        self.in_flight = 0
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def warm(self):
+        """Start every worker process and wait until each has loaded reportlab."""
+        wait([self._executor.submit(_ping) for _ in range(self.workers)])
+
+    @property
+    def full(self):
+        return self.in_flight >= self.max_renders
+
+    async def render(self, audit_plan):
+        """Render ``audit_plan`` in a worker process and return the PDF bytes.
+
+        Must be called on the event loop thread, which owns ``in_flight``.
+        """
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, _render, audit_plan)
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize value of type {type(value).__name__}")
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, pool=None):
+        self.pool = pool
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(payload, default=_json_default))
+
+    def write_error(self, status_code, **kwargs):
+        reason = self._reason
+        if "exc_info" in kwargs and isinstance(kwargs["exc_info"][1], tornado.web.HTTPError):
+            reason = kwargs["exc_info"][1].log_message or reason
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps({"error": reason}))
+
+    def json_body(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, f"Invalid JSON body: {e}")
+        if not isinstance(body, dict):
+            raise tornado.web.HTTPError(400, "The JSON body must be an object")
+        return body
+
+    def plan_from_body(self, body):
+        sector = body.get("sector")
+        if isinstance(sector, str) and sector.strip() not in get_catalog():
+            raise tornado.web.HTTPError(404, f"Unknown sector: {sector}")
+        try:
+            with span("api.build_plan"):
+                return plan_from_row(body)
+        except KeyError as e:
+            raise tornado.web.HTTPError(400, f"Missing or unknown value: {e.args[0]}")
+        except (TypeError, ValueError) as e:
+            raise tornado.web.HTTPError(400, str(e))
+
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({
+            "status": "ok",
+            "sectors": len(get_catalog()),
+            "render_workers": self.pool.workers,
+            "renders_in_flight": self.pool.in_flight,
+            "max_renders": self.pool.max_renders,
+        })
+
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(REGISTRY.render_prometheus())
+
+
+class SectorsHandler(BaseHandler):
+    def get(self):
+        self.write_json({"sectors": list(get_catalog().names())})
+
+
+class SectorHandler(BaseHandler):
+    def get(self, name):
+        template = get_catalog().get(name)
+        if template is None:
+            raise tornado.web.HTTPError(404, f"Unknown sector: {name}")
+        self.write_json({
+            "name": template["name"],
+            "parent": template["parent"],
+            "objectives": list(template["objectives"]),
+            "scope": list(template["scope"]),
+            "risks": {level: list(risks) for level, risks in template["risks"].items()},
+        })
+
+
+class AllocationHandler(BaseHandler):
+    def post(self):
+        body = self.json_body()
+        try:
+            team_size = int(body.get("team_size") or 0)
+            start = body.get("audit_start_date")
+            end = body.get("audit_end_date")
+            start = datetime.date.fromisoformat(start) if start else None
+            end = datetime.date.fromisoformat(end) if end else None
+        except (TypeError, ValueError) as e:
+            raise tornado.web.HTTPError(400, str(e))
+        if team_size < 1:
+            raise tornado.web.HTTPError(400, "team_size must be a positive integer")
+        risks = None
+        if body.get("sector") is not None:
+            template = get_catalog().get(body["sector"])
+            if template is None:
+                raise tornado.web.HTTPError(404, f"Unknown sector: {body['sector']}")
+            risks = template["risks"]
+        self.write_json({"allocation": team_allocation(team_size, risks, start, end)})
+
+
+class PlansHandler(BaseHandler):
+    def post(self):
+        self.write_json({"audit_plan": self.plan_from_body(self.json_body())})
+
+
+class ReportsHandler(BaseHandler):
+    async def post(self):
+        body = self.json_body()
+        audit_plan = body["audit_plan"] if isinstance(body.get("audit_plan"), dict) else self.plan_from_body(body)
+        try:
+            key = plan_fingerprint(audit_plan)
+        except TypeError as e:
+            raise tornado.web.HTTPError(400, str(e))
+        cache = get_default_cache()
+        pdf_bytes = cache.get(key)
+        if pdf_bytes is None:
+            if self.pool.full:
+                REGISTRY.increment("api_renders_rejected")
+                self.set_header("Retry-After", str(RETRY_AFTER_SECONDS))
+                self.write_json({"error": "Too many reports in progress, retry shortly"}, status=503)
+                return
+            with span("api.render"):
+                try:
+                    pdf_bytes = await self.pool.render(audit_plan)
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    raise tornado.web.HTTPError(400, f"Invalid audit plan: {type(e).__name__}: {e}")
+            cache.put(key, pdf_bytes)
+        self.set_header("Content-Type", "application/pdf")
+        self.set_header("ETag", f'"{key}"')
+        self.set_header(
+            "Content-Disposition",
+            f'attachment; filename="{report_filename(str(audit_plan.get("company_name", "")))}"'
+        )
+        self.finish(pdf_bytes)
+
+
+def make_app(pool):
+    """Return the tornado application serving the API with ``pool``."""
+    options = {"pool": pool}
+    return tornado.web.Application([
+        (r"/healthz", HealthHandler, options),
+        (r"/metrics", MetricsHandler, options),
+        (r"/v1/sectors", SectorsHandler, options),
+        (r"/v1/sectors/([^/]+)", SectorHandler, options),
+        (r"/v1/allocation", AllocationHandler, options),
+        (r"/v1/plans", PlansHandler, options),
+        (r"/v1/reports", ReportsHandler, options),
+    ])
+
+
+def start_server(pool, port=DEFAULT_PORT, host="127.0.0.1"):
+    """Bind the API to ``host:port`` on the current event loop and return the server."""
+    server = tornado.httpserver.HTTPServer(
+        make_app(pool),
+        max_body_size=MAX_BODY_BYTES,
+        idle_connection_timeout=IDLE_CONNECTION_TIMEOUT,
+        xheaders=True,
+    )
+    server.listen(port, address=host)
+    return server
+
+
+async def serve(port=DEFAULT_PORT, host="127.0.0.1", workers=None, max_renders=None):
+    """Warm the render pool, then serve the API until cancelled."""
+    pool = RenderPool(workers, max_renders)
+    pool.warm()
+    REGISTRY.add_collector(lambda: {"api_renders_in_flight": pool.in_flight})
+    server = start_server(pool, port, host)
+    print(f"Serving on http://{host}:{port} with {pool.workers} render workers", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.stop()
+        pool.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve audit plans and PDF reports over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count)")
+    parser.add_argument("--max-renders", type=int, default=None,
+                        help="Renders queued or running before answering 503 "
+                             f"(default: {DEFAULT_MAX_RENDERS_PER_WORKER} per worker)")
+    args = parser.parse_args(argv)
+    configure_from_env()
+    try:
+        asyncio.run(serve(args.port, args.host, args.workers, args.max_renders))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,11 +1,41 @@
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import altair as alt
-from pdf_generator import generate_pdf_download
+from artifact_store import get_artifact_store
+from engagement_store import EngagementStoreError, engagement_key, get_engagement_store, shift_year
+from instrumentation import PROFILING_ALLOWED, configure_from_env, span
+from pdf_jobs import CANCELLED, DONE, FAILED, QueueFull, get_job_queue
+from planning import FINDING_LEVELS, allocation_summary, build_audit_plan, merge_risks, split_team, team_allocation
+from report_downloads import download_url
+from scheduler import get_scheduler
+from sector_catalog import get_catalog
+from team_roster import page_bounds, page_count, read_roster_names, resize_roster
+
+JOB_POLL_INTERVAL = 0.5
+# Teams up to this size get one text input per member
+INLINE_TEAM_LIMIT = 20
+# Session key, role and label of each related-party master upload
+MASTER_UPLOADS = (
+    ("vendor_master", "vendor", "Vendor"),
+    ("employee_master", "employee", "Employee"),
+    ("customer_master", "customer", "Customer")
+)
+MAX_TEAM_SIZE = 10000
+HISTORY_PAGE_SIZE = 25
+SAMPLE_CONFIDENCE_LEVELS = (0.90, 0.95, 0.99)
+SAMPLE_PREVIEW_ROWS = 200
+TEAM_LABELS = (
+    ("high_risk", "High Risk"),
+    ("medium_risk", "Medium Risk"),
+    ("low_risk", "Low Risk")
+)
+
+configure_from_env()
 
 # Configure the page with minimal settings
 st.set_page_config(
@@ -15,215 +45,6 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Define sector-specific audit plans
-SECTOR_AUDIT_PLANS = {
-    "Technology": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review revenue recognition policies and practices",
-            "Analyze expense management and cost controls"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Revenue recognition and billing systems",
-            "Expense management and cost controls",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Revenue recognition", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Expense management", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Financial Services": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review compliance with financial regulations",
-            "Analyze risk management frameworks"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Regulatory compliance",
-            "Risk management systems",
-            "Internal controls over financial reporting",
-            "Transaction monitoring"
-        ],
-        "risks": {
-            "High": ["Financial reporting accuracy", "Regulatory compliance", "Internal control weaknesses"],
-            "Medium": ["Risk management", "Transaction monitoring", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Manufacturing": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review inventory valuation and management",
-            "Analyze cost accounting systems"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Inventory management and valuation",
-            "Cost accounting systems",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Inventory valuation", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Cost accounting", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Healthcare": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review revenue cycle management",
-            "Analyze expense management and cost controls"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Revenue cycle management",
-            "Expense management and cost controls",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Revenue recognition", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Expense management", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Retail": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review inventory valuation and management",
-            "Analyze revenue recognition and sales reporting"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Inventory management and valuation",
-            "Revenue recognition and sales reporting",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Inventory valuation", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Revenue recognition", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Energy": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review revenue recognition and pricing",
-            "Analyze cost accounting and expense management"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Revenue recognition and pricing",
-            "Cost accounting and expense management",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Revenue recognition", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Cost accounting", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Telecommunications": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review revenue recognition and billing systems",
-            "Analyze expense management and cost controls"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Revenue recognition and billing systems",
-            "Expense management and cost controls",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Revenue recognition", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Expense management", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Real Estate": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review property valuation and management",
-            "Analyze revenue recognition and expense management"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Property valuation and management",
-            "Revenue recognition and expense management",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Property valuation", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Revenue recognition", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    },
-    "Education": {
-        "objectives": [
-            "Evaluate financial reporting accuracy and completeness",
-            "Assess internal controls over financial reporting",
-            "Review revenue recognition and tuition management",
-            "Analyze expense management and cost controls"
-        ],
-        "scope": [
-            "Financial statements and disclosures",
-            "Revenue recognition and tuition management",
-            "Expense management and cost controls",
-            "Internal controls over financial reporting",
-            "Tax compliance and reporting"
-        ],
-        "risks": {
-            "High": ["Revenue recognition", "Financial reporting accuracy", "Internal control weaknesses"],
-            "Medium": ["Expense management", "Tax compliance", "Financial disclosures"],
-            "Low": ["Documentation", "Administrative processes", "IT systems"]
-        }
-    }
-}
-
-# Enhanced risk assessment criteria
-RISK_ASSESSMENT_CRITERIA = {
-    "High": {
-        "Financial Impact": "Significant financial loss (>$1M)",
-        "Regulatory Impact": "Major regulatory violations",
-        "Reputation Impact": "Severe damage to reputation",
-        "Operational Impact": "Critical system disruption",
-        "Probability": "High likelihood of occurrence"
-    },
-    "Medium": {
-        "Financial Impact": "Moderate financial loss ($100K-$1M)",
-        "Regulatory Impact": "Minor regulatory violations",
-        "Reputation Impact": "Moderate reputation damage",
-        "Operational Impact": "Significant system disruption",
-        "Probability": "Moderate likelihood of occurrence"
-    },
-    "Low": {
-        "Financial Impact": "Minor financial loss (<$100K)",
-        "Regulatory Impact": "Procedural non-compliance",
-        "Reputation Impact": "Minimal reputation impact",
-        "Operational Impact": "Limited system disruption",
-        "Probability": "Low likelihood of occurrence"
-    }
-}
-
 def main():
     st.title("Financial Audit Assistant 📊")
     
@@ -231,147 +52,811 @@ def main():
     st.sidebar.header("Navigation")
     page = st.sidebar.selectbox(
         "Choose a page",
-        ["Audit Planning", "Report Generation"]
+        ["Audit Planning", "Risk Dashboard", "Engagement History", "Report Generation"]
     )
     
     if page == "Audit Planning":
         show_audit_planning()
+    elif page == "Risk Dashboard":
+        show_risk_dashboard()
+    elif page == "Engagement History":
+        show_engagement_history()
     elif page == "Report Generation":
         show_report_generation()
 
 def show_audit_planning():
     st.header("Financial Audit Planning")
+    catalog = get_catalog()
     
     # Company Information Section
     st.header("Company Information")
     col1, col2 = st.columns(2)
     
     with col1:
-        company_name = st.text_input("Company Name")
+        company_name = st.text_input("Company Name", key="company_name")
         sector = st.selectbox(
             "Sector",
-            list(SECTOR_AUDIT_PLANS.keys())
+            catalog.names(),
+            key="sector"
         )
     
     with col2:
-        audit_start_date = st.date_input("Audit Start Date")
-        audit_end_date = st.date_input("Audit End Date")
-        team_size = st.number_input("Team Size", min_value=1, max_value=20, value=5)
+        audit_start_date = st.date_input("Audit Start Date", key="audit_start_date")
+        audit_end_date = st.date_input("Audit End Date", key="audit_end_date")
+        if "team_size" not in st.session_state:
+            st.session_state["team_size"] = 5
+        team_size = st.number_input("Team Size", min_value=1, max_value=MAX_TEAM_SIZE, key="team_size")
+    
+    if company_name:
+        show_previous_engagement(company_name, audit_start_date)
     
     if company_name and sector:
         # Display Audit Plan
         st.header("Financial Audit Plan")
+        sector_plan = catalog.get(sector)
         
         # Objectives
         st.subheader("Audit Objectives")
-        for objective in SECTOR_AUDIT_PLANS[sector]["objectives"]:
+        for objective in sector_plan["objectives"]:
             st.markdown(f"- {objective}")
         
         # Scope
         st.subheader("Audit Scope")
-        for scope_item in SECTOR_AUDIT_PLANS[sector]["scope"]:
+        for scope_item in sector_plan["scope"]:
             st.markdown(f"- {scope_item}")
         
         # Risk Assessment
         st.subheader("Risk Assessment")
+        # Accounts flagged by the analytical review and related-party clusters
+        # join the sector's risk areas
+        added_risks = session_added_risks()
+        risks = merge_risks(sector_plan["risks"], added_risks)
         
         # High Risk Areas
         st.markdown("#### High Risk Areas")
-        for risk in SECTOR_AUDIT_PLANS[sector]["risks"]["High"]:
+        for risk in risks["High"]:
             st.markdown(f"- {risk}")
         
         # Medium Risk Areas
         st.markdown("#### Medium Risk Areas")
-        for risk in SECTOR_AUDIT_PLANS[sector]["risks"]["Medium"]:
+        for risk in risks["Medium"]:
             st.markdown(f"- {risk}")
         
         # Low Risk Areas
         st.markdown("#### Low Risk Areas")
-        for risk in SECTOR_AUDIT_PLANS[sector]["risks"]["Low"]:
+        for risk in risks["Low"]:
             st.markdown(f"- {risk}")
         
+        findings, appendices = show_ledger_findings()
+        review_findings, review_appendices = show_analytical_review()
+        related_findings, related_appendices = show_related_parties()
+        findings = findings + review_findings + related_findings
+        appendices = appendices + review_appendices + related_appendices
+        sample_appendix = show_audit_sampling()
+        if sample_appendix is not None:
+            appendices = appendices + [sample_appendix]
+        
         # Resource Allocation
         st.subheader("Resource Allocation")
         
-        # High Risk Team
-        st.markdown("#### High Risk Team")
-        high_risk_size = int(team_size * 0.5)
-        high_risk_names = []
-        for i in range(high_risk_size):
-            name = st.text_input(f"Team Member {i+1} Name (High Risk)", key=f"high_risk_{i}")
-            high_risk_names.append(name)
-        
-        # Medium Risk Team
-        st.markdown("#### Medium Risk Team")
-        medium_risk_size = int(team_size * 0.3)
-        medium_risk_names = []
-        for i in range(medium_risk_size):
-            name = st.text_input(f"Team Member {i+1} Name (Medium Risk)", key=f"medium_risk_{i}")
-            medium_risk_names.append(name)
+        if "roster_error" in st.session_state:
+            st.error(st.session_state["roster_error"])
+        allocation = team_allocation(
+            team_size,
+            risks,
+            audit_start_date,
+            audit_end_date
+        )
+        team_members = show_team_editor(team_size, risks, allocation)
         
-        # Low Risk Team
-        st.markdown("#### Low Risk Team")
-        low_risk_size = int(team_size * 0.2)
-        low_risk_names = []
-        for i in range(low_risk_size):
-            name = st.text_input(f"Team Member {i+1} Name (Low Risk)", key=f"low_risk_{i}")
-            low_risk_names.append(name)
+        show_portfolio_schedule(company_name, audit_start_date, audit_end_date, team_members)
         
         # Generate Report Button
         st.markdown("---")
         st.subheader("Generate Audit Report")
         
         # Create audit plan dictionary for PDF generation
-        audit_plan = {
-            "company_name": company_name,
-            "sector": sector,
-            "audit_period": f"{audit_start_date.strftime('%B %d, %Y')} to {audit_end_date.strftime('%B %d, %Y')}",
-            "team_size": team_size,
-            "objectives": SECTOR_AUDIT_PLANS[sector]["objectives"],
-            "scope": SECTOR_AUDIT_PLANS[sector]["scope"],
-            "risks": SECTOR_AUDIT_PLANS[sector]["risks"],
-            "team_members": {
-                "high_risk": high_risk_names,
-                "medium_risk": medium_risk_names,
-                "low_risk": low_risk_names
-            }
-        }
+        with span("app.build_plan"):
+            audit_plan = build_audit_plan(
+                company_name,
+                sector,
+                audit_start_date,
+                audit_end_date,
+                team_size,
+                team_members,
+                sector_plans=catalog.sectors,
+                findings=findings,
+                appendices=appendices,
+                added_risks=added_risks
+            )
         
-        if st.button("Generate PDF Report"):
-            try:
-                pdf_bytes = generate_pdf_download(audit_plan)
-                st.download_button(
-                    label="Download PDF Report",
-                    data=pdf_bytes,
-                    file_name=f"financial_audit_plan_{company_name.replace(' ', '_')}.pdf",
-                    mime="application/pdf"
-                )
-                st.success("Report generated successfully!")
-            except Exception as e:
-                st.error(f"Error generating report: {str(e)}")
+        show_save_engagement(audit_plan, audit_start_date, audit_end_date)
+        
+        show_pdf_job(
+            "audit_planning",
+            audit_plan,
+            f"financial_audit_plan_{company_name.replace(' ', '_')}.pdf"
+        )
+
+def show_ledger_findings():
+    """Offer a general-ledger upload and list the ledger analytics findings.
+
+    Returns the findings and the supporting appendix tables for the plan.
+    """
+    st.markdown("#### Ledger Analytics")
+    st.file_uploader(
+        "Import General Ledger (CSV, Excel or Parquet)",
+        type=["csv", "xlsx", "parquet"],
+        key="ledger_file",
+        on_change=import_ledger
+    )
+    if "ledger_error" in st.session_state:
+        st.error(st.session_state["ledger_error"])
+    summary = st.session_state.get("ledger_summary")
+    findings = st.session_state.get("ledger_findings", [])
+    appendices = st.session_state.get("ledger_appendices", [])
+    if summary is None:
+        return findings, appendices
+    st.caption(
+        f"{summary['rows']:,} ledger lines, {summary['accounts']:,} accounts, "
+        f"{summary['vendors']:,} vendors"
+    )
+    if not findings:
+        st.success("No journal entry or duplicate payment exceptions.")
+    for finding in findings:
+        st.markdown(
+            f"- **{finding['level']}** {finding['title']}: {finding['count']:,} flagged, "
+            f"${finding['amount']:,.0f}. {finding['detail']}"
+        )
+    return findings, appendices
+
+def show_analytical_review():
+    """Offer a trial balance upload and show materiality, ratios and flagged variances.
+
+    Returns the review's findings and appendix tables for the plan.
+    """
+    st.markdown("#### Analytical Review")
+    st.file_uploader(
+        "Import Trial Balances (CSV, Excel or Parquet; one or more entities and years)",
+        type=["csv", "xlsx", "parquet"],
+        accept_multiple_files=True,
+        key="trial_balance_files",
+        on_change=import_trial_balances
+    )
+    if "review_error" in st.session_state:
+        st.error(st.session_state["review_error"])
+    summary = st.session_state.get("review_summary")
+    if summary is None:
+        return [], []
+    st.caption(
+        f"{summary['entities']:,} entities, {summary['accounts']:,} accounts, "
+        f"fiscal years {summary['years'][0]}-{summary['years'][-1]}"
+    )
+    st.dataframe(st.session_state["review_materiality"], hide_index=True)
+    st.dataframe(st.session_state["review_ratios"], hide_index=True)
+    findings = st.session_state.get("review_findings", [])
+    if not findings:
+        st.success("No account variances above the flag threshold.")
+    for finding in findings:
+        st.markdown(
+            f"- **{finding['level']}** {finding['title']}: {finding['count']:,} flagged, "
+            f"${finding['amount']:,.0f}. {finding['detail']}"
+        )
+    return findings, [st.session_state["review_appendix"]] if findings else []
+
+def import_trial_balances():
+    """Run the analytical review over the uploaded trial balances."""
+    uploaded = st.session_state.get("trial_balance_files") or []
+    for key in ("review_error", "review_summary", "review_materiality", "review_ratios",
+                "review_findings", "review_risks", "review_appendix"):
+        st.session_state.pop(key, None)
+    if not uploaded:
+        return
+    # pandas is loaded on first upload, off the startup path
+    from analytical_review import (TrialBalanceError, review_appendix, review_findings,
+                                   review_risks, run_analytical_review)
+    risk_criteria = get_catalog().risk_criteria
+    try:
+        review = run_analytical_review(uploaded, risk_criteria)
+    except (TrialBalanceError, ValueError, OSError) as e:
+        st.session_state["review_error"] = f"Could not review trial balances: {e}"
+        return
+    if not review["years"]:
+        st.session_state["review_error"] = "The trial balances have no fiscal years."
+        return
+    latest = review["years"][-1]
+    materiality = review["materiality"]
+    ratios = review["ratios"]
+    st.session_state["review_summary"] = {
+        "entities": review["entities"],
+        "accounts": review["accounts"],
+        "years": review["years"],
+    }
+    st.session_state["review_materiality"] = materiality[materiality["year"] == latest]
+    st.session_state["review_ratios"] = ratios[ratios["year"] == latest]
+    st.session_state["review_findings"] = review_findings(review, risk_criteria)
+    st.session_state["review_risks"] = review_risks(review)
+    st.session_state["review_appendix"] = review_appendix(review)
+
+def show_related_parties():
+    """Offer vendor, employee and customer master uploads and list related-party clusters.
+
+    Returns the clusters' findings and appendix tables for the plan.
+    """
+    st.markdown("#### Related Parties")
+    columns = st.columns(3)
+    for column, (key, _, label) in zip(columns, MASTER_UPLOADS):
+        with column:
+            st.file_uploader(
+                f"Import {label} Master (CSV, Excel or Parquet)",
+                type=["csv", "xlsx", "parquet"],
+                key=key,
+                on_change=import_master_data
+            )
+    if "related_error" in st.session_state:
+        st.error(st.session_state["related_error"])
+    summary = st.session_state.get("related_summary")
+    if summary is None:
+        return [], []
+    st.caption(
+        f"{summary['vendor']:,} vendors, {summary['employee']:,} employees, "
+        f"{summary['customer']:,} customers; {summary['clusters']:,} linked clusters"
+    )
+    findings = st.session_state.get("related_findings", [])
+    if not findings:
+        st.success("No related-party clusters above the score threshold.")
+    for finding in findings:
+        st.markdown(
+            f"- **{finding['level']}** {finding['title']}: {finding['count']:,} flagged, "
+            f"${finding['amount']:,.0f}. {finding['detail']}"
+        )
+    return findings, [st.session_state["related_appendix"]] if findings else []
+
+def import_master_data():
+    """Link the uploaded master files and score the related-party clusters."""
+    sources = {
+        role: [st.session_state[key]] for key, role, _ in MASTER_UPLOADS
+        if st.session_state.get(key) is not None
+    }
+    for key in ("related_error", "related_summary", "related_findings", "related_risks", "related_appendix"):
+        st.session_state.pop(key, None)
+    if not sources:
+        return
+    # pandas and pyarrow are loaded on first upload, off the startup path
+    from related_parties import (MasterDataError, related_party_appendix, related_party_findings,
+                                 related_party_risks, run_related_parties)
+    risk_criteria = get_catalog().risk_criteria
+    try:
+        result = run_related_parties(sources)
+    except (MasterDataError, ValueError, OSError) as e:
+        st.session_state["related_error"] = f"Could not analyse master data: {e}"
+        return
+    st.session_state["related_summary"] = dict(result["by_role"], clusters=len(result["clusters"]))
+    st.session_state["related_findings"] = related_party_findings(result, risk_criteria)
+    st.session_state["related_risks"] = related_party_risks(result)
+    st.session_state["related_appendix"] = related_party_appendix(result)
+
+def session_added_risks():
+    """Return the risk areas the analytics in this session add to the sector's."""
+    added_risks = {}
+    for key in ("review_risks", "related_risks"):
+        for level, items in st.session_state.get(key, {}).items():
+            added_risks.setdefault(level, []).extend(items)
+    return added_risks
+
+def show_audit_sampling():
+    """Draw a statistical sample from the uploaded ledger.
+
+    Returns the sample's PDF appendix, or ``None`` before a sample is drawn.
+    """
+    summary = st.session_state.get("ledger_summary")
+    if summary is None or "ledger_path" not in st.session_state:
+        return None
+    from sampling import (MUS, METHODS, draw_sample, export_sample, sample_appendix,
+                          sample_summary)
+    st.markdown("#### Audit Sampling")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        method = st.selectbox("Sampling Method", METHODS, key="sample_method")
+    with col2:
+        confidence = st.selectbox(
+            "Confidence Level",
+            SAMPLE_CONFIDENCE_LEVELS,
+            index=1,
+            format_func=lambda level: f"{level:.0%}",
+            key="sample_confidence"
+        )
+    with col3:
+        seed = st.number_input("Random Seed", min_value=0, value=0, step=1, key="sample_seed")
+    options = {}
+    if method == MUS:
+        default_tolerable = max(1.0, round(summary.get("absolute_amount", 0.0) * 0.05, -3))
+        options["tolerable"] = st.number_input(
+            "Tolerable Misstatement ($)", min_value=1.0, value=default_tolerable, key="sample_tolerable"
+        )
+        options["expected"] = st.number_input(
+            "Expected Misstatement ($)", min_value=0.0, value=0.0, key="sample_expected"
+        )
+    else:
+        options["tolerable_rate"] = st.number_input(
+            "Tolerable Deviation Rate (%)", min_value=0.5, max_value=50.0, value=5.0, key="sample_rate"
+        ) / 100
+        options["expected_rate"] = st.number_input(
+            "Expected Deviation Rate (%)", min_value=0.0, max_value=49.0, value=0.0, key="sample_expected_rate"
+        ) / 100
+    if st.button("Draw Sample", key="sample_draw"):
+        try:
+            st.session_state["ledger_sample"] = draw_sample(
+                st.session_state["ledger_path"],
+                method,
+                confidence,
+                seed=int(seed),
+                risk_criteria=get_catalog().risk_criteria,
+                **options
+            )
+        except ValueError as e:
+            st.error(f"Could not draw sample: {e}")
+    result = st.session_state.get("ledger_sample")
+    if result is None:
+        return None
+    st.caption(sample_summary(result))
+    st.dataframe(result["sample"].slice(0, SAMPLE_PREVIEW_ROWS).to_pandas(), hide_index=True)
+    buffer = io.BytesIO()
+    export_sample(result, buffer)
+    st.download_button(
+        label="Download Sample (CSV)",
+        data=buffer.getvalue(),
+        file_name="audit_sample.csv",
+        mime="text/csv",
+        key="sample_download"
+    )
+    return sample_appendix(result)
+
+def import_ledger():
+    """Ingest an uploaded ledger and run the journal-entry and duplicate payment tests."""
+    uploaded = st.session_state.get("ledger_file")
+    previous = st.session_state.pop("ledger_path", None)
+    if previous and os.path.exists(previous):
+        os.remove(previous)
+    for key in ("ledger_error", "ledger_summary", "ledger_findings", "ledger_appendices", "ledger_sample"):
+        st.session_state.pop(key, None)
+    if uploaded is None:
+        return
+    # pyarrow and numpy are loaded on first upload, off the startup path
+    from duplicate_payments import duplicate_appendix, duplicate_findings, find_duplicate_payments
+    from je_tests import run_je_tests
+    from ledger_ingest import ingest_ledger
+    fd, path = tempfile.mkstemp(prefix="audit_ledger_", suffix=".arrow")
+    os.close(fd)
+    try:
+        summary = ingest_ledger(uploaded, path, filename=uploaded.name)
+        risk_criteria = get_catalog().risk_criteria
+        findings = run_je_tests(path, risk_criteria)
+        matches = find_duplicate_payments(path)
+        findings += duplicate_findings(matches, risk_criteria)
+    except Exception as e:
+        os.remove(path)
+        st.session_state["ledger_error"] = f"Could not analyse ledger: {e}"
+        return
+    st.session_state["ledger_path"] = path
+    st.session_state["ledger_summary"] = summary
+    st.session_state["ledger_findings"] = findings
+    st.session_state["ledger_appendices"] = [duplicate_appendix(matches)] if matches else []
+
+def open_engagement_store():
+    """Return the engagement store, or ``None`` with a warning if it cannot be opened."""
+    try:
+        return get_engagement_store()
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Engagement history is unavailable: {e}")
+        return None
+
+def open_portfolio():
+    """Return the portfolio scheduler, loaded from the engagement history on first use."""
+    store = open_engagement_store()
+    try:
+        return get_scheduler(load=store.bookings if store is not None else None)
+    except sqlite3.Error as e:
+        st.warning(f"Could not load saved engagements into the portfolio: {e}")
+        return get_scheduler()
+
+def show_previous_engagement(company_name, audit_start_date):
+    """Offer to start from the company's most recent saved engagement."""
+    if "clone_notice" in st.session_state:
+        st.success(st.session_state.pop("clone_notice"))
+    store = open_engagement_store()
+    if store is None:
+        return
+    previous = store.latest(company_name, before=audit_start_date)
+    if previous is None:
+        return
+    st.caption(
+        f"Last saved engagement: {previous['sector']}, {previous['audit_start_date']:%B %d, %Y} to "
+        f"{previous['audit_end_date']:%B %d, %Y}, team of {previous['team_size']}."
+    )
+    st.button("Clone Last Year's Plan", key="clone_engagement", on_click=clone_engagement, args=(previous["id"],))
+
+def clone_engagement(engagement_id):
+    """Fill the planning form from a saved engagement, one year later."""
+    engagement = get_engagement_store().get(engagement_id)
+    if engagement is None:
+        return
+    plan = engagement["audit_plan"]
+    if plan["sector"] in get_catalog():
+        st.session_state["sector"] = plan["sector"]
+    st.session_state["audit_start_date"] = shift_year(engagement["audit_start_date"])
+    st.session_state["audit_end_date"] = shift_year(engagement["audit_end_date"])
+    team_members = plan.get("team_members", {})
+    roster = [name for key, _ in TEAM_LABELS for name in team_members.get(key, [])]
+    team_size = max(1, min(MAX_TEAM_SIZE, int(plan.get("team_size") or len(roster))))
+    st.session_state["team_size"] = team_size
+    st.session_state["team_roster"] = roster[:team_size]
+    st.session_state["roster_version"] = st.session_state.get("roster_version", 0) + 1
+    st.session_state["roster_page"] = 1
+    if team_size <= INLINE_TEAM_LIMIT:
+        for key, _ in TEAM_LABELS:
+            for i, name in enumerate(team_members.get(key, [])):
+                st.session_state[f"{key}_{i}"] = name
+    st.session_state["clone_notice"] = (
+        f"Cloned the {engagement['audit_start_date']:%Y} plan for {engagement['company_name']}."
+    )
+
+def show_save_engagement(audit_plan, audit_start_date, audit_end_date):
+    """Save the current plan to the engagement history and the portfolio schedule.
+
+    Saving again for the same company and period updates that engagement.
+    """
+    if not st.button("Save Engagement", key="engagement_save"):
+        return
+    store = open_engagement_store()
+    if store is None:
+        return
+    try:
+        engagement_id = store.save(audit_plan, audit_start_date, audit_end_date)
+    except (EngagementStoreError, sqlite3.Error) as e:
+        st.error(f"Could not save engagement: {e}")
+        return
+    company_name = audit_plan["company_name"]
+    staff = [name for names in audit_plan["team_members"].values() for name in names if name]
+    try:
+        open_portfolio().save(
+            engagement_key(company_name, audit_start_date, audit_end_date),
+            company_name, audit_start_date, audit_end_date, staff
+        )
+    except ValueError as e:
+        st.warning(f"Saved, but not added to the portfolio schedule: {e}")
+    st.success(f"Saved engagement #{engagement_id} to the history.")
+
+def show_engagement_history():
+    """Search saved engagements and re-render any of them."""
+    st.header("Engagement History")
+    store = open_engagement_store()
+    if store is None:
+        return
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        company = st.text_input("Company Name Starts With", key="history_company")
+        sector = st.selectbox("Sector", ["All sectors"] + store.sectors(), key="history_sector")
+    with col2:
+        start = st.date_input("Periods Ending On or After", value=None, key="history_start")
+        end = st.date_input("Periods Starting On or Before", value=None, key="history_end")
+    with col3:
+        level = st.selectbox("Ledger Findings", ["Any"] + list(FINDING_LEVELS), key="history_level")
+        staff = st.text_input("Team Member", key="history_staff")
+    filters = {
+        "company": company.strip() or None,
+        "sector": None if sector == "All sectors" else sector,
+        "start": start,
+        "end": end,
+        "finding_level": None if level == "Any" else level,
+        "staff": staff.strip() or None,
+    }
+    total = store.count(**filters)
+    if not total:
+        st.info("No saved engagements match.")
+        return
+    pages = -(-total // HISTORY_PAGE_SIZE)
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="history_page")
+    engagements, _ = store.search(page=page, page_size=HISTORY_PAGE_SIZE, **filters)
+    st.caption(f"{total:,} matching, page {page} of {pages}.")
+    st.dataframe(
+        [
+            {
+                "ID": e["id"],
+                "Company": e["company_name"],
+                "Sector": e["sector"],
+                "Start": e["audit_start_date"],
+                "End": e["audit_end_date"],
+                "Team": e["team_size"],
+                "Findings": e["findings"],
+            }
+            for e in engagements
+        ],
+        hide_index=True
+    )
+    engagement_id = st.selectbox(
+        "Engagement",
+        [e["id"] for e in engagements],
+        format_func=lambda i: next(
+            f"#{e['id']} {e['company_name']} ({e['audit_start_date']:%Y})" for e in engagements if e["id"] == i
+        ),
+        key="history_engagement"
+    )
+    engagement = store.get(engagement_id)
+    if engagement is None:
+        return
+    show_pdf_job(
+        "engagement_history",
+        engagement["audit_plan"],
+        f"financial_audit_plan_{engagement['company_name'].replace(' ', '_')}.pdf"
+    )
+
+def show_portfolio_schedule(company_name, audit_start_date, audit_end_date, team_members):
+    """Check the team against every saved engagement.
+
+    The engagement saved for this company and period is left out, so
+    re-planning it does not conflict with itself.
+    """
+    st.subheader("Portfolio Schedule")
+    if audit_end_date < audit_start_date:
+        st.error("Audit end date is before the start date.")
+        return
+    scheduler = open_portfolio()
+    engagement_id = engagement_key(company_name, audit_start_date, audit_end_date)
+    staff = [name for names in team_members.values() for name in names if name]
+    conflicts = scheduler.conflicts(staff, audit_start_date, audit_end_date, exclude=engagement_id)
+    if not staff:
+        st.caption("Name team members to check them against the portfolio.")
+    elif conflicts:
+        st.warning(f"{len(conflicts)} team member(s) are already booked during this audit period.")
+        for conflict in conflicts[:INLINE_TEAM_LIMIT]:
+            booked = ", ".join(scheduler.get(e).company_name for e in conflict.engagements)
+            st.markdown(f"- **{conflict.staff}** from {conflict.first_day:%B %d, %Y}: {booked}")
+        if len(conflicts) > INLINE_TEAM_LIMIT:
+            st.caption(f"...and {len(conflicts) - INLINE_TEAM_LIMIT} more.")
+        days = (audit_end_date - audit_start_date).days + 1
+        proposed = scheduler.propose_start(staff, days, audit_start_date, exclude=engagement_id)
+        if proposed is not None:
+            st.info(f"Earliest start date with the whole team free: {proposed:%B %d, %Y}")
+    else:
+        st.success(f"No scheduling conflicts across {len(scheduler)} saved engagements.")
+
+def show_team_editor(team_size, risks, allocation):
+    """Render the team member inputs and return the per-risk-level teams.
+
+    ``allocation`` is the weighted staff and hours split from
+    ``planning.team_allocation``. Small teams get one text input per member,
+    grouped by risk level. Larger teams are edited a page at a time in a
+    single data editor, so a rerun only rebuilds the visible page instead of
+    thousands of widgets. Both keep ``team_roster`` up to date, so names
+    survive a team size change across ``INLINE_TEAM_LIMIT``.
+    """
+    st.file_uploader(
+        "Import Team Roster (CSV or Parquet)",
+        type=["csv", "parquet"],
+        key="roster_file",
+        on_change=import_team_roster
+    )
+    team_sizes = {key: entry["staff"] for key, entry in allocation.items()}
+    
+    if team_size <= INLINE_TEAM_LIMIT:
+        layout = tuple(team_sizes[key] for key, _ in TEAM_LABELS)
+        if st.session_state.get("inline_team_layout") != layout:
+            # The team size or split changed, or the paged editor was in use:
+            # lay the roster out over the inputs again.
+            roster = resize_roster(st.session_state.get("team_roster", []), team_size)
+            start = 0
+            for key, _ in TEAM_LABELS:
+                for i, name in enumerate(roster[start:start + team_sizes[key]]):
+                    st.session_state[f"{key}_{i}"] = name
+                start += team_sizes[key]
+            st.session_state["inline_team_layout"] = layout
+        team_members = {}
+        for key, label in TEAM_LABELS:
+            st.markdown(f"#### {label} Team")
+            st.caption(allocation_summary(allocation[key]))
+            team_members[key] = [
+                st.text_input(f"Team Member {i+1} Name ({label})", key=f"{key}_{i}")
+                for i in range(team_sizes[key])
+            ]
+        roster = [name for key, _ in TEAM_LABELS for name in team_members[key]]
+        if roster != st.session_state.get("team_roster"):
+            st.session_state["team_roster"] = roster
+            # Start the paged editor from the new roster rather than old edits
+            st.session_state["roster_version"] = st.session_state.get("roster_version", 0) + 1
+        return team_members
+    
+    st.session_state.pop("inline_team_layout", None)
+    roster = resize_roster(st.session_state.get("team_roster", []), team_size)
+    pages = page_count(team_size)
+    for key, label in TEAM_LABELS:
+        st.caption(f"{label} Team: {allocation_summary(allocation[key])}")
+    st.caption(f"{team_size} team members across {pages} pages.")
+    page = st.number_input("Roster Page", min_value=1, max_value=pages, value=1, key="roster_page")
+    start, end = page_bounds(page, team_size)
+    labels = [team_label(i, team_sizes) for i in range(start, end)]
+    edited = st.data_editor(
+        {"Team": labels, "Name": roster[start:end]},
+        disabled=["Team"],
+        hide_index=True,
+        key=f"roster_editor_{st.session_state.get('roster_version', 0)}_{page}"
+    )
+    roster[start:end] = [name or "" for name in list(edited["Name"])]
+    st.session_state["team_roster"] = roster
+    return split_team(roster, team_size, risks)
+
+def team_label(index, team_sizes):
+    """Return the risk team label for the roster entry at ``index``."""
+    boundary = 0
+    for key, label in TEAM_LABELS:
+        boundary += team_sizes[key]
+        if index < boundary:
+            return label
+    return TEAM_LABELS[-1][1]
+
+def import_team_roster():
+    """Load an uploaded roster into session state before the next rerun."""
+    uploaded = st.session_state.get("roster_file")
+    if uploaded is None:
+        return
+    try:
+        names = read_roster_names(uploaded.getvalue(), uploaded.name)
+    except Exception as e:
+        st.session_state["roster_error"] = f"Could not read roster: {e}"
+        return
+    names = names[:MAX_TEAM_SIZE]
+    st.session_state.pop("roster_error", None)
+    st.session_state["team_roster"] = names
+    st.session_state["team_size"] = max(1, len(names))
+    st.session_state["roster_version"] = st.session_state.get("roster_version", 0) + 1
+    st.session_state["roster_page"] = 1
+    sector_plan = get_catalog().get(st.session_state.get("sector"))
+    risks = None
+    if sector_plan is not None:
+        risks = merge_risks(sector_plan["risks"], session_added_risks())
+    if len(names) <= INLINE_TEAM_LIMIT:
+        for key, members in split_team(names, len(names), risks).items():
+            for i, name in enumerate(members):
+                st.session_state[f"{key}_{i}"] = name
+
+def show_risk_dashboard():
+    """Chart sector risk levels and, once a ledger is loaded, its amounts and flags.
+
+    Every chart is drawn from server-side aggregates, never from ledger lines.
+    """
+    import altair as alt
+    import pandas as pd
+    from risk_dashboard import (amount_histogram, flag_trend, impact_thresholds, ledger_aggregates,
+                                sector_risk_matrix)
+    st.header("Risk Dashboard")
+    catalog = get_catalog()
+
+    st.subheader("Risk Areas by Sector")
+    matrix = pd.DataFrame(sector_risk_matrix(catalog))
+    heatmap = alt.Chart(matrix).mark_rect().encode(
+        x=alt.X("level:N", title="Risk Level", sort=list(FINDING_LEVELS)),
+        y=alt.Y("sector:N", title=None),
+        color=alt.Color("risks:Q", title="Risk Areas", scale=alt.Scale(scheme="orangered")),
+        tooltip=["sector", "level", "risks"]
+    )
+    st.altair_chart(heatmap, use_container_width=True)
+
+    ledger_path = st.session_state.get("ledger_path")
+    if ledger_path is None or not os.path.exists(ledger_path):
+        st.info("Import a general ledger on the Audit Planning page to chart its amounts and flagged entries.")
+        return
+    with span("app.dashboard_aggregates"):
+        aggregates = ledger_aggregates(ledger_path)
+    st.caption(f"{aggregates.rows:,} ledger lines, {aggregates.flagged:,} flagged by the journal entry tests")
+
+    st.subheader("Materiality Distribution")
+    bins = pd.DataFrame(amount_histogram(aggregates, catalog.risk_criteria))
+    bars = alt.Chart(bins).mark_bar().encode(
+        x=alt.X("lower:Q", title="Absolute Amount ($)", scale=alt.Scale(type="symlog")),
+        x2="upper:Q",
+        y=alt.Y("lines:Q", title="Ledger Lines"),
+        color=alt.Color("level:N", title="Impact Level", sort=list(FINDING_LEVELS)),
+        tooltip=[alt.Tooltip("lower:Q", format="$,.0f"), alt.Tooltip("upper:Q", format="$,.0f"),
+                 "lines:Q", alt.Tooltip("amount:Q", format="$,.0f")]
+    )
+    thresholds = pd.DataFrame(impact_thresholds(catalog.risk_criteria), columns=["level", "amount"])
+    rules = alt.Chart(thresholds).mark_rule(strokeDash=[4, 4]).encode(x="amount:Q", tooltip=["level", "amount"])
+    st.altair_chart(bars + rules, use_container_width=True)
+
+    st.subheader("Flagged Entries Over the Audit Period")
+    trend = pd.DataFrame(flag_trend(aggregates))
+    if trend.empty:
+        st.info("The ledger has no dated postings.")
+        return
+    lines = alt.Chart(trend).mark_line().encode(
+        x=alt.X("date:T", title="Posting Date"),
+        y=alt.Y("lines:Q", title="Ledger Lines per Day"),
+        color=alt.Color("series:N", title=None),
+        tooltip=["date:T", "series", "lines"]
+    )
+    st.altair_chart(lines, use_container_width=True)
 
 def show_report_generation():
     st.header("Financial Audit Report Generation")
     
     # Create a sample audit plan for demonstration
+    sector_plan = get_catalog().get("Technology")
     sample_plan = {
         "company_name": "Sample Company",
         "sector": "Technology",
         "audit_period": "2024",
         "team_size": 5,
-        "objectives": SECTOR_AUDIT_PLANS["Technology"]["objectives"],
-        "scope": SECTOR_AUDIT_PLANS["Technology"]["scope"],
-        "risks": SECTOR_AUDIT_PLANS["Technology"]["risks"]
+        "objectives": list(sector_plan["objectives"]),
+        "scope": list(sector_plan["scope"]),
+        "risks": {level: list(risks) for level, risks in sector_plan["risks"].items()}
     }
     
-    if st.button("Generate PDF Report"):
-        pdf_bytes = generate_pdf_download(sample_plan)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_bytes,
-            file_name="audit_report.pdf",
-            mime="application/pdf"
-        )
+    show_pdf_job("report_generation", sample_plan, "audit_report.pdf")
+
+def show_pdf_job(slot, audit_plan, file_name):
+    """Submit ``audit_plan`` as a background render and show the job's status.
+
+    ``slot`` identifies the button on the page; each slot tracks its latest
+    job id in ``st.session_state`` so the status survives reruns. When the
+    server runs with ``AUDIT_PROFILE=1``, adding ``?profile=1`` to the page
+    URL captures a cProfile of the render.
+    """
+    jobs = st.session_state.setdefault("pdf_jobs", {})
+    owner = st.session_state.setdefault("session_owner", uuid.uuid4().hex)
+    queue = get_job_queue()
+    job = queue.get(jobs.get(slot))
+    
+    if st.button("Generate PDF Report", key=f"{slot}_generate"):
+        if job is not None and job.active:
+            queue.cancel(job.id)
+        try:
+            profile = PROFILING_ALLOWED and st.query_params.get("profile") == "1"
+            jobs[slot] = queue.submit(audit_plan, owner, profile=profile)
+            job = queue.get(jobs[slot])
+        except QueueFull as e:
+            st.warning(str(e))
+            return
+    
+    if job is None:
+        return
+    if job.active:
+        st.info(f"Report {job.state}...")
+        if st.button("Cancel", key=f"{slot}_cancel"):
+            queue.cancel(job.id)
+            st.rerun()
+        # Poll until the worker finishes; any user input interrupts the wait.
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+    elif job.state == DONE:
+        report = get_artifact_store().open(job.artifact_id)
+        if report is None:
+            st.warning("This report has expired; generate it again.")
+            return
+        url = download_url(job.artifact_id, file_name)
+        if url is not None:
+            # The server streams the report from the artifact store; this
+            # session never holds a copy.
+            report.close()
+            st.link_button("Download PDF Report", url)
+        else:
+            # No Tornado server in this process (e.g. AppTest)
+            with report:
+                st.download_button(
+                    label="Download PDF Report",
+                    data=report,
+                    file_name=file_name,
+                    mime="application/pdf",
+                    key=f"{slot}_download"
+                )
+        st.success("Report generated successfully!")
+        if job.profile_path:
+            # The dump stays on the server; don't show users its path.
+            st.caption(f"Render profile written to {os.path.basename(job.profile_path)}")
+    elif job.state == FAILED:
+        st.error(f"Error generating report: {job.error}")
+    elif job.state == CANCELLED:
+        st.info("Report generation cancelled.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with span("app.rerun"):
+        main() 
\ No newline at end of file
@@ -0,0 +1,302 @@
+"""Process-wide store for generated report files.
+
+Finished PDF jobs keep an artifact id instead of their own copy of the bytes,
+so a report downloaded by many sessions is held once. Artifacts are keyed by
+the SHA-256 of their content, so identical reports share one entry.
+
+Memory use is capped by a global budget:
+- artifacts larger than ``spill_bytes`` go straight to disk
+- artifacts idle for ``spill_after`` seconds are moved from memory to disk
+- the least recently used are moved to disk while the budget is exceeded
+
+The disk directory has its own budget and evicts least recently used files.
+Artifacts not read within ``ttl`` seconds are dropped from both tiers. A
+dropped artifact has to be generated again.
+"""
+import atexit
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MEMORY_BUDGET = 128 * 1024 * 1024
+DEFAULT_SPILL_BYTES = 8 * 1024 * 1024
+DEFAULT_SPILL_AFTER = 300.0
+DEFAULT_MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_TTL = 3600.0
+
+
+class _Artifact:
+    __slots__ = ("id", "size", "data", "path", "accessed_at")
+
+    def __init__(self, artifact_id, size, data=None, path=None):
+        self.id = artifact_id
+        self.size = size
+        self.data = data
+        self.path = path
+        self.accessed_at = time.time()
+
+
+class ArtifactStore:
+    """Content-addressed artifact bytes in a memory tier that spills to disk."""
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, spill_bytes=DEFAULT_SPILL_BYTES,
+                 spill_after=DEFAULT_SPILL_AFTER, disk_dir=None,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, ttl=DEFAULT_TTL):
+        self.memory_budget = memory_budget
+        self.spill_bytes = spill_bytes
+        self.spill_after = spill_after
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._disk_dir = disk_dir
+        self._lock = threading.Lock()
+        # id -> _Artifact, least recently used first
+        self._artifacts = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._counters = {
+            "stores": 0,
+            "dedup_hits": 0,
+            "hits": 0,
+            "misses": 0,
+            "spills": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @property
+    def disk_dir(self):
+        """The spill directory, created on first use."""
+        if self._disk_dir is None:
+            with self._lock:
+                if self._disk_dir is None:
+                    self._disk_dir = tempfile.mkdtemp(prefix="audit-artifacts-")
+                    atexit.register(shutil.rmtree, self._disk_dir, True)
+        os.makedirs(self._disk_dir, exist_ok=True)
+        return self._disk_dir
+
+    def put(self, data):
+        """Store ``data`` and return its artifact id.
+
+        Storing bytes that are already held only refreshes the existing
+        artifact.
+        """
+        view = memoryview(data)
+        artifact_id = hashlib.sha256(view).hexdigest()
+        with self._lock:
+            existing = self._artifacts.get(artifact_id)
+            if existing is not None:
+                self._touch(existing)
+                self._counters["dedup_hits"] += 1
+                return artifact_id
+        if len(view) > self.spill_bytes:
+            artifact = _Artifact(artifact_id, len(view), path=self._write(artifact_id, view))
+        else:
+            artifact = _Artifact(artifact_id, len(view), data=bytes(view))
+        with self._lock:
+            existing = self._artifacts.get(artifact_id)
+            if existing is not None:
+                # Another thread stored the same bytes meanwhile.
+                if artifact.path is not None and existing.path is None:
+                    _remove_quietly(artifact.path)
+                self._counters["dedup_hits"] += 1
+                return artifact_id
+            self._artifacts[artifact_id] = artifact
+            self._counters["stores"] += 1
+            if artifact.data is not None:
+                self._memory_bytes += artifact.size
+            else:
+                self._counters["spills"] += 1
+                self._disk_bytes += artifact.size
+        self._enforce()
+        return artifact_id
+
+    def get(self, artifact_id):
+        """Return the bytes of ``artifact_id`` or ``None`` if it is gone."""
+        artifact = self._lookup(artifact_id)
+        if artifact is None:
+            return None
+        data, path = artifact.data, artifact.path
+        if data is not None:
+            return data
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            self.discard(artifact_id)
+            return None
+
+    def open(self, artifact_id):
+        """Return a readable binary file for ``artifact_id`` or ``None``.
+
+        In-memory artifacts are wrapped without copying. Spilled artifacts are
+        read straight from disk.
+        """
+        artifact = self._lookup(artifact_id)
+        if artifact is None:
+            return None
+        data, path = artifact.data, artifact.path
+        if data is not None:
+            return io.BufferedReader(io.BytesIO(data))
+        try:
+            return open(path, "rb")
+        except OSError:
+            self.discard(artifact_id)
+            return None
+
+    def size(self, artifact_id):
+        """Return the size in bytes of ``artifact_id`` or ``None``."""
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            return None if artifact is None else artifact.size
+
+    def __contains__(self, artifact_id):
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            return artifact is not None and time.time() - artifact.accessed_at <= self.ttl
+
+    def discard(self, artifact_id):
+        """Drop ``artifact_id`` from every tier."""
+        with self._lock:
+            artifact = self._artifacts.pop(artifact_id, None)
+            if artifact is not None:
+                self._release(artifact)
+
+    def stats(self):
+        """Return usage and counters: entries, bytes per tier and budgets."""
+        self._enforce()
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["entries"] = len(self._artifacts)
+            snapshot["memory_entries"] = sum(1 for a in self._artifacts.values() if a.data is not None)
+            snapshot["memory_bytes"] = self._memory_bytes
+            snapshot["disk_bytes"] = self._disk_bytes
+            snapshot["memory_budget"] = self.memory_budget
+            snapshot["max_disk_bytes"] = self.max_disk_bytes
+        return snapshot
+
+    def clear(self):
+        """Drop every artifact."""
+        with self._lock:
+            for artifact in self._artifacts.values():
+                self._release(artifact)
+            self._artifacts.clear()
+
+    def _lookup(self, artifact_id):
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            if artifact is None or time.time() - artifact.accessed_at > self.ttl:
+                self._counters["misses"] += 1
+                if artifact is not None:
+                    del self._artifacts[artifact_id]
+                    self._release(artifact)
+                    self._counters["expirations"] += 1
+                return None
+            self._touch(artifact)
+            self._counters["hits"] += 1
+            return artifact
+
+    def _touch(self, artifact):
+        artifact.accessed_at = time.time()
+        self._artifacts.move_to_end(artifact.id)
+
+    def _release(self, artifact):
+        if artifact.data is not None:
+            self._memory_bytes -= artifact.size
+            artifact.data = None
+        if artifact.path is not None:
+            self._disk_bytes -= artifact.size
+            _remove_quietly(artifact.path)
+            artifact.path = None
+
+    def _enforce(self):
+        """Expire, spill and evict until both tiers are within budget."""
+        now = time.time()
+        with self._lock:
+            for artifact in [a for a in self._artifacts.values() if now - a.accessed_at > self.ttl]:
+                del self._artifacts[artifact.id]
+                self._release(artifact)
+                self._counters["expirations"] += 1
+            spill = []
+            memory_bytes = self._memory_bytes
+            for artifact in self._artifacts.values():
+                if artifact.data is None:
+                    continue
+                if memory_bytes > self.memory_budget or now - artifact.accessed_at > self.spill_after:
+                    spill.append((artifact.id, artifact.data))
+                    memory_bytes -= artifact.size
+        for artifact_id, data in spill:
+            self._spill(artifact_id, data)
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes:
+                victim = next((a for a in self._artifacts.values() if a.path is not None), None)
+                if victim is None:
+                    break
+                del self._artifacts[victim.id]
+                self._release(victim)
+                self._counters["evictions"] += 1
+
+    def _spill(self, artifact_id, data):
+        try:
+            path = self._write(artifact_id, data)
+        except OSError:
+            # Without disk room the artifact stays in memory over budget.
+            return
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            if artifact is None or artifact.data is None:
+                _remove_quietly(path)
+                return
+            artifact.data, artifact.path = None, path
+            self._memory_bytes -= artifact.size
+            self._disk_bytes += artifact.size
+            self._counters["spills"] += 1
+
+    def _write(self, artifact_id, data):
+        directory = self.disk_dir
+        path = os.path.join(directory, artifact_id)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            _remove_quietly(temp_path)
+            raise
+        return path
+
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Return the process-wide artifact store, configured from the environment.
+
+    ``AUDIT_ARTIFACT_MEMORY_BYTES`` sets the memory budget,
+    ``AUDIT_ARTIFACT_DIR`` the spill directory (default: a temporary
+    directory removed at exit), ``AUDIT_ARTIFACT_DISK_BYTES`` the disk budget
+    and ``AUDIT_ARTIFACT_TTL`` the idle lifetime in seconds.
+    """
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = ArtifactStore(
+                    memory_budget=int(os.environ.get("AUDIT_ARTIFACT_MEMORY_BYTES", DEFAULT_MEMORY_BUDGET)),
+                    disk_dir=os.environ.get("AUDIT_ARTIFACT_DIR") or None,
+                    max_disk_bytes=int(os.environ.get("AUDIT_ARTIFACT_DISK_BYTES", DEFAULT_MAX_DISK_BYTES)),
+                    ttl=float(os.environ.get("AUDIT_ARTIFACT_TTL", DEFAULT_TTL)),
+                )
+    return _default_store
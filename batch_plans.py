@@ -0,0 +1,298 @@
+"""Headless batch generation of audit plan PDFs from a company roster.
+
+Usage:
+    python batch_plans.py roster.csv --out-dir reports
+    python batch_plans.py roster.parquet --zip reports.zip --workers 8
+    python batch_plans.py group_roster.csv --group group_report.pdf --group-name "Acme Group"
+
+The roster needs ``company_name``, ``sector``, ``audit_start_date`` and
+``audit_end_date`` columns. Team members come either from a single
+``team_members`` column (names separated by ``;``, split across risk levels
+like the planning page does) or from ``high_risk_team``, ``medium_risk_team``
+and ``low_risk_team`` columns. ``team_size`` is optional and defaults to the
+number of names given.
+
+With ``--group`` the roster is rendered as one consolidated group report
+instead, the first row being the parent entity.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from planning import build_audit_plan, split_team
+from sector_catalog import get_catalog
+
+TEAM_SEPARATOR = ";"
+LEVEL_COLUMNS = (
+    ("high_risk", "high_risk_team"),
+    ("medium_risk", "medium_risk_team"),
+    ("low_risk", "low_risk_team")
+)
+
+
+def read_roster(path):
+    """Read roster rows from a CSV or Parquet file as a list of dicts."""
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pylist()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value).strip())
+
+
+def _split_names(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(name).strip() for name in value if str(name).strip()]
+    return [name.strip() for name in str(value).split(TEAM_SEPARATOR) if name.strip()]
+
+
+def plan_from_row(row):
+    """Build an ``audit_plan`` dict from one roster row."""
+    sector = str(row["sector"]).strip()
+    sector_plan = get_catalog().get(sector)
+    risks = sector_plan["risks"] if sector_plan is not None else None
+    if any(row.get(column) for _, column in LEVEL_COLUMNS):
+        team_members = {key: _split_names(row.get(column)) for key, column in LEVEL_COLUMNS}
+        team_size = int(row.get("team_size") or sum(map(len, team_members.values())) or 1)
+    else:
+        names = _split_names(row.get("team_members"))
+        team_size = int(row.get("team_size") or len(names) or 1)
+        team_members = split_team(names, team_size, risks)
+    return build_audit_plan(
+        str(row["company_name"]).strip(),
+        sector,
+        _parse_date(row["audit_start_date"]),
+        _parse_date(row["audit_end_date"]),
+        team_size,
+        team_members
+    )
+
+
+def report_filename(company_name):
+    safe_name = re.sub(r"[^\w.-]+", "_", company_name.strip()).strip("_") or "company"
+    return f"financial_audit_plan_{safe_name}.pdf"
+
+
+def _init_worker():
+    # Import reportlab and compile the report template once per worker process.
+    from pdf_generator import get_report_template
+    get_report_template()
+
+
+def _render_item(index, audit_plan):
+    from pdf_generator import generate_pdf_download
+    started = time.perf_counter()
+    try:
+        pdf_bytes = generate_pdf_download(audit_plan, use_cache=False)
+    except Exception as e:
+        return index, None, time.perf_counter() - started, f"{type(e).__name__}: {e}"
+    return index, pdf_bytes, time.perf_counter() - started, None
+
+
+class _DirectorySink:
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, filename, data):
+        with open(os.path.join(self.out_dir, filename), "wb") as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class _ZipSink:
+    def __init__(self, zip_path):
+        stream = sys.stdout.buffer if zip_path == "-" else zip_path
+        # PDF page streams are already compressed, so entries are stored as-is.
+        self.archive = zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED)
+
+    def write(self, filename, data):
+        self.archive.writestr(filename, data)
+
+    def close(self):
+        self.archive.close()
+
+
+def _unique_filename(filename, used):
+    if filename not in used:
+        used.add(filename)
+        return filename
+    stem, ext = os.path.splitext(filename)
+    counter = 2
+    while f"{stem}_{counter}{ext}" in used:
+        counter += 1
+    filename = f"{stem}_{counter}{ext}"
+    used.add(filename)
+    return filename
+
+
+def run_batch(rows, sink, workers=None, max_in_flight=None, log=None):
+    """Render every roster row into ``sink`` and return per-item results.
+
+    Each result is a dict with ``row``, ``company_name``, ``file``,
+    ``seconds`` and ``error`` keys. Rows that cannot be turned into a plan
+    are reported as failures without being sent to the pool.
+    """
+    results = [None] * len(rows)
+    pending_plans = []
+    for index, row in enumerate(rows):
+        try:
+            pending_plans.append((index, plan_from_row(row)))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            results[index] = {
+                "row": index,
+                "company_name": row.get("company_name"),
+                "file": None,
+                "seconds": 0.0,
+                "error": error,
+            }
+            if log is not None:
+                print(f"[{index}] {row.get('company_name')}: FAILED ({error})", file=log)
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    used_names = set()
+    plans = dict(pending_plans)
+    queue = iter(pending_plans)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        in_flight = set()
+
+        def submit_next():
+            item = next(queue, None)
+            if item is not None:
+                in_flight.add(executor.submit(_render_item, *item))
+
+        for _ in range(max_in_flight):
+            submit_next()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.discard(future)
+                index, pdf_bytes, seconds, error = future.result()
+                company_name = plans[index]["company_name"]
+                filename = None
+                if error is None:
+                    filename = _unique_filename(report_filename(company_name), used_names)
+                    sink.write(filename, pdf_bytes)
+                results[index] = {
+                    "row": index,
+                    "company_name": company_name,
+                    "file": filename,
+                    "seconds": seconds,
+                    "error": error,
+                }
+                if log is not None:
+                    status = "ok" if error is None else f"FAILED ({error})"
+                    print(f"[{index}] {company_name}: {seconds * 1000:.1f} ms {status}", file=log)
+                submit_next()
+    return results
+
+
+def run_group(rows, output_path, group_name, log=None):
+    """Render every roster row into one group report at ``output_path``.
+
+    Returns per-row results like ``run_batch``. Rows that cannot be turned
+    into a plan are left out of the report and reported as failures.
+    """
+    from pdf_generator import create_group_report
+    results = []
+    plans = []
+    for index, row in enumerate(rows):
+        try:
+            plans.append(plan_from_row(row))
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if log is not None:
+                print(f"[{index}] {row.get('company_name')}: FAILED ({error})", file=log)
+        results.append({
+            "row": index,
+            "company_name": row.get("company_name"),
+            "file": None if error else output_path,
+            "seconds": 0.0,
+            "error": error,
+        })
+    if plans:
+        started = time.perf_counter()
+        create_group_report(group_name, plans, output_path)
+        # The entities share one build; split its time evenly for the summary.
+        seconds = (time.perf_counter() - started) / len(plans)
+        for result in results:
+            if not result["error"]:
+                result["seconds"] = seconds
+    return results
+
+
+def summarize(results, elapsed):
+    failures = [result for result in results if result["error"]]
+    render_times = sorted(result["seconds"] for result in results if not result["error"])
+    summary = {
+        "total": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "elapsed_seconds": elapsed,
+        "reports_per_second": (len(render_times) / elapsed) if elapsed else 0.0,
+    }
+    if render_times:
+        summary["render_ms_p50"] = render_times[len(render_times) // 2] * 1000
+        summary["render_ms_max"] = render_times[-1] * 1000
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render audit plan PDFs for a roster of companies.")
+    parser.add_argument("roster", help="CSV or Parquet roster file")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--out-dir", help="Directory to write one PDF per company into")
+    output.add_argument("--zip", dest="zip_path", help="ZIP file to stream the PDFs into ('-' for stdout)")
+    output.add_argument("--group", dest="group_path", help="Write one consolidated group report PDF here")
+    parser.add_argument("--group-name", help="Title of the group report (default: the roster file name)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--manifest", help="Write per-item timings and failures to this JSON file")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    args = parser.parse_args(argv)
+
+    rows = read_roster(args.roster)
+    # Keep stdout clean when the ZIP itself is streamed there.
+    log = None if args.quiet else sys.stderr
+    started = time.perf_counter()
+    if args.group_path:
+        group_name = args.group_name or os.path.splitext(os.path.basename(args.roster))[0]
+        results = run_group(rows, args.group_path, group_name, log=log)
+    else:
+        sink = _ZipSink(args.zip_path) if args.zip_path else _DirectorySink(args.out_dir)
+        try:
+            results = run_batch(rows, sink, workers=args.workers, log=log)
+        finally:
+            sink.close()
+    summary = summarize(results, time.perf_counter() - started)
+
+    if args.manifest:
+        with open(args.manifest, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "items": results}, f, indent=2)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Cold-launch timing for the Streamlit app and frozen builds.
+
+Starts the app in a fresh process, then measures from process start until:
+    ready        ``/_stcore/health`` answers 200
+    first_page   a browser session has finished the first run of ``app.py``
+
+The first page is measured as a browser would load it: a websocket session is
+opened on ``/_stcore/stream``, a rerun is requested and the clock stops at
+the ``script_finished`` message. The app is stopped after every launch.
+
+Usage:
+    python -m benchmarks.cold_launch
+    python -m benchmarks.cold_launch --exe dist/Financial_Audit_Assistant/Financial_Audit_Assistant.exe
+    python -m benchmarks.cold_launch --runs 5 --json launch.json --budget-ms 8000
+
+Without ``--exe`` the source tree is launched with ``launcher.py``, the frozen
+entry point. The process exits with status 1 when the median time to first
+page exceeds ``--budget-ms``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.05
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(port, process, deadline):
+    from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+    client = AsyncHTTPClient()
+    url = f"http://127.0.0.1:{port}/_stcore/health"
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited with status {process.returncode} before it was ready")
+        try:
+            response = await client.fetch(url, request_timeout=1.0)
+            if response.code == 200:
+                return
+        except (HTTPClientError, OSError):
+            pass
+        await asyncio.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"No answer from {url}")
+
+
+async def _first_page(port, deadline):
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from tornado.websocket import websocket_connect
+
+    connection = await websocket_connect(
+        f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"]
+    )
+    try:
+        request = BackMsg()
+        request.rerun_script.query_string = ""
+        await connection.write_message(request.SerializeToString(), binary=True)
+        while time.perf_counter() < deadline:
+            data = await asyncio.wait_for(connection.read_message(), deadline - time.perf_counter())
+            if data is None:
+                raise RuntimeError("The app closed the session before the first page finished")
+            message = ForwardMsg()
+            message.ParseFromString(data)
+            if message.WhichOneof("type") == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py failed to compile")
+                return
+        raise TimeoutError("The first page did not finish")
+    finally:
+        connection.close()
+
+
+def launch_once(command, port, timeout):
+    """Start ``command`` and return the ms until ready and until the first page."""
+    env = dict(os.environ, STREAMLIT_SERVER_PORT=str(port))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = started + timeout
+
+        async def measure():
+            await _wait_ready(port, process, deadline)
+            ready = time.perf_counter()
+            await _first_page(port, deadline)
+            return ready, time.perf_counter()
+
+        ready, first_page = asyncio.run(measure())
+        return {
+            "ready_ms": (ready - started) * 1000.0,
+            "first_page_ms": (first_page - started) * 1000.0,
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize(runs):
+    return {
+        metric: {
+            "min": min(run[metric] for run in runs),
+            "median": statistics.median(run[metric] for run in runs),
+            "max": max(run[metric] for run in runs),
+        }
+        for metric in ("ready_ms", "first_page_ms")
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure time from launch to first page.")
+    parser.add_argument("--exe", help="Frozen build to launch (default: launcher.py from source)")
+    parser.add_argument("--runs", type=int, default=3, help="Cold launches to time")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed per launch")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the median first page exceeds this")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results here")
+    args = parser.parse_args(argv)
+
+    command = [os.path.abspath(args.exe)] if args.exe else [sys.executable, "launcher.py"]
+    runs = []
+    for number in range(1, args.runs + 1):
+        run = launch_once(command, free_port(), args.timeout)
+        runs.append(run)
+        print(f"run {number}: ready {run['ready_ms']:.0f} ms, first page {run['first_page_ms']:.0f} ms")
+    summary = summarize(runs)
+    for metric, values in summary.items():
+        print(f"{metric:<14} min {values['min']:7.0f}  median {values['median']:7.0f}  max {values['max']:7.0f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"command": command, "runs": runs, "summary": summary}, f, indent=2)
+
+    median = summary["first_page_ms"]["median"]
+    if args.budget_ms is not None and median > args.budget_ms:
+        print(f"FAIL: median first page {median:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Benchmarks for the planning and PDF rendering hot paths.
+
+Usage:
+    python -m benchmarks.hot_paths --json results.json
+    python -m benchmarks.hot_paths --quick --compare baseline.json --threshold 0.2
+
+Each scenario renders a synthetic plan repeatedly and records latency
+percentiles, peak traced memory and, for the throughput scenario, reports
+per second per core. ``--compare`` checks every scenario against a previous
+results file and exits with status 1 when any of these regressed:
+
+- p50 latency, by more than ``--threshold`` (a fraction, default 0.15) and by
+  at least ``--min-delta-ms``
+- peak traced memory, by more than ``--memory-threshold`` (default 0.10)
+- reports per second per core, by more than ``--throughput-threshold``
+  (default 0.15)
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synthetic import synthetic_plan
+from sector_catalog import get_catalog
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scenarios(quick=False):
+    """Return ``(name, plan_kwargs)`` pairs covering the scaling dimensions."""
+    team_sizes = (5, 50) if quick else (5, 50, 500, 5000)
+    risk_counts = (3, 30) if quick else (3, 30, 300)
+    text_lengths = (0, 2000) if quick else (0, 2000, 20000)
+    items = []
+    for team_size in team_sizes:
+        items.append((f"team_size={team_size}", {"team_size": team_size}))
+    for risks in risk_counts:
+        items.append((f"risks_per_level={risks}", {"risks_per_level": risks}))
+    for length in text_lengths:
+        items.append((f"text_length={length}", {"text_length": length}))
+    for sector in get_catalog().names():
+        items.append((f"sector={sector}", {"sector": sector}))
+    return items
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _render_uncached(audit_plan):
+    from pdf_generator import create_pdf_report
+    buffer = io.BytesIO()
+    create_pdf_report(audit_plan, buffer)
+    return buffer.getbuffer().nbytes
+
+
+def measure_latency(func, arg, iterations, warmup=2):
+    """Return latency statistics (ms) for ``func(arg)`` over ``iterations`` runs."""
+    for _ in range(warmup):
+        func(arg)
+    gc.collect()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func(arg)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 0.50),
+        "p90_ms": percentile(samples, 0.90),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": samples[-1],
+    }
+
+
+def measure_peak_memory(func, arg):
+    """Return the peak traced allocation (KiB) of a single ``func(arg)`` call."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024.0
+
+
+def _throughput_worker(args):
+    plan_kwargs, count = args
+    audit_plan = synthetic_plan(**plan_kwargs)
+    _render_uncached(audit_plan)
+    started = time.perf_counter()
+    for _ in range(count):
+        _render_uncached(audit_plan)
+    return count, time.perf_counter() - started
+
+
+def measure_throughput(plan_kwargs, workers, renders_per_worker):
+    """Render in ``workers`` processes and return reports/s overall and per core."""
+    jobs = [(plan_kwargs, renders_per_worker)] * workers
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_throughput_worker, jobs))
+    elapsed = time.perf_counter() - started
+    total = sum(count for count, _ in results)
+    busy = sum(seconds for _, seconds in results)
+    return {
+        "workers": workers,
+        "reports": total,
+        "reports_per_second": total / elapsed if elapsed else 0.0,
+        "reports_per_second_per_core": total / busy if busy else 0.0,
+    }
+
+
+def measure_planning_rerun(iterations):
+    """Time a full rerun of the planning page through Streamlit's AppTest."""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+    app_test = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=60).run()
+    app_test.text_input[0].input("Synthetic Holdings").run()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        app_test.run()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": percentile(samples, 0.50),
+        "p90_ms": percentile(samples, 0.90),
+        "p99_ms": percentile(samples, 0.99),
+        "max_ms": samples[-1],
+    }
+
+
+def run_suite(quick=False, iterations=None, workers=None):
+    from pdf_generator import generate_pdf_download
+
+    iterations = iterations or (5 if quick else 20)
+    results = {}
+    for name, plan_kwargs in scenarios(quick):
+        audit_plan = synthetic_plan(**plan_kwargs)
+        entry = measure_latency(_render_uncached, audit_plan, iterations)
+        entry["peak_kib"] = measure_peak_memory(_render_uncached, audit_plan)
+        entry["pdf_bytes"] = _render_uncached(audit_plan)
+        results[f"render[{name}]"] = entry
+        print(f"render[{name}]: p50 {entry['p50_ms']:.1f} ms, p99 {entry['p99_ms']:.1f} ms, "
+              f"peak {entry['peak_kib']:.0f} KiB", file=sys.stderr)
+
+    cached_plan = synthetic_plan()
+    results["download[cached]"] = measure_latency(generate_pdf_download, cached_plan, iterations * 10)
+
+    workers = workers or os.cpu_count() or 1
+    results["throughput"] = measure_throughput({}, workers, 10 if quick else 50)
+    print(f"throughput: {results['throughput']['reports_per_second_per_core']:.1f} reports/s/core",
+          file=sys.stderr)
+
+    rerun = measure_planning_rerun(iterations)
+    if rerun is not None:
+        results["planning_rerun"] = rerun
+        print(f"planning_rerun: p50 {rerun['p50_ms']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+# (metric, unit, True when a higher value is worse)
+COMPARED_METRICS = (
+    ("p50_ms", "ms", True),
+    ("peak_kib", "KiB", True),
+    ("reports_per_second_per_core", "reports/s/core", False),
+)
+
+
+def compare(current, baseline, threshold, min_delta_ms=1.0, memory_threshold=0.10,
+            throughput_threshold=0.15):
+    """Return ``(name, metric, unit, baseline, current)`` for each regressed metric.
+
+    p50 latency and peak memory regress when they grow by more than
+    ``threshold`` and ``memory_threshold``; throughput per core regresses when
+    it drops by more than ``throughput_threshold``. p50 changes smaller than
+    ``min_delta_ms`` are ignored so sub-millisecond scenarios do not fail on
+    timer noise.
+    """
+    tolerances = {
+        "p50_ms": threshold,
+        "peak_kib": memory_threshold,
+        "reports_per_second_per_core": throughput_threshold,
+    }
+    regressions = []
+    for name, entry in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, unit, higher_is_worse in COMPARED_METRICS:
+            if metric not in entry or metric not in previous:
+                continue
+            before, after = previous[metric], entry[metric]
+            tolerance = tolerances[metric]
+            if higher_is_worse:
+                regressed = after > before * (1 + tolerance)
+                if metric == "p50_ms":
+                    regressed = regressed and after - before > min_delta_ms
+            else:
+                regressed = after < before * (1 - tolerance)
+            if regressed:
+                regressions.append((name, metric, unit, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark planning and PDF rendering hot paths.")
+    parser.add_argument("--quick", action="store_true", help="Smaller grid and fewer iterations")
+    parser.add_argument("--iterations", type=int, default=None, help="Timed renders per scenario")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the throughput run")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results here")
+    parser.add_argument("--compare", help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed p50 slowdown (fraction)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Ignore p50 changes smaller than this")
+    parser.add_argument("--memory-threshold", type=float, default=0.10,
+                        help="Allowed peak memory growth (fraction)")
+    parser.add_argument("--throughput-threshold", type=float, default=0.15,
+                        help="Allowed drop in reports per second per core (fraction)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(quick=args.quick, iterations=args.iterations, workers=args.workers)
+    document = {"environment": environment(), "results": results}
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms,
+                              args.memory_threshold, args.throughput_threshold)
+        for name, metric, unit, before, after in regressions:
+            print(f"REGRESSION {name}: {metric} {before:.1f} {unit} -> {after:.1f} {unit}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} p50, {args.memory_threshold:.0%} memory "
+              f"or {args.throughput_threshold:.0%} throughput")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
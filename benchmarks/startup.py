@@ -0,0 +1,159 @@
+"""Cold-start import benchmark for the Streamlit app and the frozen build.
+
+Runs each target in a fresh interpreter with ``-X importtime`` and reports
+the import cost attributed to each top-level package, so heavy dependencies
+that sneak back into the startup path are easy to spot.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget-ms 800 --json startup.json
+    python -m benchmarks.startup --spec Financial_Audit_Assistant.spec
+
+Targets:
+    app       ``import app`` -- what ``streamlit run app.py`` pays before first paint
+    pdf       ``import pdf_generator`` -- deferred until the first PDF request
+    spec      every ``hiddenimports`` entry of a PyInstaller spec (with ``--spec``)
+
+The process exits with status 1 when the ``app`` target exceeds ``--budget-ms``.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+def measure_imports(statement, repeat=3):
+    """Import ``statement`` in fresh interpreters and return the fastest run.
+
+    The result holds the wall time of the statement, the summed import time
+    and a per-top-level-package breakdown in ms, plus any modules reported
+    as missing by the statement.
+    """
+    best = None
+    for _ in range(repeat):
+        run = _measure_once(statement)
+        if best is None or run["imports_ms"] < best["imports_ms"]:
+            best = run
+    return best
+
+
+def _measure_once(statement):
+    env = dict(os.environ)
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    env["PYTHONDONTWRITEBYTECODE"] = "0"
+    code = "\n".join([
+        "import time",
+        "_t = time.perf_counter()",
+        statement,
+        "print('__elapsed__', time.perf_counter() - _t)",
+    ])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{proc.stderr[-2000:]}")
+
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        # Attribute each module's self time to its top-level package, so the
+        # breakdown shows which distributions the import pulled in.
+        self_us, module = int(match.group(1)), match.group(2)
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_us / 1000.0
+
+    elapsed = 0.0
+    missing = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("__elapsed__"):
+            elapsed = float(line.split()[1]) * 1000.0
+        elif line.startswith("__missing__"):
+            missing.append(line.split()[1])
+    return {
+        "statement": statement,
+        "wall_ms": elapsed,
+        "missing": missing,
+        "imports_ms": sum(packages.values()),
+        "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+def spec_hiddenimports(spec_path):
+    """Return the ``hiddenimports`` list from a PyInstaller spec file."""
+    with open(spec_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), spec_path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, "id", None) == "Analysis":
+            for keyword in node.keywords:
+                if keyword.arg == "hiddenimports":
+                    return [ast.literal_eval(element) for element in keyword.value.elts]
+    return []
+
+
+# Distribution names listed in specs that differ from their import names
+IMPORT_NAMES = {"gitpython": "git", "grpcio": "grpc", "Pillow": "PIL"}
+
+
+def _print_report(name, result, top):
+    label = result["statement"] if "\n" not in result["statement"] else "hiddenimports"
+    print(f"{name}: {label}")
+    print(f"  wall {result['wall_ms']:.1f} ms, imports {result['imports_ms']:.1f} ms")
+    if result["missing"]:
+        print(f"  missing: {', '.join(result['missing'])}")
+    for package, ms in list(result["packages"].items())[:top]:
+        print(f"    {package:<28} {ms:9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target (fastest is kept)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if importing app exceeds this")
+    parser.add_argument("--spec", help="Also measure the hiddenimports of this PyInstaller spec")
+    parser.add_argument("--top", type=int, default=10, help="Packages to show per target")
+    parser.add_argument("--json", dest="json_path", help="Write machine-readable results here")
+    args = parser.parse_args(argv)
+
+    targets = {
+        "app": "import app",
+        "pdf": "import pdf_generator",
+    }
+    if args.spec:
+        modules = [IMPORT_NAMES.get(name, name) for name in spec_hiddenimports(args.spec)]
+        # Modules missing from this environment are reported, not fatal.
+        targets["spec"] = (
+            f"for _module in {modules!r}:\n"
+            "    try:\n"
+            "        __import__(_module)\n"
+            "    except ImportError:\n"
+            "        print('__missing__', _module)"
+        )
+
+    results = {}
+    for name, statement in targets.items():
+        results[name] = measure_imports(statement, repeat=args.repeat)
+        _print_report(name, results[name], args.top)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.budget_ms is not None and results["app"]["wall_ms"] > args.budget_ms:
+        print(f"FAIL: app startup {results['app']['wall_ms']:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Deterministic synthetic inputs for the benchmarks."""
+import random
+
+from planning import split_team
+from sector_catalog import get_catalog
+
+FIRST_NAMES = ("Alex", "Blake", "Casey", "Dana", "Emery", "Finley", "Gray", "Harper", "Jordan", "Kai")
+LAST_NAMES = ("Adams", "Baker", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jones")
+WORDS = (
+    "revenue", "controls", "ledger", "reconciliation", "variance", "materiality", "assertion",
+    "inventory", "accrual", "journal", "disclosure", "valuation", "testing", "sample",
+)
+
+
+def synthetic_text(rng, length):
+    """Return roughly ``length`` characters of audit-flavoured prose."""
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words).capitalize()
+
+
+def synthetic_names(count, seed=0):
+    rng = random.Random(seed)
+    return [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {index}" for index in range(count)]
+
+
+def synthetic_plan(team_size=5, risks_per_level=3, sector="Technology", text_length=0, seed=0):
+    """Build an ``audit_plan`` shaped like the planning page's output.
+
+    ``risks_per_level`` pads or trims each risk list, and ``text_length``
+    appends that many characters of free text to every objective, scope item
+    and risk to model long, hand-edited entries.
+    """
+    rng = random.Random(seed)
+    template = get_catalog().get(sector)
+
+    def stretch(items, count=None):
+        items = list(items)
+        if count is not None:
+            items = [items[index % len(items)] if items else f"Item {index}" for index in range(count)]
+        if text_length:
+            items = [f"{item}: {synthetic_text(rng, text_length)}" for item in items]
+        return items
+
+    risks = {level: stretch(items, risks_per_level) for level, items in template["risks"].items()}
+    return {
+        "company_name": f"Synthetic Holdings {seed}",
+        "sector": sector,
+        "audit_period": "January 01, 2024 to March 31, 2024",
+        "team_size": team_size,
+        "objectives": stretch(template["objectives"]),
+        "scope": stretch(template["scope"]),
+        "risks": risks,
+        "team_members": split_team(synthetic_names(team_size, seed), team_size, risks),
+    }
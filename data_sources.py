@@ -0,0 +1,98 @@
+"""Helpers shared by the modules that read uploaded data files.
+
+- ``normalize_header`` and ``match_columns`` map source headers to fields
+  through per-module alias tables
+- ``dataset_hash`` identifies a set of source files or uploads
+- ``ResultCache`` keeps the last few results computed from them
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+def normalize_header(name):
+    """Return ``name`` lower-cased with runs of other characters turned into ``_``."""
+    return re.sub(r"[^0-9a-z]+", "_", str(name).strip().lower()).strip("_")
+
+
+def match_columns(names, aliases, column_map=None, error=ValueError, where="the file"):
+    """Map fields to source column names.
+
+    Each field takes the first of its ``aliases`` found among the normalized
+    ``names``. ``column_map`` overrides them with explicit ``{field: source}``
+    pairs; a source that is not in ``names`` raises ``error``. Required
+    fields are left to the caller to check.
+    """
+    by_key = {}
+    for name in names:
+        by_key.setdefault(normalize_header(name), name)
+    resolved = {}
+    for field, field_aliases in aliases.items():
+        for alias in field_aliases:
+            if alias in by_key:
+                resolved[field] = by_key[alias]
+                break
+    for field, source in (column_map or {}).items():
+        if source not in names:
+            raise error(f"Column {source!r} for {field!r} is not in {where}")
+        resolved[field] = source
+    return resolved
+
+
+def dataset_hash(sources):
+    """Return a hash identifying the contents of ``sources``.
+
+    Paths are identified by name, size and modification time. File objects
+    are hashed by content.
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            stat = os.stat(source)
+            digest.update(f"{os.path.abspath(source)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8"))
+        else:
+            digest.update(_source_bytes(source))
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _source_bytes(source):
+    if hasattr(source, "getbuffer"):
+        return source.getbuffer()
+    position = source.tell()
+    data = source.read()
+    source.seek(position)
+    return data
+
+
+class ResultCache:
+    """Thread-safe LRU of results keyed by dataset hash and options."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        """Return the result for ``key``, calling ``build`` on a miss.
+
+        ``build`` runs outside the lock, so two threads missing the same key
+        may both build it; the last one is kept.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,368 @@
+"""Duplicate and near-duplicate vendor payment detection.
+
+Usage:
+    python duplicate_payments.py gl_2024.arrow --workers 8
+
+Works on ledgers normalized by ``ledger_ingest``. No step compares every
+payment with every other payment:
+
+- Exact duplicates fall out of one hash group-by on
+  ``(vendor, amount, invoice number)``.
+- Near-duplicates are found inside blocks. Within each block the rows are
+  sorted and compared only with their next few neighbours:
+  - same vendor and normalized invoice number, amounts within tolerance
+    (``INV-0042`` vs ``inv42``)
+  - same vendor and amount, different invoice, posted within a few days
+
+Amounts keep their sign. An invoice and its payment, or a posting and its
+reversal, net to zero and are never matched with each other.
+
+Payments are split into partitions by a stable hash of the vendor. Every
+match lies within one vendor, so partitions are independent and run in
+parallel worker processes. Each worker memory-maps the ledger itself.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from planning import make_finding
+
+SOURCE = "Duplicate payment tests"
+LEDGER_COLUMNS = ("entry_id", "posting_date", "vendor", "invoice_number", "amount")
+
+EXACT = "Exact duplicate"
+INVOICE_VARIANT = "Invoice number variant"
+SAME_AMOUNT = "Same amount, close dates"
+MATCH_KINDS = (EXACT, INVOICE_VARIANT, SAME_AMOUNT)
+FINDING_TITLES = {
+    EXACT: "Exact duplicate payments",
+    INVOICE_VARIANT: "Near-duplicate payments (invoice number variants)",
+    SAME_AMOUNT: "Near-duplicate payments (same amount, close dates)",
+}
+
+AMOUNT_TOLERANCE = 1.00
+AMOUNT_TOLERANCE_RATIO = 0.01
+INVOICE_VARIANT_WINDOW_DAYS = 90
+SAME_AMOUNT_WINDOW_DAYS = 7
+# Same-amount matches below this are usually recurring small charges
+SAME_AMOUNT_MINIMUM = 100.0
+# How many sorted neighbours each payment is compared with inside a block
+MAX_NEIGHBOURS = 5
+PARALLEL_MIN_ROWS = 200_000
+MAX_APPENDIX_ROWS = 1000
+APPENDIX_COLUMNS = ["Match", "Vendor", "Invoices", "Dates", "Amounts", "Exposure"]
+APPENDIX_WIDTHS = [76, 100, 104, 84, 84, 64]
+APPENDIX_LABELS = {EXACT: "Exact", INVOICE_VARIANT: "Invoice variant", SAME_AMOUNT: "Same amount"}
+# Characters that are commonly mistyped or misread in invoice numbers
+INVOICE_CONFUSABLES = (("O", "0"), ("I", "1"), ("L", "1"), ("S", "5"), ("B", "8"))
+
+
+def normalize_invoices(invoices):
+    """Return a canonical form of invoice numbers for fuzzy blocking.
+
+    Upper-cases, drops punctuation and spaces, folds look-alike letters into
+    digits and strips leading zeros, so ``INV-0042`` and ``inv42`` match.
+    """
+    text = pc.utf8_upper(invoices)
+    text = pc.replace_substring_regex(text, r"[^0-9A-Z]", "")
+    text = pc.replace_substring_regex(text, r"^INV(OICE)?", "")
+    for letter, digit in INVOICE_CONFUSABLES:
+        text = pc.replace_substring(text, letter, digit)
+    text = pc.replace_substring_regex(text, r"^0+", "")
+    return pc.if_else(pc.equal(text, ""), pa.scalar(None, pa.string()), text)
+
+
+def vendor_partitions(vendors, partitions):
+    """Return a stable partition number for every value of a vendor column."""
+    if isinstance(vendors, pa.ChunkedArray):
+        vendors = vendors.combine_chunks()
+    if not pa.types.is_dictionary(vendors.type):
+        vendors = pc.dictionary_encode(vendors)
+    # crc32, unlike hash(), gives the same answer in every worker process.
+    by_code = np.fromiter(
+        (zlib.crc32(value.encode("utf-8")) % partitions for value in vendors.dictionary.to_pylist()),
+        dtype=np.int64,
+        count=len(vendors.dictionary)
+    )
+    codes = vendors.indices.fill_null(0).to_numpy(zero_copy_only=False)
+    result = by_code[codes] if len(by_code) else np.zeros(len(codes), dtype=np.int64)
+    return np.where(vendors.indices.is_null().to_numpy(zero_copy_only=False), -1, result)
+
+
+def payments_frame(table):
+    """Return one row per vendor payment, ready for matching.
+
+    Rows without a vendor or with a zero amount are dropped. So are repeated
+    lines of the same entry, which would otherwise match each other.
+    ``amount`` and ``cents`` keep the ledger sign.
+    """
+    table = table.filter(pc.and_(pc.is_valid(table.column("vendor")),
+                                 pc.not_equal(pc.fill_null(table.column("amount"), 0.0), 0.0)))
+    amounts = table.column("amount").to_numpy()
+    columns = table.schema.names
+    frame = pd.DataFrame({
+        "entry_id": table.column("entry_id").to_pandas() if "entry_id" in columns else None,
+        "vendor": pc.cast(table.column("vendor"), pa.string()).to_pandas(),
+        "invoice": table.column("invoice_number").to_pandas(),
+        "invoice_key": normalize_invoices(table.column("invoice_number")).to_pandas(),
+        "date": table.column("posting_date").cast(pa.int32()).to_pandas(),
+        "amount": amounts,
+        "cents": np.round(amounts * 100).astype(np.int64),
+    })
+    # Normalized ledgers always have an entry_id column, but it is all null
+    # when the source had none. Only lines with an entry id can be repeats;
+    # the others are told apart by their row position.
+    has_entry = frame["entry_id"].notna().to_numpy()
+    if has_entry.any():
+        repeated = frame.duplicated(["entry_id", "vendor", "cents", "invoice"]).to_numpy() & has_entry
+        frame = frame[~repeated]
+        has_entry = has_entry[~repeated]
+    frame = frame.reset_index(drop=True)
+    if not has_entry.all():
+        positions = np.arange(len(frame)).astype(str)
+        frame["entry_id"] = np.where(has_entry, frame["entry_id"].to_numpy(dtype=object), positions)
+    return frame
+
+
+def exact_duplicates(frame):
+    """Return match dicts for groups sharing vendor, signed amount and invoice."""
+    keyed = frame[frame["invoice"].notna()]
+    size = keyed.groupby(["vendor", "cents", "invoice"], sort=False)["entry_id"].transform("size")
+    duplicated = keyed[size > 1]
+    matches = []
+    for (vendor, _, invoice), group in duplicated.groupby(["vendor", "cents", "invoice"], sort=False):
+        amount = abs(float(group["amount"].iloc[0]))
+        matches.append(_match(EXACT, vendor, group, exposure=amount * (len(group) - 1)))
+    return matches
+
+
+def near_duplicates(frame, amount_tolerance=AMOUNT_TOLERANCE, amount_ratio=AMOUNT_TOLERANCE_RATIO,
+                    invoice_window=INVOICE_VARIANT_WINDOW_DAYS, same_amount_window=SAME_AMOUNT_WINDOW_DAYS,
+                    neighbours=MAX_NEIGHBOURS):
+    """Return match dicts for near-duplicate payment pairs.
+
+    Exact duplicates are excluded; ``exact_duplicates`` reports those. Both
+    payments of a pair have the same sign.
+    """
+    matches = []
+    dates = frame["date"].to_numpy(dtype=float, na_value=np.nan)
+
+    # Same vendor and normalized invoice, amount within tolerance.
+    keyed = frame[frame["invoice_key"].notna()]
+    for a, b in _block_pairs(keyed, ["vendor", "invoice_key"], "cents", neighbours):
+        cents_a, cents_b = frame["cents"].to_numpy()[a], frame["cents"].to_numpy()[b]
+        limit = np.maximum(amount_tolerance * 100, amount_ratio * np.maximum(np.abs(cents_a), np.abs(cents_b)))
+        same_invoice = frame["invoice"].to_numpy()[a] == frame["invoice"].to_numpy()[b]
+        keep = (
+            (np.abs(cents_b - cents_a) <= limit)
+            # An invoice and its payment or reversal nets to zero
+            & (np.sign(cents_a) == np.sign(cents_b))
+            & ~(same_invoice & (cents_a == cents_b))
+            & ~(np.abs(dates[b] - dates[a]) > invoice_window)
+        )
+        matches.extend(_pair_matches(INVOICE_VARIANT, frame, a[keep], b[keep]))
+
+    # Same vendor and amount, different invoice, posted close together.
+    sized = frame[frame["amount"].abs() >= SAME_AMOUNT_MINIMUM]
+    sized = sized.assign(date=sized["date"].fillna(-10 ** 9))
+    invoice_keys = frame["invoice_key"].to_numpy()
+    for a, b in _block_pairs(sized, ["vendor", "cents"], "date", neighbours):
+        different_invoice = (
+            pd.isna(invoice_keys[a]) | pd.isna(invoice_keys[b]) | (invoice_keys[a] != invoice_keys[b])
+        )
+        keep = (np.abs(dates[b] - dates[a]) <= same_amount_window) & different_invoice
+        matches.extend(_pair_matches(SAME_AMOUNT, frame, a[keep], b[keep]))
+    return matches
+
+
+def _block_pairs(frame, block_columns, order_column, neighbours):
+    """Yield ``(a, b)`` row-position arrays of neighbours inside each block.
+
+    Rows are sorted by block and then ``order_column``. Each row is paired
+    with the next ``neighbours`` rows of its block, so the work is linear in
+    the number of rows rather than quadratic in block size.
+    """
+    if len(frame) < 2:
+        return
+    ordered = frame.sort_values(block_columns + [order_column], kind="stable")
+    blocks = ordered.groupby(block_columns, sort=False).ngroup().to_numpy()
+    positions = ordered.index.to_numpy()
+    entries = ordered["entry_id"].to_numpy()
+    for lag in range(1, min(neighbours, len(ordered) - 1) + 1):
+        same_block = (blocks[lag:] == blocks[:-lag]) & (entries[lag:] != entries[:-lag])
+        if not same_block.any():
+            break
+        yield positions[:-lag][same_block], positions[lag:][same_block]
+
+
+def _pair_matches(kind, frame, a, b):
+    if not len(a):
+        return []
+    vendors = frame["vendor"].to_numpy()
+    invoices = frame["invoice"].to_numpy()
+    dates = frame["date"].to_numpy()
+    amounts = frame["amount"].to_numpy()
+    entries = frame["entry_id"].to_numpy()
+    return [
+        {
+            "kind": kind,
+            "vendor": vendors[first],
+            "invoices": [_invoice_text(invoices[first]), _invoice_text(invoices[second])],
+            "dates": [_date_text(dates[first]), _date_text(dates[second])],
+            "amounts": [float(amounts[first]), float(amounts[second])],
+            "entries": [str(entries[first]), str(entries[second])],
+            "exposure": float(min(abs(amounts[first]), abs(amounts[second]))),
+        }
+        for first, second in zip(a, b)
+    ]
+
+
+def _match(kind, vendor, rows, exposure):
+    return {
+        "kind": kind,
+        "vendor": vendor,
+        "invoices": [_invoice_text(value) for value in rows["invoice"]],
+        "dates": [_date_text(value) for value in rows["date"]],
+        "amounts": [float(value) for value in rows["amount"]],
+        "entries": [str(value) for value in rows["entry_id"]],
+        "exposure": float(exposure),
+    }
+
+
+def _invoice_text(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _date_text(days):
+    if pd.isna(days) or days < 0:
+        return ""
+    return str(np.datetime64(int(days), "D"))
+
+
+def scan_table(table, **options):
+    """Return every exact and near-duplicate match in ``table``."""
+    frame = payments_frame(table)
+    return exact_duplicates(frame) + near_duplicates(frame, **options)
+
+
+def _scan_partition(ledger_path, partition, partitions, options):
+    from ledger_ingest import open_ledger
+    table = open_ledger(ledger_path, columns=list(LEDGER_COLUMNS)).unify_dictionaries()
+    mask = vendor_partitions(table.column("vendor"), partitions) == partition
+    return scan_table(table.filter(pa.array(mask)), **options)
+
+
+def _default_workers():
+    # A frozen (PyInstaller) app would relaunch itself for every worker process.
+    if getattr(sys, "frozen", False):
+        return 1
+    return os.cpu_count() or 1
+
+
+def find_duplicate_payments(ledger_path, workers=None, partitions=None, **options):
+    """Scan a normalized ledger file and return matches, largest exposure first.
+
+    Ledgers with at least ``PARALLEL_MIN_ROWS`` rows are split into vendor
+    partitions and scanned by ``workers`` processes (default: CPU count, or
+    one in a frozen build).
+    ``options`` are passed to ``near_duplicates``.
+    """
+    from ledger_ingest import open_ledger
+    workers = workers or _default_workers()
+    rows = open_ledger(ledger_path, columns=["amount"]).num_rows
+    if workers == 1 or rows < PARALLEL_MIN_ROWS:
+        matches = scan_table(open_ledger(ledger_path, columns=list(LEDGER_COLUMNS)), **options)
+    else:
+        partitions = partitions or workers * 4
+        matches = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_scan_partition, ledger_path, partition, partitions, options)
+                for partition in range(partitions)
+            ]
+            for future in futures:
+                matches.extend(future.result())
+    matches.sort(key=lambda match: (-match["exposure"], match["vendor"], match["kind"]))
+    return matches
+
+
+def duplicate_findings(matches, risk_criteria=None):
+    """Summarize matches as one plan finding per match kind."""
+    findings = []
+    for kind in MATCH_KINDS:
+        selected = [match for match in matches if match["kind"] == kind]
+        if not selected:
+            continue
+        exposure = sum(match["exposure"] for match in selected)
+        vendors = len({match["vendor"] for match in selected})
+        findings.append(make_finding(
+            SOURCE,
+            FINDING_TITLES[kind],
+            exposure,
+            len(selected),
+            f"{len(selected):,} matches across {vendors:,} vendors; exposure is the amount "
+            f"potentially paid twice",
+            risk_criteria
+        ))
+    return findings
+
+
+def duplicate_appendix(matches, limit=MAX_APPENDIX_ROWS):
+    """Return the matches as an ``audit_plan`` appendix table."""
+    rows = [
+        [
+            APPENDIX_LABELS[match["kind"]],
+            match["vendor"],
+            "\n".join(invoice or "-" for invoice in match["invoices"][:3]),
+            "\n".join(match["dates"][:3]),
+            "\n".join(f"{amount:,.2f}" for amount in match["amounts"][:3]),
+            f"{match['exposure']:,.2f}",
+        ]
+        for match in matches[:limit]
+    ]
+    note = None
+    if len(matches) > limit:
+        note = f"Showing the {limit:,} largest of {len(matches):,} matches by exposure."
+    return {
+        "title": "Potential Duplicate Payments",
+        "columns": list(APPENDIX_COLUMNS),
+        "widths": list(APPENDIX_WIDTHS),
+        "rows": rows,
+        "note": note,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find duplicate vendor payments in a normalized ledger.")
+    parser.add_argument("ledger", help="Ledger written by ledger_ingest (.arrow or .parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--json", dest="json_path", help="Write every match to this JSON file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    matches = find_duplicate_payments(args.ledger, workers=args.workers)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(matches, f, indent=2)
+    summary = {
+        "matches": len(matches),
+        "exposure": sum(match["exposure"] for match in matches),
+        "seconds": time.perf_counter() - started,
+    }
+    for kind in MATCH_KINDS:
+        summary[kind] = sum(1 for match in matches if match["kind"] == kind)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
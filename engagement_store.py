@@ -0,0 +1,411 @@
+"""Persistent store of saved engagements in a local SQLite database.
+
+Each engagement keeps its full ``audit_plan`` as JSON. Its searchable parts
+are also stored in indexed tables:
+- company, sector and audit period
+- sector risks by level
+- team members
+- ledger findings by level
+
+Search and paging run on those indexes and never decode the plan JSON. There
+is one engagement per company and audit period; saving that period again
+updates it.
+
+The database runs in WAL mode, so readers never wait for a writer. A small
+pool of connections is shared by every Streamlit session and thread; each
+call borrows one for the duration of a transaction. Set
+``AUDIT_ENGAGEMENT_DB`` to choose the database file.
+"""
+import datetime
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from report_cache import normalize_plan
+
+DEFAULT_DB_PATH = os.environ.get(
+    "AUDIT_ENGAGEMENT_DB",
+    os.path.join(os.path.expanduser("~"), ".financial_audit_assistant", "engagements.db")
+)
+DEFAULT_POOL_SIZE = 4
+DEFAULT_PAGE_SIZE = 25
+BUSY_TIMEOUT_MS = 5000
+TEAM_KEYS = ("high_risk", "medium_risk", "low_risk")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS engagements (
+    id INTEGER PRIMARY KEY,
+    company TEXT NOT NULL,
+    company_key TEXT NOT NULL,
+    sector TEXT NOT NULL,
+    period_start TEXT NOT NULL,
+    period_end TEXT NOT NULL,
+    team_size INTEGER NOT NULL,
+    findings INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    plan_json TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS engagements_company_period
+    ON engagements (company_key, period_start, period_end);
+CREATE INDEX IF NOT EXISTS engagements_sector ON engagements (sector, period_start);
+CREATE INDEX IF NOT EXISTS engagements_period ON engagements (period_start, id);
+CREATE TABLE IF NOT EXISTS engagement_risks (
+    engagement_id INTEGER NOT NULL REFERENCES engagements (id) ON DELETE CASCADE,
+    level TEXT NOT NULL,
+    risk TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS engagement_risks_risk ON engagement_risks (risk, level);
+CREATE INDEX IF NOT EXISTS engagement_risks_engagement ON engagement_risks (engagement_id);
+CREATE TABLE IF NOT EXISTS engagement_staff (
+    engagement_id INTEGER NOT NULL REFERENCES engagements (id) ON DELETE CASCADE,
+    team TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS engagement_staff_name ON engagement_staff (name);
+CREATE INDEX IF NOT EXISTS engagement_staff_engagement ON engagement_staff (engagement_id);
+CREATE TABLE IF NOT EXISTS engagement_findings (
+    engagement_id INTEGER NOT NULL REFERENCES engagements (id) ON DELETE CASCADE,
+    level TEXT NOT NULL,
+    source TEXT NOT NULL,
+    title TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS engagement_findings_level ON engagement_findings (level, engagement_id);
+CREATE INDEX IF NOT EXISTS engagement_findings_engagement ON engagement_findings (engagement_id);
+"""
+# Databases created before periods were unique may hold several rows for
+# one company and period. Keep the most recently saved one so the unique
+# index can be built; the dropped rows' child rows go with them.
+MIGRATE_UNIQUE_PERIODS = """
+DELETE FROM engagements WHERE id NOT IN (
+    SELECT id FROM (
+        SELECT id, MAX(updated_at) FROM engagements GROUP BY company_key, period_start, period_end
+    )
+);
+DROP INDEX IF EXISTS engagements_company
+"""
+SUMMARY_COLUMNS = "id, company, sector, period_start, period_end, team_size, findings, updated_at"
+
+
+class EngagementStoreError(ValueError):
+    """Raised when an engagement cannot be saved or found."""
+
+
+def _company_key(company):
+    return " ".join(str(company).split()).casefold()
+
+
+def engagement_key(company, audit_start_date, audit_end_date):
+    """Return the key that identifies a company's engagement for one audit period."""
+    return f"{_company_key(company)}|{audit_start_date.isoformat()}|{audit_end_date.isoformat()}"
+
+
+def _prefix_bounds(prefix):
+    # Index-friendly replacement for ``LIKE 'prefix%'``
+    return prefix, prefix + "\U0010ffff"
+
+
+class _ConnectionPool:
+    """Fixed set of SQLite connections handed out one thread at a time."""
+
+    def __init__(self, path, size):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                     isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return connection
+
+    @contextmanager
+    def transaction(self, write=False):
+        """Borrow a connection and run the block in one transaction."""
+        connection = self._idle.get()
+        try:
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class EngagementStore:
+    """Saved engagements with indexed search, backed by one SQLite file."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, pool_size=DEFAULT_POOL_SIZE):
+        if path == ":memory:":
+            # Every in-memory connection is its own database.
+            pool_size = 1
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._pool = _ConnectionPool(path, pool_size)
+        with self._pool.transaction(write=True) as connection:
+            unique = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'engagements_company_period'"
+            ).fetchone()
+            has_table = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'engagements'"
+            ).fetchone()
+            statements = SCHEMA.split(";")
+            if has_table and not unique:
+                statements = MIGRATE_UNIQUE_PERIODS.split(";") + statements
+            for statement in statements:
+                if statement.strip():
+                    connection.execute(statement)
+
+    def save(self, audit_plan, audit_start_date, audit_end_date, engagement_id=None):
+        """Save ``audit_plan`` and return its engagement id.
+
+        A plan for a company and period that is already saved replaces that
+        engagement. Passing ``engagement_id`` replaces that engagement
+        instead, and fails if another engagement has the new company and
+        period. The plan's period dates are given separately because the plan
+        only carries the formatted period.
+        """
+        if audit_end_date < audit_start_date:
+            raise EngagementStoreError("The audit end date is before the start date")
+        plan = normalize_plan(audit_plan)
+        team_members = plan.get("team_members") or {}
+        findings = plan.get("findings") or []
+        now = time.time()
+        row = (
+            plan["company_name"], _company_key(plan["company_name"]), plan["sector"],
+            audit_start_date.isoformat(), audit_end_date.isoformat(), int(plan.get("team_size") or 0),
+            len(findings), now, json.dumps(plan, separators=(",", ":"))
+        )
+        with self._pool.transaction(write=True) as connection:
+            if engagement_id is None:
+                connection.execute(
+                    "INSERT INTO engagements (company, company_key, sector, period_start, period_end, "
+                    "team_size, findings, created_at, updated_at, plan_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (company_key, period_start, period_end) DO UPDATE SET "
+                    "company = excluded.company, sector = excluded.sector, team_size = excluded.team_size, "
+                    "findings = excluded.findings, updated_at = excluded.updated_at, "
+                    "plan_json = excluded.plan_json",
+                    row[:7] + (now,) + row[7:]
+                )
+                # lastrowid is not set when the upsert updates an existing row.
+                engagement_id = connection.execute(
+                    "SELECT id FROM engagements WHERE company_key = ? AND period_start = ? AND period_end = ?",
+                    (row[1], row[3], row[4])
+                ).fetchone()[0]
+            else:
+                try:
+                    cursor = connection.execute(
+                        "UPDATE engagements SET company = ?, company_key = ?, sector = ?, period_start = ?, "
+                        "period_end = ?, team_size = ?, findings = ?, updated_at = ?, plan_json = ? "
+                        "WHERE id = ?",
+                        row + (engagement_id,)
+                    )
+                except sqlite3.IntegrityError:
+                    raise EngagementStoreError(
+                        f"Another engagement is already saved for {plan['company_name']} in this period"
+                    ) from None
+                if cursor.rowcount == 0:
+                    raise EngagementStoreError(f"Unknown engagement: {engagement_id}")
+            for table in ("engagement_risks", "engagement_staff", "engagement_findings"):
+                connection.execute(f"DELETE FROM {table} WHERE engagement_id = ?", (engagement_id,))
+            connection.executemany(
+                "INSERT INTO engagement_risks (engagement_id, level, risk) VALUES (?, ?, ?)",
+                [(engagement_id, level, risk)
+                 for level, risks in (plan.get("risks") or {}).items() for risk in risks]
+            )
+            connection.executemany(
+                "INSERT INTO engagement_staff (engagement_id, team, position, name) VALUES (?, ?, ?, ?)",
+                [(engagement_id, team, position, name)
+                 for team in TEAM_KEYS
+                 for position, name in enumerate(team_members.get(team, [])) if name]
+            )
+            connection.executemany(
+                "INSERT INTO engagement_findings (engagement_id, level, source, title, count, amount) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(engagement_id, f["level"], f["source"], f["title"], f["count"], f["amount"])
+                 for f in findings]
+            )
+        return engagement_id
+
+    def get(self, engagement_id):
+        """Return the saved engagement, with its ``audit_plan``, or ``None``."""
+        with self._pool.transaction() as connection:
+            row = connection.execute(
+                f"SELECT {SUMMARY_COLUMNS}, plan_json FROM engagements WHERE id = ?", (engagement_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        engagement = _summary(row)
+        engagement["audit_plan"] = json.loads(row["plan_json"])
+        return engagement
+
+    def delete(self, engagement_id):
+        """Delete an engagement; returns ``True`` if it existed."""
+        with self._pool.transaction(write=True) as connection:
+            return connection.execute("DELETE FROM engagements WHERE id = ?", (engagement_id,)).rowcount > 0
+
+    def latest(self, company, before=None):
+        """Return the most recent engagement for ``company``.
+
+        ``before`` limits the search to engagements starting before that date.
+        Returns ``None`` when there is none.
+        """
+        query = "SELECT id FROM engagements WHERE company_key = ?"
+        params = [_company_key(company)]
+        if before is not None:
+            query += " AND period_start < ?"
+            params.append(before.isoformat())
+        query += " ORDER BY period_start DESC, id DESC LIMIT 1"
+        with self._pool.transaction() as connection:
+            row = connection.execute(query, params).fetchone()
+        return None if row is None else self.get(row["id"])
+
+    def search(self, company=None, sector=None, start=None, end=None, risk=None, finding_level=None,
+               staff=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+        """Return ``(engagements, total)`` for one page of matches, newest period first.
+
+        ``company`` matches a name prefix, ignoring case. ``start``/``end``
+        select engagements whose period overlaps the range. ``risk`` matches
+        a sector risk area exactly. ``finding_level`` keeps engagements with
+        a ledger finding at that level. ``staff`` matches a team member's
+        name exactly. The summaries do not include the plan itself.
+        """
+        where, params = _filters(company, sector, start, end, risk, finding_level, staff)
+        offset = (max(1, page) - 1) * page_size
+        with self._pool.transaction() as connection:
+            total = connection.execute(f"SELECT COUNT(*) FROM engagements{where}", params).fetchone()[0]
+            rows = connection.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM engagements{where} "
+                "ORDER BY period_start DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size, offset]
+            ).fetchall()
+        return [_summary(row) for row in rows], total
+
+    def count(self, company=None, sector=None, start=None, end=None, risk=None, finding_level=None,
+              staff=None):
+        """Return the number of engagements matching the ``search`` filters."""
+        where, params = _filters(company, sector, start, end, risk, finding_level, staff)
+        with self._pool.transaction() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM engagements{where}", params).fetchone()[0]
+
+    def bookings(self):
+        """Return ``(key, company, start, end, staff)`` for every saved engagement.
+
+        ``key`` is the ``engagement_key`` of the company and period; this is
+        what the portfolio scheduler is loaded from.
+        """
+        with self._pool.transaction() as connection:
+            rows = connection.execute(
+                "SELECT e.id, e.company, e.period_start, e.period_end, s.name FROM engagements e "
+                "LEFT JOIN engagement_staff s ON s.engagement_id = e.id ORDER BY e.id, s.team, s.position"
+            ).fetchall()
+        bookings = []
+        for _, group in itertools.groupby(rows, key=lambda row: row["id"]):
+            group = list(group)
+            first = group[0]
+            start = datetime.date.fromisoformat(first["period_start"])
+            end = datetime.date.fromisoformat(first["period_end"])
+            bookings.append((
+                engagement_key(first["company"], start, end), first["company"], start, end,
+                [row["name"] for row in group if row["name"]]
+            ))
+        return bookings
+
+    def sectors(self):
+        """Return the sectors that have saved engagements."""
+        with self._pool.transaction() as connection:
+            return [row[0] for row in connection.execute("SELECT DISTINCT sector FROM engagements ORDER BY sector")]
+
+    def __len__(self):
+        return self.count()
+
+    def close(self):
+        self._pool.close()
+
+
+def _filters(company, sector, start, end, risk, finding_level, staff):
+    """Return the ``WHERE`` clause and parameters for the search filters."""
+    clauses, params = [], []
+    if company:
+        low, high = _prefix_bounds(_company_key(company))
+        clauses.append("company_key >= ? AND company_key < ?")
+        params += [low, high]
+    if sector:
+        clauses.append("sector = ?")
+        params.append(sector)
+    if start is not None:
+        clauses.append("period_end >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        clauses.append("period_start <= ?")
+        params.append(end.isoformat())
+    if risk:
+        clauses.append("id IN (SELECT engagement_id FROM engagement_risks WHERE risk = ?)")
+        params.append(risk)
+    if finding_level:
+        clauses.append("id IN (SELECT engagement_id FROM engagement_findings WHERE level = ?)")
+        params.append(finding_level)
+    if staff:
+        clauses.append("id IN (SELECT engagement_id FROM engagement_staff WHERE name = ?)")
+        params.append(staff)
+    return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+def _summary(row):
+    return {
+        "id": row["id"],
+        "company_name": row["company"],
+        "sector": row["sector"],
+        "audit_start_date": datetime.date.fromisoformat(row["period_start"]),
+        "audit_end_date": datetime.date.fromisoformat(row["period_end"]),
+        "team_size": row["team_size"],
+        "findings": row["findings"],
+        "updated_at": datetime.datetime.fromtimestamp(row["updated_at"]),
+    }
+
+
+def shift_year(date, years=1):
+    """Return ``date`` moved by ``years``, mapping February 29 to February 28."""
+    try:
+        return date.replace(year=date.year + years)
+    except ValueError:
+        return date.replace(year=date.year + years, day=28)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_engagement_store():
+    """Return the process-wide engagement store at ``DEFAULT_DB_PATH``."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = EngagementStore()
+    return _default_store
@@ -0,0 +1,257 @@
+"""Timing spans, in-process histograms and Prometheus text export.
+
+Wrap a hot-path phase in ``span("name")`` to record its duration in a
+fixed-bucket histogram. Recording costs a ``perf_counter`` pair and one
+short lock, so spans can stay enabled in production. Call
+``configure_from_env`` once at startup to export the metrics:
+
+``AUDIT_METRICS_FILE``
+    Path that receives the Prometheus text exposition every
+    ``AUDIT_METRICS_INTERVAL`` seconds (default 15).
+``AUDIT_METRICS_PORT``
+    Serve the exposition at ``http://127.0.0.1:<port>/metrics``.
+``AUDIT_METRICS``
+    Set to ``0`` to turn spans into no-ops.
+``AUDIT_PROFILE``
+    Set to ``1`` to let app users request a profiled render with
+    ``?profile=1``. Off by default: profiled renders skip the report cache
+    and run one at a time.
+``AUDIT_PROFILE_DIR``
+    Where ``profiled`` writes cProfile dumps (default: system temp dir).
+"""
+import bisect
+import cProfile
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "audit_assistant"
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations in seconds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Return ``(cumulative_bucket_counts, count, sum)``."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, total
+
+
+class MetricsRegistry:
+    """Named span histograms, counters and gauge collectors."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            self.histogram(name).observe(seconds)
+
+    def increment(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def add_collector(self, collector):
+        """Register ``collector() -> {gauge_name: value}`` to run at export time."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    @contextmanager
+    def span(self, name):
+        """Record the wall time of the ``with`` block under ``name``."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - started)
+
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        family = f"{METRIC_PREFIX}_span_duration_seconds"
+        lines.append(f"# HELP {family} Wall time of instrumented phases.")
+        lines.append(f"# TYPE {family} histogram")
+        for name, histogram in sorted(self._histograms.items()):
+            cumulative, count, total = histogram.snapshot()
+            label = f'span="{_escape_label(name)}"'
+            for bound, value in zip(histogram.buckets, cumulative):
+                lines.append(f'{family}_bucket{{{label},le="{bound:g}"}} {value}')
+            lines.append(f'{family}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{family}_sum{{{label}}} {total:.9f}")
+            lines.append(f"{family}_count{{{label}}} {count}")
+
+        with self._lock:
+            counters = dict(self._counters)
+            collectors = list(self._collectors)
+        for name, value in sorted(counters.items()):
+            metric = f"{METRIC_PREFIX}_{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for collector in collectors:
+            try:
+                gauges = collector()
+            except Exception:
+                continue
+            for name, value in sorted(gauges.items()):
+                metric = f"{METRIC_PREFIX}_{_metric_name(name)}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write the exposition to ``path``."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temp_path, path)
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry(enabled=os.environ.get("AUDIT_METRICS", "1") != "0")
+PROFILING_ALLOWED = os.environ.get("AUDIT_PROFILE") == "1"
+span = REGISTRY.span
+
+
+# Newer Pythons allow a single active profiler per process.
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profiled(name, enabled=True, profile_dir=None):
+    """Capture a cProfile of the ``with`` block when ``enabled``.
+
+    Yields a dict whose ``path`` key is set to the ``.prof`` file once the
+    block finishes, so callers can point users at the dump. Profiled blocks
+    run one at a time.
+    """
+    result = {"path": None}
+    if not enabled:
+        yield result
+        return
+    profile_dir = profile_dir or os.environ.get("AUDIT_PROFILE_DIR") or tempfile.gettempdir()
+    os.makedirs(profile_dir, exist_ok=True)
+    with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            filename = f"{_metric_name(name)}-{stamp}-{os.getpid()}-{threading.get_ident()}.prof"
+            path = os.path.join(profile_dir, filename)
+            profiler.dump_stats(path)
+            result["path"] = path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve ``/metrics`` from a daemon thread and return the server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def start_file_exporter(path, interval=15.0, registry=REGISTRY):
+    """Rewrite ``path`` with the current metrics every ``interval`` seconds."""
+    def export():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.write_prometheus(path)
+            except OSError:
+                pass
+
+    threading.Thread(target=export, name="metrics-file-exporter", daemon=True).start()
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_from_env():
+    """Start the exporters requested by the environment, once per process."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        path = os.environ.get("AUDIT_METRICS_FILE")
+        if path:
+            start_file_exporter(path, float(os.environ.get("AUDIT_METRICS_INTERVAL", "15")))
+        port = os.environ.get("AUDIT_METRICS_PORT")
+        if port:
+            try:
+                start_metrics_server(int(port))
+            except OSError:
+                # Another process on this node already serves the endpoint.
+                pass
@@ -0,0 +1,491 @@
+"""Journal-entry tests over normalized ledgers.
+
+The standard audit data-analytics tests run as whole-array NumPy passes over
+``ledger_ingest`` batches:
+
+- Benford first- and second-digit conformity (mean absolute deviation)
+- round-amount postings
+- weekend/holiday postings and after-hours entries
+- postings just below approval thresholds
+- unusual debit/credit account pairings
+
+``JournalEntryTests`` keeps only fixed-size counters and a table of account
+pairs, so memory stays flat however many rows pass through ``update``.
+Accumulators built over consecutive partitions of a ledger combine with
+``merge``, in ledger order.
+``findings`` turns the totals into plan findings whose level comes from the
+``RISK_ASSESSMENT_CRITERIA`` financial-impact bands.
+
+Account pairing assumes the lines of one journal entry are contiguous in the
+ledger. An entry split across two chunks is carried over and closed in the
+next chunk. A partition's first and last entries stay open until ``merge`` or
+``finish``, so an entry split across two partitions is joined and counted
+once.
+"""
+import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from planning import make_finding
+
+SOURCE = "Journal entry tests"
+LEDGER_COLUMNS = ("entry_id", "posting_date", "entered_at", "account", "amount")
+
+BENFORD_FIRST = np.log10(1 + 1 / np.arange(1, 10))
+BENFORD_SECOND = np.array([
+    np.log10(1 + 1 / (10 * np.arange(1, 10) + digit)).sum() for digit in range(10)
+])
+# Nigrini's nonconformity limits for the mean absolute deviation
+FIRST_DIGIT_MAD_LIMIT = 0.015
+SECOND_DIGIT_MAD_LIMIT = 0.012
+BENFORD_MIN_AMOUNTS = 500
+BENFORD_Z = 1.96
+
+ROUND_AMOUNT_UNIT = 1000
+APPROVAL_THRESHOLDS = (5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+BELOW_THRESHOLD_MARGIN = 0.05
+BUSINESS_HOURS = (7, 19)
+# Month-day pairs treated as holidays in every year of the ledger
+DEFAULT_HOLIDAYS = ((1, 1), (12, 25), (12, 26))
+RARE_PAIR_MAX_ENTRIES = 2
+RARE_PAIR_MIN_ENTRIES = 500
+SECONDS_PER_DAY = 86400
+
+
+class JournalEntryTests:
+    """Mergeable accumulator for the journal-entry tests."""
+
+    def __init__(self, approval_thresholds=APPROVAL_THRESHOLDS, holidays=None,
+                 business_hours=BUSINESS_HOURS, round_unit=ROUND_AMOUNT_UNIT):
+        self.approval_thresholds = np.asarray(sorted(approval_thresholds), dtype=float)
+        self.holidays = holidays
+        self.business_hours = business_hours
+        self.round_unit = round_unit
+
+        self.rows = 0
+        self.total_amount = 0.0
+        self.first_digits = np.zeros(10, dtype=np.int64)
+        self.first_digit_amounts = np.zeros(10)
+        self.second_digits = np.zeros(10, dtype=np.int64)
+        self.second_digit_amounts = np.zeros(10)
+        self.round_count = 0
+        self.round_amount = 0.0
+        self.nonbusiness_count = 0
+        self.nonbusiness_amount = 0.0
+        self.after_hours_count = 0
+        self.after_hours_amount = 0.0
+        self.below_threshold_counts = np.zeros(len(self.approval_thresholds), dtype=np.int64)
+        self.below_threshold_amounts = np.zeros(len(self.approval_thresholds))
+        self.entries = 0
+        # (debit account, credit account) -> [entries, amount]
+        self.pairs = {}
+        # Open entries are [entry_id, debit, debit account, credit, credit account].
+        # The first entry may continue from a previous partition; it is only
+        # counted by merge or finish. While it is also the last entry seen,
+        # _first_open is set and _open_entry is None.
+        self._first_entry = None
+        self._first_open = False
+        # The last entry of the previous chunk, when it is not the first entry
+        self._open_entry = None
+
+    def update(self, batch):
+        """Fold one ledger batch (or table) into the running totals."""
+        if batch.num_rows == 0:
+            return self
+        amounts = pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False)
+        absolute = np.abs(amounts)
+        self.rows += batch.num_rows
+        self.total_amount += float(absolute.sum())
+        self._update_digits(absolute)
+        self._update_round(absolute)
+        self._update_thresholds(absolute)
+        if "posting_date" in batch.schema.names:
+            self._update_calendar(batch.column("posting_date"), absolute)
+        if "entered_at" in batch.schema.names:
+            self._update_hours(batch.column("entered_at"), absolute)
+        if "entry_id" in batch.schema.names and "account" in batch.schema.names:
+            self._update_pairs(batch.column("entry_id"), batch.column("account"), amounts)
+        return self
+
+    def flagged_rows(self, batch):
+        """Return a boolean mask of the rows any line-level test flags.
+
+        Covers round amounts, amounts just below an approval threshold,
+        non-business-day postings and after-hours entries. Benford and account
+        pairing are population tests and flag no single line. The running
+        totals are not touched.
+        """
+        amounts = pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False)
+        absolute = np.abs(amounts)
+        flagged = self._round_mask(absolute) | self._threshold_mask(absolute)[1]
+        if "posting_date" in batch.schema.names:
+            valid, nonbusiness = self._nonbusiness_mask(batch.column("posting_date"))
+            flagged[valid] |= nonbusiness
+        if "entered_at" in batch.schema.names:
+            valid, after_hours = self._after_hours_mask(batch.column("entered_at"))
+            flagged[valid] |= after_hours
+        return flagged
+
+    def _update_digits(self, absolute):
+        values = absolute[absolute >= 10]
+        if not len(values):
+            return
+        exponent = np.floor(np.log10(values))
+        leading = np.floor(values / 10.0 ** (exponent - 1) + 1e-9).astype(np.int64)
+        # Guard against float rounding pushing 99.999.. up to 100
+        leading = np.clip(leading, 10, 99)
+        first, second = leading // 10, leading % 10
+        self.first_digits += np.bincount(first, minlength=10)
+        self.first_digit_amounts += np.bincount(first, weights=values, minlength=10)
+        self.second_digits += np.bincount(second, minlength=10)
+        self.second_digit_amounts += np.bincount(second, weights=values, minlength=10)
+
+    def _round_mask(self, absolute):
+        cents = np.round(absolute * 100)
+        unit = self.round_unit * 100
+        return (absolute >= self.round_unit) & (np.mod(cents, unit) == 0)
+
+    def _update_round(self, absolute):
+        flagged = self._round_mask(absolute)
+        self.round_count += int(flagged.sum())
+        self.round_amount += float(absolute[flagged].sum())
+
+    def _threshold_mask(self, absolute):
+        """Return each amount's approval threshold index and the below-threshold mask."""
+        thresholds = self.approval_thresholds
+        index = np.searchsorted(thresholds, absolute, side="right")
+        inside = index < len(thresholds)
+        limit = thresholds[np.minimum(index, len(thresholds) - 1)]
+        return index, inside & (absolute >= limit * (1 - BELOW_THRESHOLD_MARGIN))
+
+    def _update_thresholds(self, absolute):
+        index, flagged = self._threshold_mask(absolute)
+        thresholds = self.approval_thresholds
+        self.below_threshold_counts += np.bincount(index[flagged], minlength=len(thresholds))
+        self.below_threshold_amounts += np.bincount(index[flagged], weights=absolute[flagged],
+                                                    minlength=len(thresholds))
+
+    def _nonbusiness_mask(self, posting_dates):
+        """Return the valid-date mask and, for the valid rows, the non-business-day mask."""
+        valid = pc.is_valid(posting_dates).to_numpy(zero_copy_only=False)
+        if not valid.any():
+            return valid, np.zeros(0, dtype=bool)
+        days = pc.fill_null(posting_dates.cast(pa.int32()), 0).to_numpy(zero_copy_only=False)
+        dates = days[valid].astype("datetime64[D]")
+        holidays = self._holiday_dates(dates.min(), dates.max())
+        return valid, ~np.is_busday(dates, holidays=holidays)
+
+    def _update_calendar(self, posting_dates, absolute):
+        valid, flagged = self._nonbusiness_mask(posting_dates)
+        self.nonbusiness_count += int(flagged.sum())
+        self.nonbusiness_amount += float(absolute[valid][flagged].sum())
+
+    def _holiday_dates(self, first, last):
+        if self.holidays is not None:
+            return np.asarray(self.holidays, dtype="datetime64[D]")
+        first_year = first.astype("datetime64[Y]").astype(int) + 1970
+        last_year = last.astype("datetime64[Y]").astype(int) + 1970
+        return np.array([
+            np.datetime64(datetime.date(year, month, day))
+            for year in range(first_year, last_year + 1)
+            for month, day in DEFAULT_HOLIDAYS
+        ], dtype="datetime64[D]")
+
+    def _after_hours_mask(self, entered_at):
+        """Return the valid-timestamp mask and, for the valid rows, the after-hours mask."""
+        valid = pc.is_valid(entered_at).to_numpy(zero_copy_only=False)
+        if not valid.any():
+            return valid, np.zeros(0, dtype=bool)
+        seconds = pc.fill_null(entered_at.cast(pa.int64()), 0).to_numpy(zero_copy_only=False)
+        hours = (seconds[valid] % SECONDS_PER_DAY) // 3600
+        opening, closing = self.business_hours
+        return valid, (hours < opening) | (hours >= closing)
+
+    def _update_hours(self, entered_at, absolute):
+        valid, flagged = self._after_hours_mask(entered_at)
+        self.after_hours_count += int(flagged.sum())
+        self.after_hours_amount += float(absolute[valid][flagged].sum())
+
+    def _update_pairs(self, entry_ids, accounts, amounts):
+        keep = pc.is_valid(entry_ids)
+        if not pc.all(keep).as_py():
+            entry_ids = pc.filter(entry_ids, keep)
+            accounts = pc.filter(accounts, keep)
+            amounts = amounts[keep.to_numpy(zero_copy_only=False)]
+        rows = len(amounts)
+        if rows == 0:
+            return
+        if not pa.types.is_dictionary(accounts.type):
+            accounts = pc.dictionary_encode(accounts)
+        if isinstance(accounts, pa.ChunkedArray):
+            accounts = accounts.combine_chunks()
+        if isinstance(entry_ids, pa.ChunkedArray):
+            entry_ids = entry_ids.combine_chunks()
+        account_codes = accounts.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+        dictionary = accounts.dictionary
+        entry_codes = pc.dictionary_encode(entry_ids).indices.to_numpy(zero_copy_only=False)
+
+        starts = np.concatenate(([0], np.flatnonzero(entry_codes[1:] != entry_codes[:-1]) + 1))
+        sizes = np.diff(np.append(starts, rows))
+        group = np.repeat(np.arange(len(starts)), sizes)
+        debit = np.where((amounts > 0) & (account_codes >= 0), amounts, 0.0)
+        credit = np.where((amounts < 0) & (account_codes >= 0), -amounts, 0.0)
+        # Within each entry, the row with the largest debit (credit) sorts first.
+        top_debit = np.lexsort((-debit, group))[starts]
+        top_credit = np.lexsort((-credit, group))[starts]
+
+        def account(row):
+            code = account_codes[row]
+            return dictionary[code].as_py() if code >= 0 else None
+
+        tops = [
+            (float(debit[top_debit[index]]), account(top_debit[index]),
+             float(credit[top_credit[index]]), account(top_credit[index]))
+            for index in (0, len(starts) - 1)
+        ]
+        first_id = entry_ids[0].as_py()
+        last_id = entry_ids[rows - 1].as_py()
+        complete = np.ones(len(starts), dtype=bool)
+
+        trailing = self._trailing_entry()
+        if trailing is not None and trailing[0] == first_id:
+            self._set_trailing_entry(_combine_entry(trailing, tops[0]))
+            complete[0] = False
+        elif self._first_entry is None:
+            self._first_entry = [first_id, *tops[0]]
+            self._first_open = True
+            complete[0] = False
+        if len(starts) > 1 or complete[0]:
+            # A new entry starts in this chunk, so the trailing one is done.
+            self._close_trailing_entry()
+            # The last entry may continue in the next chunk.
+            self._open_entry = [last_id, *tops[-1]]
+        complete[-1] = False
+
+        complete_debit = top_debit[complete]
+        complete_credit = top_credit[complete]
+        self.entries += int(complete.sum())
+        paired = (debit[complete_debit] > 0) & (credit[complete_credit] > 0)
+        debit_codes = account_codes[complete_debit[paired]]
+        credit_codes = account_codes[complete_credit[paired]]
+        if not len(debit_codes):
+            return
+        keys = (debit_codes << 32) | credit_codes
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse)
+        totals = np.bincount(inverse, weights=debit[complete_debit[paired]])
+        debit_names = dictionary.take(pa.array(unique >> 32)).to_pylist()
+        credit_names = dictionary.take(pa.array(unique & 0xFFFFFFFF)).to_pylist()
+        for debit_name, credit_name, count, total in zip(debit_names, credit_names, counts, totals):
+            self._add_pair(debit_name, credit_name, int(count), float(total))
+
+    def _add_pair(self, debit_account, credit_account, count, amount):
+        entry = self.pairs.get((debit_account, credit_account))
+        if entry is None:
+            self.pairs[(debit_account, credit_account)] = [count, amount]
+        else:
+            entry[0] += count
+            entry[1] += amount
+
+    def _count_entry(self, entry):
+        _, debit, debit_account, credit, credit_account = entry
+        self.entries += 1
+        if debit > 0 and credit > 0:
+            self._add_pair(debit_account, credit_account, 1, debit)
+
+    def _trailing_entry(self):
+        return self._first_entry if self._first_open else self._open_entry
+
+    def _set_trailing_entry(self, entry):
+        if self._first_open:
+            self._first_entry = entry
+        else:
+            self._open_entry = entry
+
+    def _close_trailing_entry(self):
+        """Mark the trailing entry complete; the first entry stays open on the left."""
+        if self._open_entry is not None:
+            self._count_entry(self._open_entry)
+            self._open_entry = None
+        self._first_open = False
+
+    def finish(self):
+        """Close the entries still open at the start and end of the ledger."""
+        self._close_trailing_entry()
+        if self._first_entry is not None:
+            self._count_entry(self._first_entry)
+            self._first_entry = None
+        return self
+
+    def merge(self, other):
+        """Add the totals of the partition that follows this one in the ledger.
+
+        An entry split between the end of this partition and the start of
+        ``other`` is joined into one. Call ``finish`` after the last merge.
+        """
+        self._merge_open_entries(other)
+        self.rows += other.rows
+        self.total_amount += other.total_amount
+        self.first_digits += other.first_digits
+        self.first_digit_amounts += other.first_digit_amounts
+        self.second_digits += other.second_digits
+        self.second_digit_amounts += other.second_digit_amounts
+        self.round_count += other.round_count
+        self.round_amount += other.round_amount
+        self.nonbusiness_count += other.nonbusiness_count
+        self.nonbusiness_amount += other.nonbusiness_amount
+        self.after_hours_count += other.after_hours_count
+        self.after_hours_amount += other.after_hours_amount
+        self.below_threshold_counts += other.below_threshold_counts
+        self.below_threshold_amounts += other.below_threshold_amounts
+        self.entries += other.entries
+        for (debit_account, credit_account), (count, amount) in other.pairs.items():
+            self._add_pair(debit_account, credit_account, count, amount)
+        return self
+
+    def _merge_open_entries(self, other):
+        other_first = other._first_entry
+        if other_first is None:
+            return
+        trailing = self._trailing_entry()
+        if self._first_entry is None:
+            self._first_entry, self._first_open = other_first, other._first_open
+            self._open_entry = other._open_entry
+            return
+        if trailing is not None and trailing[0] == other_first[0]:
+            self._set_trailing_entry(_combine_entry(trailing, other_first[1:]))
+            if other._first_open:
+                # ``other`` held only the continuation; the entry stays open.
+                return
+        else:
+            # Our trailing entry ends here and ``other`` starts a new one.
+            self._close_trailing_entry()
+            if other._first_open:
+                self._open_entry = other_first
+                return
+            self._count_entry(other_first)
+        self._close_trailing_entry()
+        self._open_entry = other._open_entry
+
+    def benford(self, second=False):
+        """Return ``(mad, over_represented_digits, amount)`` for one digit test.
+
+        ``amount`` is the total of amounts whose digit occurs significantly
+        more often than Benford's law predicts.
+        """
+        if second:
+            counts, amounts, expected, digits = (
+                self.second_digits, self.second_digit_amounts, BENFORD_SECOND, range(10))
+        else:
+            counts, amounts, expected, digits = (
+                self.first_digits[1:], self.first_digit_amounts[1:], BENFORD_FIRST, range(1, 10))
+        total = counts.sum()
+        if total == 0:
+            return 0.0, [], 0.0
+        observed = counts / total
+        mad = float(np.abs(observed - expected).mean())
+        z = (observed - expected) / np.sqrt(expected * (1 - expected) / total)
+        over = z > BENFORD_Z
+        return mad, [digit for digit, flag in zip(digits, over) if flag], float(amounts[over].sum())
+
+    def findings(self, risk_criteria=None):
+        """Return plan findings for every test that flagged something."""
+        self.finish()
+        findings = []
+
+        def add(title, amount, count, detail):
+            findings.append(make_finding(SOURCE, title, amount, count, detail, risk_criteria))
+
+        for second, limit in ((False, FIRST_DIGIT_MAD_LIMIT), (True, SECOND_DIGIT_MAD_LIMIT)):
+            counts = self.second_digits if second else self.first_digits
+            if counts.sum() < BENFORD_MIN_AMOUNTS:
+                continue
+            mad, digits, amount = self.benford(second)
+            if mad > limit:
+                name = "second" if second else "first"
+                add(
+                    f"Benford {name}-digit deviation",
+                    amount,
+                    int(counts[digits].sum()),
+                    f"MAD {mad:.4f} exceeds the {limit} conformity limit; "
+                    f"over-represented {name} digits: {', '.join(map(str, digits)) or 'none'}"
+                )
+        if self.round_count:
+            add(
+                "Round-amount postings",
+                self.round_amount,
+                self.round_count,
+                f"Amounts in whole multiples of ${self.round_unit:,} "
+                f"({self._share(self.round_count)} of lines)"
+            )
+        if self.nonbusiness_count:
+            add(
+                "Weekend and holiday postings",
+                self.nonbusiness_amount,
+                self.nonbusiness_count,
+                f"Posted on non-business days ({self._share(self.nonbusiness_count)} of lines)"
+            )
+        if self.after_hours_count:
+            opening, closing = self.business_hours
+            add(
+                "After-hours entries",
+                self.after_hours_amount,
+                self.after_hours_count,
+                f"Entered before {opening:02d}:00 or after {closing:02d}:00 "
+                f"({self._share(self.after_hours_count)} of lines)"
+            )
+        if self.below_threshold_counts.sum():
+            flagged = [
+                f"${threshold:,.0f} ({count:,})"
+                for threshold, count in zip(self.approval_thresholds, self.below_threshold_counts)
+                if count
+            ]
+            add(
+                "Postings just below approval thresholds",
+                float(self.below_threshold_amounts.sum()),
+                int(self.below_threshold_counts.sum()),
+                f"Within {BELOW_THRESHOLD_MARGIN:.0%} below: {', '.join(flagged)}"
+            )
+        if self.entries >= RARE_PAIR_MIN_ENTRIES:
+            rare = sorted(
+                ((amount, count, pair) for pair, (count, amount) in self.pairs.items()
+                 if count <= RARE_PAIR_MAX_ENTRIES),
+                reverse=True
+            )
+            if rare:
+                examples = ", ".join(f"{debit} / {credit}" for _, _, (debit, credit) in rare[:3])
+                add(
+                    "Unusual account pairings",
+                    sum(amount for amount, _, _ in rare),
+                    sum(count for _, count, _ in rare),
+                    f"{len(rare):,} debit/credit account pairs used in at most "
+                    f"{RARE_PAIR_MAX_ENTRIES} entries, e.g. {examples}"
+                )
+        return findings
+
+    def _share(self, count):
+        return f"{count / self.rows:.1%}" if self.rows else "0%"
+
+
+def _combine_entry(open_entry, top):
+    entry_id, debit, debit_account, credit, credit_account = open_entry
+    new_debit, new_debit_account, new_credit, new_credit_account = top
+    if new_debit > debit:
+        debit, debit_account = new_debit, new_debit_account
+    if new_credit > credit:
+        credit, credit_account = new_credit, new_credit_account
+    return [entry_id, debit, debit_account, credit, credit_account]
+
+
+def run_je_tests(ledger_path, risk_criteria=None, **options):
+    """Stream a normalized ledger file through the tests and return findings.
+
+    ``options`` are passed to ``JournalEntryTests``.
+    """
+    from ledger_ingest import iter_ledger_batches
+    tests = JournalEntryTests(**options)
+    for batch in iter_ledger_batches(ledger_path, columns=list(LEDGER_COLUMNS)):
+        tests.update(batch)
+    return tests.findings(risk_criteria)
@@ -0,0 +1,41 @@
+"""Entry point of the frozen build: serve ``app.py`` with Streamlit.
+
+``streamlit run`` is not available inside a PyInstaller bundle, so this
+module runs the same command line in-process. ``app.py`` is shipped as a data
+file next to the bundled modules. The port comes from
+``STREAMLIT_SERVER_PORT`` (default 8501). Extra arguments are passed through
+to ``streamlit run``, e.g. ``Financial_Audit_Assistant.exe --server.port 8502``.
+
+Frozen builds run headless, without the file watcher or the usage statistics
+request, and Streamlit itself never opens a browser. ``run_app.bat`` opens it
+once the server answers its health check.
+"""
+import multiprocessing
+import os
+import sys
+
+FROZEN_FLAGS = (
+    "--global.developmentMode=false",
+    "--server.headless=true",
+    "--server.fileWatcherType=none",
+    "--browser.gatherUsageStats=false",
+)
+
+
+def app_path():
+    """Return the path of ``app.py`` in the bundle or the source tree."""
+    base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, "app.py")
+
+
+def main(argv=None):
+    from streamlit.web import cli
+
+    argv = sys.argv[1:] if argv is None else argv
+    sys.argv = ["streamlit", "run", app_path(), *FROZEN_FLAGS, *argv]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""Chunked ingestion of general-ledger and journal-entry extracts.
+
+Usage:
+    python ledger_ingest.py gl_2024.csv gl_2024.arrow
+    python ledger_ingest.py journal.xlsx journal.parquet --sheet Entries
+
+CSV, Excel and Parquet sources are read in bounded-memory chunks. Every chunk
+is normalized to ``LEDGER_SCHEMA`` and appended to the output as it is read.
+Account, vendor and user columns are dictionary-encoded against dictionaries
+that grow across the whole file, so codes stay stable from chunk to chunk.
+
+Output files ending in ``.parquet``/``.pq`` are written as Parquet. Anything
+else is written as an uncompressed Arrow IPC (Feather v2) file, which
+``open_ledger`` memory-maps and reads without copying or re-parsing.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from data_sources import match_columns
+
+DEFAULT_CHUNK_ROWS = 250_000
+# CSV blocks are sized to hold about ``chunk_rows`` rows of the average
+# length seen in the first ``CSV_SAMPLE_BYTES`` of the file.
+CSV_SAMPLE_BYTES = 1 << 16
+MIN_CSV_BLOCK_SIZE = 1 << 20
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+LEDGER_SCHEMA = pa.schema([
+    ("entry_id", pa.string()),
+    ("posting_date", pa.date32()),
+    ("entered_at", pa.timestamp("s")),
+    ("account", DICTIONARY_TYPE),
+    ("vendor", DICTIONARY_TYPE),
+    ("entered_by", DICTIONARY_TYPE),
+    ("description", pa.string()),
+    ("invoice_number", pa.string()),
+    ("amount", pa.float64()),
+])
+DICTIONARY_COLUMNS = ("account", "vendor", "entered_by")
+REQUIRED_COLUMNS = ("posting_date", "account")
+
+# Source headers are matched after lower-casing and collapsing punctuation
+# and spaces to underscores.
+COLUMN_ALIASES = {
+    "entry_id": ("entry_id", "je_number", "je_id", "journal_id", "journal_number", "journal_entry",
+                 "entry_number", "document_number", "doc_no", "transaction_id"),
+    "posting_date": ("posting_date", "post_date", "gl_date", "effective_date", "transaction_date", "date"),
+    "entered_at": ("entered_at", "entry_date", "entered_date", "created_at", "created_date",
+                   "creation_date", "timestamp", "entry_datetime"),
+    "account": ("account", "account_number", "account_no", "account_code", "account_id", "gl_account", "acct"),
+    "vendor": ("vendor", "vendor_name", "vendor_id", "supplier", "supplier_name", "payee"),
+    "entered_by": ("entered_by", "user", "user_id", "user_name", "created_by", "posted_by", "preparer"),
+    "description": ("description", "memo", "narrative", "line_description", "text"),
+    "invoice_number": ("invoice_number", "invoice", "invoice_no", "invoice_id", "reference", "document_reference"),
+    "amount": ("amount", "net_amount", "amount_local", "value", "signed_amount"),
+    "debit": ("debit", "debit_amount", "dr"),
+    "credit": ("credit", "credit_amount", "cr"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y/%m/%d", "%m/%d/%Y %H:%M:%S",
+                "%m/%d/%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%Y%m%d")
+
+
+class LedgerError(ValueError):
+    """Raised when a ledger extract cannot be read or mapped to the schema."""
+
+
+def resolve_columns(names, column_map=None):
+    """Map schema fields (plus ``debit``/``credit``) to source column names.
+
+    ``column_map`` overrides the aliases with explicit ``{field: source}``
+    pairs. Raises ``LedgerError`` when a required field has no column.
+    """
+    resolved = match_columns(names, COLUMN_ALIASES, column_map, LedgerError, "the ledger")
+    missing = [field for field in REQUIRED_COLUMNS if field not in resolved]
+    if "amount" not in resolved and not ("debit" in resolved or "credit" in resolved):
+        missing.append("amount (or debit/credit)")
+    if missing:
+        raise LedgerError(f"Ledger is missing required columns: {', '.join(missing)}")
+    return resolved
+
+
+def _source_kind(filename):
+    lowered = filename.lower()
+    if lowered.endswith((".parquet", ".pq")):
+        return "parquet"
+    if lowered.endswith((".xlsx", ".xlsm")):
+        return "excel"
+    if lowered.endswith((".csv", ".txt", ".tsv")):
+        return "csv"
+    raise LedgerError(f"Unsupported ledger file type: {filename}")
+
+
+def iter_source_batches(source, filename=None, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=None):
+    """Yield raw ``pa.RecordBatch`` chunks from a CSV, Excel or Parquet ledger.
+
+    ``source`` is a path or a binary file object; ``filename`` picks the
+    reader when it cannot be taken from a path. No chunk holds more than
+    ``chunk_rows`` rows. CSV and Excel values are returned as strings and
+    typed later by ``LedgerNormalizer``.
+    """
+    filename = filename or (source if isinstance(source, str) else getattr(source, "name", ""))
+    kind = _source_kind(filename)
+    if kind == "parquet":
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(source).iter_batches(batch_size=chunk_rows)
+    elif kind == "excel":
+        yield from _iter_excel(source, chunk_rows, sheet)
+    else:
+        yield from _iter_csv(source, filename.lower().endswith(".tsv"), chunk_rows)
+
+
+def _iter_csv(source, tab_separated, chunk_rows=DEFAULT_CHUNK_ROWS):
+    import pyarrow.csv as pacsv
+    stream = open(source, "rb") if isinstance(source, str) else source
+    try:
+        # Read every column as text so a late chunk cannot contradict types
+        # inferred from the first block.
+        start = stream.tell()
+        first_line = stream.readline().decode("utf-8-sig")
+        sample = stream.read(CSV_SAMPLE_BYTES)
+        stream.seek(start)
+        delimiter = "\t" if tab_separated else ","
+        header = next(csv.reader([first_line], delimiter=delimiter), [])
+        row_bytes = len(sample) / max(1, sample.count(b"\n"))
+        block_size = max(MIN_CSV_BLOCK_SIZE, int(chunk_rows * row_bytes))
+        reader = pacsv.open_csv(
+            stream,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            parse_options=pacsv.ParseOptions(delimiter=delimiter),
+            convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in header}),
+        )
+        for batch in reader:
+            # Blocks only approximate ``chunk_rows``; never yield more.
+            for offset in range(0, batch.num_rows, chunk_rows):
+                yield batch.slice(offset, chunk_rows)
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+def _iter_excel(source, chunk_rows, sheet):
+    try:
+        import openpyxl
+    except ImportError:
+        raise LedgerError("Reading Excel ledgers requires openpyxl (pip install openpyxl)") from None
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = [str(name) if name is not None else f"column_{index}"
+                  for index, name in enumerate(next(rows, ()))]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield _excel_batch(header, chunk)
+                chunk = []
+        if chunk:
+            yield _excel_batch(header, chunk)
+    finally:
+        workbook.close()
+
+
+def _excel_batch(header, rows):
+    columns = []
+    for index in range(len(header)):
+        values = [row[index] if index < len(row) else None for row in rows]
+        columns.append(pa.array([_cell_text(value) for value in values], pa.string()))
+    return pa.RecordBatch.from_arrays(columns, names=header)
+
+
+def _cell_text(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ") if hasattr(value, "hour") else value.isoformat()
+    return str(value)
+
+
+def _text(values):
+    """Return ``values`` as trimmed strings with blanks turned into nulls."""
+    if not pa.types.is_string(values.type):
+        values = pc.cast(values, pa.string())
+    values = pc.utf8_trim_whitespace(values)
+    return pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+
+
+def _parse_timestamps(values):
+    if pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+        return pc.cast(values, pa.timestamp("s"))
+    text = _text(values)
+    try:
+        return pc.cast(text, pa.timestamp("s"))
+    except pa.ArrowInvalid:
+        pass
+    parsed = None
+    for date_format in DATE_FORMATS:
+        attempt = pc.strptime(text, format=date_format, unit="s", error_is_null=True)
+        parsed = attempt if parsed is None else pc.coalesce(parsed, attempt)
+    return parsed
+
+
+def _parse_amounts(values):
+    if pa.types.is_integer(values.type) or pa.types.is_floating(values.type) or pa.types.is_decimal(values.type):
+        return pc.cast(values, pa.float64())
+    text = _text(values)
+    # Accounting negatives are written as "(1,234.50)"; currency signs and
+    # thousands separators are dropped.
+    negative = pc.match_substring_regex(text, r"^\(.*\)$")
+    cleaned = pc.replace_substring_regex(text, r"[^0-9.eE+-]", "")
+    cleaned = pc.if_else(pc.equal(cleaned, ""), pa.scalar(None, pa.string()), cleaned)
+    try:
+        amounts = pc.cast(cleaned, pa.float64())
+    except pa.ArrowInvalid:
+        amounts = pa.array([_to_float(value) for value in cleaned.to_pylist()], pa.float64())
+    return pc.if_else(pc.fill_null(negative, False), pc.negate(amounts), amounts)
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _RunningDictionary:
+    """Dictionary that grows across chunks so codes never change."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+        self._array = pa.array([], pa.string())
+
+    def encode(self, values):
+        encoded = pc.dictionary_encode(_text(values))
+        local_values = encoded.dictionary.to_pylist()
+        mapping = np.fromiter(
+            (self._code(value) for value in local_values), dtype=np.int32, count=len(local_values)
+        )
+        if len(self._array) != len(self.values):
+            self._array = pa.array(self.values, pa.string())
+        indices = encoded.indices
+        if not len(mapping):
+            return pa.DictionaryArray.from_arrays(pa.nulls(len(indices), pa.int32()), self._array)
+        codes = mapping[indices.fill_null(0).to_numpy(zero_copy_only=False)]
+        codes = pa.array(codes, pa.int32(), mask=indices.is_null().to_numpy(zero_copy_only=False))
+        return pa.DictionaryArray.from_arrays(codes, self._array)
+
+    def _code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class LedgerNormalizer:
+    """Convert raw source chunks into ``LEDGER_SCHEMA`` record batches."""
+
+    def __init__(self, column_map=None):
+        self.column_map = column_map
+        self.columns = None
+        self.dictionaries = {name: _RunningDictionary() for name in DICTIONARY_COLUMNS}
+
+    def normalize(self, batch):
+        if self.columns is None:
+            self.columns = resolve_columns(batch.schema.names, self.column_map)
+        rows = batch.num_rows
+
+        def column(field):
+            source = self.columns.get(field)
+            return batch.column(source) if source is not None else None
+
+        arrays = {}
+        posting = _parse_timestamps(column("posting_date"))
+        arrays["posting_date"] = pc.cast(posting, pa.date32())
+        entered = column("entered_at")
+        arrays["entered_at"] = _parse_timestamps(entered) if entered is not None else pa.nulls(rows, pa.timestamp("s"))
+        for field in ("entry_id", "description", "invoice_number"):
+            values = column(field)
+            arrays[field] = _text(values) if values is not None else pa.nulls(rows, pa.string())
+        for field in DICTIONARY_COLUMNS:
+            values = column(field)
+            if values is None:
+                values = pa.nulls(rows, pa.string())
+            arrays[field] = self.dictionaries[field].encode(values)
+        if "amount" in self.columns:
+            arrays["amount"] = _parse_amounts(column("amount"))
+        else:
+            debit = _parse_amounts(column("debit")) if "debit" in self.columns else pa.nulls(rows, pa.float64())
+            credit = _parse_amounts(column("credit")) if "credit" in self.columns else pa.nulls(rows, pa.float64())
+            amount = pc.subtract(pc.fill_null(debit, 0.0), pc.fill_null(credit, 0.0))
+            both_missing = pc.and_(pc.is_null(debit), pc.is_null(credit))
+            arrays["amount"] = pc.if_else(both_missing, pa.scalar(None, pa.float64()), amount)
+        return pa.RecordBatch.from_arrays([arrays[name] for name in LEDGER_SCHEMA.names], schema=LEDGER_SCHEMA)
+
+
+def _is_parquet(path):
+    return str(path).lower().endswith((".parquet", ".pq"))
+
+
+class _LedgerWriter:
+    def __init__(self, output_path):
+        self.output_path = output_path
+        if _is_parquet(output_path):
+            import pyarrow.parquet as pq
+            self.format = "parquet"
+            self._writer = pq.ParquetWriter(output_path, LEDGER_SCHEMA)
+        else:
+            # Uncompressed so the file can be memory-mapped without decoding.
+            self.format = "arrow"
+            self._sink = pa.OSFile(output_path, "wb")
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._writer = pa.ipc.new_file(self._sink, LEDGER_SCHEMA, options=options)
+
+    def write(self, batch):
+        self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        if self.format == "arrow":
+            self._sink.close()
+
+
+def ingest_ledger(source, output_path, filename=None, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=None,
+                  column_map=None, log=None):
+    """Stream a ledger extract into a normalized Arrow or Parquet file.
+
+    Memory use is bounded by one chunk plus the account/vendor/user
+    dictionaries. Returns a summary dict with row counts, the total absolute
+    amount, distinct dictionary sizes, the source column mapping and elapsed
+    seconds.
+    """
+    started = time.perf_counter()
+    normalizer = LedgerNormalizer(column_map)
+    writer = _LedgerWriter(output_path)
+    rows = batches = invalid_rows = 0
+    absolute_amount = 0.0
+    try:
+        for raw in iter_source_batches(source, filename, chunk_rows, sheet):
+            batch = normalizer.normalize(raw)
+            writer.write(batch)
+            rows += batch.num_rows
+            batches += 1
+            valid = pc.and_(pc.is_valid(batch.column("posting_date")), pc.is_valid(batch.column("amount")))
+            invalid_rows += batch.num_rows - (pc.sum(valid).as_py() or 0)
+            absolute_amount += pc.sum(pc.abs(batch.column("amount"))).as_py() or 0.0
+            if log is not None:
+                print(f"[{batches}] {rows:,} rows", file=log)
+    finally:
+        writer.close()
+    return {
+        "path": output_path,
+        "format": writer.format,
+        "rows": rows,
+        "batches": batches,
+        "invalid_rows": invalid_rows,
+        "absolute_amount": absolute_amount,
+        "accounts": len(normalizer.dictionaries["account"].values),
+        "vendors": len(normalizer.dictionaries["vendor"].values),
+        "users": len(normalizer.dictionaries["entered_by"].values),
+        "columns": normalizer.columns or {},
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _subschema(names):
+    # Parquet stores second-resolution timestamps as milliseconds.
+    return pa.schema([LEDGER_SCHEMA.field(name) for name in names])
+
+
+def open_ledger(path, columns=None):
+    """Return a normalized ledger as a ``pa.Table`` without re-parsing it.
+
+    Arrow IPC files are memory-mapped and the table's buffers point straight
+    into the mapping. Parquet files are read through a memory map and
+    decoded once, with the dictionary columns kept dictionary-encoded.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True, read_dictionary=list(DICTIONARY_COLUMNS))
+        return table.cast(_subschema(table.schema.names))
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.select(columns) if columns else table
+
+
+def iter_ledger_batches(path, columns=None, batch_rows=DEFAULT_CHUNK_ROWS):
+    """Yield a normalized ledger chunk by chunk for streaming analyses."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path, memory_map=True, read_dictionary=list(DICTIONARY_COLUMNS))
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns):
+            yield batch.cast(_subschema(batch.schema.names))
+        return
+    reader = pa.ipc.open_file(pa.memory_map(path, "r"))
+    for index in range(reader.num_record_batches):
+        batch = reader.get_batch(index)
+        yield batch.select(columns) if columns else batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize a general-ledger extract into Arrow or Parquet.")
+    parser.add_argument("source", help="CSV, Excel (.xlsx) or Parquet ledger extract")
+    parser.add_argument("output", help="Output file (.arrow/.feather, or .parquet)")
+    parser.add_argument("--sheet", help="Excel worksheet name (default: the first sheet)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=SOURCE",
+                        help="Map a schema field to a source column, e.g. account=GL Acct")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    args = parser.parse_args(argv)
+
+    column_map = {}
+    for mapping in args.column:
+        field, _, source = mapping.partition("=")
+        column_map[field.strip()] = source.strip()
+    try:
+        summary = ingest_ledger(args.source, args.output, chunk_rows=args.chunk_rows, sheet=args.sheet,
+                                column_map=column_map, log=None if args.quiet else sys.stderr)
+    except LedgerError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,164 +1,647 @@
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Flowable, SimpleDocTemplate, PageBreak, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-import os
-import tempfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+import copy
+import io
+import itertools
+import threading
 
-def create_pdf_report(audit_plan, output_path):
-    """Create a professional PDF audit report."""
-    doc = SimpleDocTemplate(
+from instrumentation import REGISTRY, span
+from planning import allocation_summary
+from report_cache import get_default_cache
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CACHED_SECTIONS = 256
+RISK_LEVELS = ("High", "Medium", "Low")
+TEAM_KEYS = ("high_risk", "medium_risk", "low_risk")
+# Teams larger than this are rendered as compact tables instead of bullets
+COMPACT_TEAM_THRESHOLD = 20
+TEAM_TABLE_COLUMNS = 3
+TEAM_TABLE_ROWS = 40
+TEAM_TABLE_WIDTH = 512
+# Single-line 9pt appendix rows that fill one letter page
+APPENDIX_TABLE_ROWS = 36
+# Flowables materialized ahead of the one being laid out, so keep-with-next
+# chains in a lazy story still see their successors
+STORY_LOOKAHEAD = 8
+FINDING_COLUMN_WIDTHS = [60, 282, 70, 100]
+GROUP_CONTENTS_COLUMNS = ["Entity", "Role", "Sector", "Team", "Findings", "Page"]
+GROUP_CONTENTS_WIDTHS = [170, 62, 120, 50, 60, 50]
+# Average Helvetica 9pt glyph width; plain-text appendix cells are clipped to
+# the characters that fit their column because table cells do not wrap
+APPENDIX_CHAR_WIDTH = 4.8
+
+REGISTRY.add_collector(lambda: {
+    f"pdf_cache_{name}": value for name, value in get_default_cache().stats().items()
+})
+
+class ReportTemplate:
+    """Compiled report layout shared by every render in the process.
+
+    Styles are created once, and the objectives, scope and risk sections are
+    parsed into flowables once per distinct sector content. Only the company
+    table and team sections are laid out per request.
+    """
+
+    def __init__(self, max_sections=MAX_CACHED_SECTIONS):
+        styles = getSampleStyleSheet()
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=20,
+            spaceAfter=30,
+            alignment=1,  # Center alignment
+            fontName='Helvetica-Bold'
+        )
+        self.heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            spaceAfter=12,
+            spaceBefore=20,
+            fontName='Helvetica-Bold'
+        )
+        self.subheading_style = ParagraphStyle(
+            'CustomSubHeading',
+            parent=styles['Heading3'],
+            fontSize=12,
+            spaceAfter=8,
+            spaceBefore=12,
+            fontName='Helvetica-Bold'
+        )
+        self.normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=8,
+            leading=14,
+            fontName='Helvetica'
+        )
+        self.company_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
+        ])
+        self.member_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
+        ])
+        self.finding_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('TOPPADDING', (0, 0), (-1, -1), 3),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
+        ])
+        self.finding_style = ParagraphStyle(
+            'FindingCell',
+            parent=self.normal_style,
+            fontSize=9,
+            leading=11,
+            spaceAfter=0
+        )
+        self.max_sections = max_sections
+        self._sections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build_story(self, audit_plan):
+        """Return the flowables for ``audit_plan``.
+
+        Without appendices this is a plain list. Otherwise it is a
+        ``LazyStory`` whose appendix tables are built page by page while the
+        document is laid out.
+        """
+        content = self.body_sections(audit_plan)
+        if not audit_plan.get('appendices'):
+            return content
+        return LazyStory(content, lambda: self.appendix_sections(audit_plan))
+
+    def body_sections(self, audit_plan):
+        """Return every section of ``audit_plan``'s report before the appendices."""
+        content = []
+        content.extend(self.title_section(audit_plan))
+        content.extend(self.company_section(audit_plan))
+        content.extend(self.sector_sections(audit_plan))
+        content.extend(self.findings_section(audit_plan))
+        content.extend(self.team_section(audit_plan))
+        return content
+
+    def group_story(self, group_name, audit_plans, audit_period=None, section_pages=None):
+        """Return a ``LazyStory`` for a consolidated report over ``audit_plans``.
+
+        The story opens with a cover and a contents table, then each entity's
+        full report on new pages. Entity sections are built only when layout
+        reaches them. ``section_pages`` gives each entity's first page for
+        the contents table; without it the page column is left blank, which
+        lays out the same.
+        """
+        return LazyStory([], lambda: self._group_flowables(group_name, audit_plans, audit_period, section_pages))
+
+    def _group_flowables(self, group_name, audit_plans, audit_period, section_pages):
+        yield Paragraph("Group Audit Plan", self.title_style)
+        yield Paragraph(escape(group_name), self.title_style)
+        summary = f"{len(audit_plans):,} entities"
+        if audit_period:
+            summary += f", audit period {escape(audit_period)}"
+        yield Paragraph(summary, self.normal_style)
+        yield Spacer(1, 20)
+        yield Paragraph("Contents", self.heading_style)
+        rows = [
+            [
+                plan['company_name'],
+                "Parent" if index == 0 else "Component",
+                plan['sector'],
+                f"{plan['team_size']:,}",
+                f"{len(plan.get('findings') or []):,}",
+                str(section_pages[index]) if section_pages else "",
+            ]
+            for index, plan in enumerate(audit_plans)
+        ]
+        yield from self.appendix_tables(GROUP_CONTENTS_COLUMNS, rows, GROUP_CONTENTS_WIDTHS)
+        for index, plan in enumerate(audit_plans):
+            yield PageBreak()
+            yield SectionMark(index, plan['company_name'])
+            yield from self.body_sections(plan)
+            yield from self.appendix_sections(plan)
+
+    def title_section(self, audit_plan):
+        return [
+            Paragraph("Financial Audit Plan", self.title_style),
+            Paragraph(f"{audit_plan['company_name']}", self.title_style),
+            Spacer(1, 30),
+        ]
+
+    def company_section(self, audit_plan):
+        company_data = [
+            ["Company Name:", audit_plan['company_name']],
+            ["Sector:", audit_plan['sector']],
+            ["Audit Period:", audit_plan['audit_period']],
+            ["Team Size:", str(audit_plan['team_size'])]
+        ]
+        company_table = Table(company_data, colWidths=[150, 250])
+        company_table.setStyle(self.company_table_style)
+        return [
+            Paragraph("1. Company Information", self.heading_style),
+            company_table,
+            Spacer(1, 20),
+        ]
+
+    def sector_sections(self, audit_plan):
+        """Return the objectives, scope and risk sections for ``audit_plan``.
+
+        The flowables are built once per distinct section content and handed
+        out as shallow copies, so concurrent builds never share layout state.
+        """
+        risks = audit_plan['risks']
+        key = (
+            tuple(audit_plan['objectives']),
+            tuple(audit_plan['scope']),
+            tuple(tuple(risks[level]) for level in RISK_LEVELS),
+        )
+        with self._lock:
+            section = self._sections.get(key)
+            if section is not None:
+                self._sections.move_to_end(key)
+        if section is None:
+            section = self._build_sector_sections(audit_plan)
+            with self._lock:
+                self._sections[key] = section
+                while len(self._sections) > self.max_sections:
+                    self._sections.popitem(last=False)
+        return [copy.copy(flowable) for flowable in section]
+
+    def _build_sector_sections(self, audit_plan):
+        content = []
+
+        # Audit Objectives
+        content.append(Paragraph("2. Audit Objectives", self.heading_style))
+        for objective in audit_plan['objectives']:
+            content.append(Paragraph(f"• {objective}", self.normal_style))
+        content.append(Spacer(1, 20))
+
+        # Audit Scope
+        content.append(Paragraph("3. Audit Scope", self.heading_style))
+        for scope_item in audit_plan['scope']:
+            content.append(Paragraph(f"• {scope_item}", self.normal_style))
+        content.append(Spacer(1, 20))
+
+        # Risk Assessment
+        content.append(Paragraph("4. Risk Assessment", self.heading_style))
+        for level in RISK_LEVELS:
+            content.append(Paragraph(f"{level} Risk Areas:", self.subheading_style))
+            for risk in audit_plan['risks'][level]:
+                content.append(Paragraph(f"• {risk}", self.normal_style))
+            content.append(Spacer(1, 20 if level == RISK_LEVELS[-1] else 12))
+        return content
+
+    def findings_section(self, audit_plan):
+        """Return the data-analytics findings table for the Risk Assessment section."""
+        findings = audit_plan.get('findings')
+        if not findings:
+            return []
+        order = {level: index for index, level in enumerate(RISK_LEVELS)}
+        findings = sorted(findings, key=lambda f: (order.get(f['level'], len(order)), -f['amount']))
+        rows = [["Level", "Finding", "Count", "Amount"]]
+        for finding in findings:
+            text = f"<b>{escape(finding['title'])}</b>"
+            if finding.get('detail'):
+                text += f"<br/>{escape(finding['detail'])}"
+            rows.append([
+                finding['level'],
+                Paragraph(text, self.finding_style),
+                f"{finding['count']:,}",
+                f"${finding['amount']:,.0f}"
+            ])
+        table = Table(rows, colWidths=FINDING_COLUMN_WIDTHS, repeatRows=1)
+        table.setStyle(self.finding_table_style)
+        return [
+            Paragraph("Data Analytics Findings:", self.subheading_style),
+            table,
+            Spacer(1, 20),
+        ]
+
+    def team_section(self, audit_plan):
+        content = [Paragraph("5. Resource Allocation", self.heading_style)]
+        team_members = audit_plan.get('team_members', {})
+        allocation = audit_plan.get('resource_allocation', {})
+        teams = [
+            (level, key, team_members.get(key))
+            for level, key in zip(RISK_LEVELS, TEAM_KEYS)
+            if team_members.get(key)
+        ]
+        for level, key, members in teams:
+            content.append(Paragraph(f"{level} Risk Team:", self.subheading_style))
+            if key in allocation:
+                content.append(Paragraph(f"Allocated: {allocation_summary(allocation[key])}", self.normal_style))
+            if len(members) > COMPACT_TEAM_THRESHOLD:
+                content.extend(self.member_tables(members))
+            else:
+                for member in members:
+                    content.append(Paragraph(f"• {member}", self.normal_style))
+            if level != RISK_LEVELS[-1]:
+                content.append(Spacer(1, 12))
+        return content
+
+    def member_tables(self, members):
+        """Lay out a large team as multi-column tables of plain-text cells.
+
+        Members fill ``TEAM_TABLE_COLUMNS`` columns row by row. The rows are
+        emitted as tables of at most ``TEAM_TABLE_ROWS`` rows, each with its
+        own header row, so layout cost stays linear in the team size and
+        every page starts with a header.
+        """
+        columns = TEAM_TABLE_COLUMNS
+        header = ["Team Member"] * columns
+        rows = [
+            list(members[start:start + columns]) + [""] * max(0, start + columns - len(members))
+            for start in range(0, len(members), columns)
+        ]
+        return self.data_tables(header, rows)
+
+    def data_tables(self, header, rows, col_widths=None):
+        """Split ``rows`` into tables of ``TEAM_TABLE_ROWS`` rows, each with ``header``."""
+        if col_widths is None:
+            col_widths = [TEAM_TABLE_WIDTH / len(header)] * len(header)
+        tables = []
+        for start in range(0, len(rows), TEAM_TABLE_ROWS):
+            table = Table(
+                [header] + rows[start:start + TEAM_TABLE_ROWS],
+                colWidths=col_widths,
+                repeatRows=1
+            )
+            table.setStyle(self.member_table_style)
+            tables.append(table)
+        return tables
+
+    def appendix_sections(self, audit_plan):
+        """Yield one lettered appendix per supporting table, each on a new page.
+
+        An appendix's ``rows`` may be a list, any iterable or a callable
+        returning one, so large tables can be streamed from disk. Rows are
+        pulled one table at a time; a one-shot iterator can only be rendered
+        once.
+        """
+        for index, appendix in enumerate(audit_plan.get('appendices') or []):
+            yield PageBreak()
+            yield Paragraph(
+                f"Appendix {chr(ord('A') + index)}: {escape(appendix['title'])}", self.heading_style
+            )
+            if appendix.get('note'):
+                yield Paragraph(escape(appendix['note']), self.normal_style)
+            rows = appendix['rows']
+            if callable(rows):
+                rows = rows()
+            empty = True
+            for table in self.appendix_tables(list(appendix['columns']), rows, appendix.get('widths')):
+                empty = False
+                yield table
+            if empty:
+                yield Paragraph("No items.", self.normal_style)
+
+    def appendix_tables(self, header, rows, col_widths=None):
+        """Yield tables of ``APPENDIX_TABLE_ROWS`` clipped plain-text rows, each with ``header``.
+
+        Only one table's rows are held at a time, and cells are plain strings
+        under the shared member table style rather than per-cell paragraphs.
+        """
+        if col_widths is None:
+            col_widths = [TEAM_TABLE_WIDTH / len(header)] * len(header)
+        limits = [max(4, int(width / APPENDIX_CHAR_WIDTH)) for width in col_widths]
+        rows = iter(rows)
+        while True:
+            chunk = [
+                [clip_cell(value, limit) for value, limit in zip(row, limits)]
+                for row in itertools.islice(rows, APPENDIX_TABLE_ROWS)
+            ]
+            if not chunk:
+                return
+            table = Table([header] + chunk, colWidths=col_widths, repeatRows=1)
+            table.setStyle(self.member_table_style)
+            yield table
+
+
+class SectionMark(Flowable):
+    """Zero-size flowable marking where one entity's section of a group report starts."""
+
+    def __init__(self, index, title):
+        super().__init__()
+        self.index = index
+        self.title = title
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        pass
+
+
+class LazyStory:
+    """Story for ``doc.build`` whose tail is generated while it is consumed.
+
+    ``doc.build`` only reads, deletes and reinserts flowables at the front of
+    its story. This class keeps the flowables built so far in ``head`` and
+    pulls more from ``tail`` as layout reaches them. Memory therefore stays
+    bounded by the lookahead rather than by the length of the document.
+    ``len`` reports the flowables materialized so far. It is non-zero while
+    anything remains.
+    """
+
+    def __init__(self, head, tail):
+        self._head = list(head)
+        self._tail_factory = tail
+        self._tail = None
+
+    def _fill(self, count=None):
+        if self._tail is None:
+            self._tail = iter(self._tail_factory())
+        needed = None if count is None else count - len(self._head)
+        if needed is None or needed > 0:
+            self._head.extend(itertools.islice(self._tail, needed))
+
+    def __len__(self):
+        self._fill(STORY_LOOKAHEAD)
+        return len(self._head)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def _reach(self, key):
+        if isinstance(key, slice):
+            self._fill(None if key.stop is None or key.stop < 0 else key.stop)
+        else:
+            self._fill(None if key < 0 else key + 1)
+
+    def __getitem__(self, key):
+        self._reach(key)
+        return self._head[key]
+
+    def __setitem__(self, key, value):
+        self._reach(key)
+        self._head[key] = value
+
+    def __delitem__(self, key):
+        self._reach(key)
+        del self._head[key]
+
+    def insert(self, index, flowable):
+        self._head.insert(index, flowable)
+
+
+def clip_cell(value, limit):
+    """Clip every line of a plain-text table cell to ``limit`` characters."""
+    text = "" if value is None else str(value)
+    return "\n".join(
+        line if len(line) <= limit else line[:limit - 1] + "\u2026" for line in text.split("\n")
+    )
+
+_report_template = None
+_report_template_lock = threading.Lock()
+
+def get_report_template():
+    """Return the process-wide compiled ``ReportTemplate``."""
+    global _report_template
+    if _report_template is None:
+        with _report_template_lock:
+            if _report_template is None:
+                _report_template = ReportTemplate()
+    return _report_template
+
+class _InstrumentedDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that times writing the finished document."""
+
+    def _endBuild(self):
+        with span("pdf.serialize"):
+            super()._endBuild()
+
+class _PaginationCanvas(Canvas):
+    """Canvas for a pagination pass: pages are counted, never kept."""
+
+    def showPage(self):
+        if self._onPage:
+            self._onPage(self._pageNumber)
+        self._startPage()
+
+
+class _GroupDocTemplate(_InstrumentedDocTemplate):
+    """Doc template that records the first page of every ``SectionMark``.
+
+    With ``outline=True`` each section also gets a PDF bookmark.
+    """
+
+    def __init__(self, *args, outline=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outline = outline
+        self.section_pages = []
+
+    def afterFlowable(self, flowable):
+        if not isinstance(flowable, SectionMark):
+            return
+        self.section_pages.append(self.page)
+        if self.outline:
+            key = f"section-{flowable.index}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(flowable.title, key, level=0)
+
+
+def _draw_page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+def _group_doc(output_path, outline):
+    return _GroupDocTemplate(
         output_path,
+        outline=outline,
         pagesize=letter,
         rightMargin=50,
         leftMargin=50,
         topMargin=50,
         bottomMargin=50
     )
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        spaceAfter=30,
-        alignment=1,  # Center alignment
-        fontName='Helvetica-Bold'
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        spaceBefore=20,
-        fontName='Helvetica-Bold'
-    )
-    subheading_style = ParagraphStyle(
-        'CustomSubHeading',
-        parent=styles['Heading3'],
-        fontSize=12,
-        spaceAfter=8,
-        spaceBefore=12,
-        fontName='Helvetica-Bold'
+
+
+def create_group_report(group_name, audit_plans, output_path, audit_period=None):
+    """Create one consolidated PDF covering every plan in ``audit_plans``.
+
+    The first plan is the parent and the rest are component entities. All
+    sections share one document, so styles, fonts and compiled sector
+    sections are reused. The document is laid out twice. The first pass
+    keeps no pages and only finds where each entity starts. The second pass
+    writes the report, with those page numbers in the contents table and as
+    PDF bookmarks. Each pass builds entity sections as layout reaches them,
+    so time and memory grow linearly with the number of entities.
+
+    ``output_path`` may be a filename or a writable binary file object.
+    Appendix rows must be lists or callables, because every appendix is
+    read once per pass.
+    """
+    audit_plans = list(audit_plans)
+    if not audit_plans:
+        raise ValueError("A group report needs at least one audit plan")
+    for plan in audit_plans:
+        for appendix in plan.get('appendices') or []:
+            if not isinstance(appendix['rows'], (list, tuple)) and not callable(appendix['rows']):
+                raise ValueError(
+                    f"Appendix {appendix['title']!r} of {plan['company_name']!r} streams its rows once; "
+                    "pass a list or a callable for group reports"
+                )
+    template = get_report_template()
+    with span("pdf.group.paginate"):
+        doc = _group_doc(io.BytesIO(), outline=False)
+        doc._doSave = 0
+        doc.build(
+            template.group_story(group_name, audit_plans, audit_period),
+            onFirstPage=_draw_page_number,
+            onLaterPages=_draw_page_number,
+            canvasmaker=_PaginationCanvas
+        )
+        section_pages = doc.section_pages
+    with span("pdf.group.layout"):
+        doc = _group_doc(output_path, outline=True)
+        doc.build(
+            template.group_story(group_name, audit_plans, audit_period, section_pages),
+            onFirstPage=_draw_page_number,
+            onLaterPages=_draw_page_number
+        )
+    if doc.section_pages != section_pages:
+        raise RuntimeError("Group report pagination changed between passes")
+
+def generate_group_pdf(group_name, audit_plans, audit_period=None):
+    """Render a consolidated group report and return it as bytes."""
+    buffer = io.BytesIO()
+    with span("pdf.group"):
+        create_group_report(group_name, audit_plans, buffer, audit_period)
+    return buffer.getvalue()
+
+def create_pdf_report(audit_plan, output_path):
+    """Create a professional PDF audit report.
+
+    ``output_path`` may be a filename or a writable binary file object.
+    """
+    doc = _InstrumentedDocTemplate(
+        output_path,
+        pagesize=letter,
+        rightMargin=50,
+        leftMargin=50,
+        topMargin=50,
+        bottomMargin=50
     )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=8,
-        leading=14,
-        fontName='Helvetica'
+    with span("pdf.flowables"):
+        story = get_report_template().build_story(audit_plan)
+    # pdf.layout includes the nested pdf.serialize span
+    with span("pdf.layout"):
+        doc.build(story)
+
+def generate_pdf_download(audit_plan, use_cache=True):
+    """Generate a PDF report and return it as bytes for download.
+
+    Identical plans are served from the process-wide report cache; pass
+    ``use_cache=False`` to force a fresh render. Plans with streamed
+    appendix rows cannot be fingerprinted and always render fresh.
+    """
+    with span("pdf.generate"):
+        if use_cache and not streams_appendix_rows(audit_plan):
+            return get_default_cache().get_or_render(audit_plan, _render_pdf_bytes)
+        return _render_pdf_bytes(audit_plan)
+
+def streams_appendix_rows(audit_plan):
+    """Return whether any appendix takes its rows from an iterator or callable."""
+    return any(
+        not isinstance(appendix['rows'], (list, tuple))
+        for appendix in audit_plan.get('appendices') or []
     )
-    
-    # Create content
-    content = []
-    
-    # Title
-    content.append(Paragraph(f"Financial Audit Plan", title_style))
-    content.append(Paragraph(f"{audit_plan['company_name']}", title_style))
-    content.append(Spacer(1, 30))
-    
-    # Company Information
-    content.append(Paragraph("1. Company Information", heading_style))
-    company_data = [
-        ["Company Name:", audit_plan['company_name']],
-        ["Sector:", audit_plan['sector']],
-        ["Audit Period:", audit_plan['audit_period']],
-        ["Team Size:", str(audit_plan['team_size'])]
-    ]
-    company_table = Table(company_data, colWidths=[150, 250])
-    company_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey)
-    ]))
-    content.append(company_table)
-    content.append(Spacer(1, 20))
-    
-    # Audit Objectives
-    content.append(Paragraph("2. Audit Objectives", heading_style))
-    for objective in audit_plan['objectives']:
-        content.append(Paragraph(f"• {objective}", normal_style))
-    content.append(Spacer(1, 20))
-    
-    # Audit Scope
-    content.append(Paragraph("3. Audit Scope", heading_style))
-    for scope_item in audit_plan['scope']:
-        content.append(Paragraph(f"• {scope_item}", normal_style))
-    content.append(Spacer(1, 20))
-    
-    # Risk Assessment
-    content.append(Paragraph("4. Risk Assessment", heading_style))
-    
-    # High Risk Areas
-    content.append(Paragraph("High Risk Areas:", subheading_style))
-    for risk in audit_plan['risks']['High']:
-        content.append(Paragraph(f"• {risk}", normal_style))
-    content.append(Spacer(1, 12))
-    
-    # Medium Risk Areas
-    content.append(Paragraph("Medium Risk Areas:", subheading_style))
-    for risk in audit_plan['risks']['Medium']:
-        content.append(Paragraph(f"• {risk}", normal_style))
-    content.append(Spacer(1, 12))
-    
-    # Low Risk Areas
-    content.append(Paragraph("Low Risk Areas:", subheading_style))
-    for risk in audit_plan['risks']['Low']:
-        content.append(Paragraph(f"• {risk}", normal_style))
-    content.append(Spacer(1, 20))
-    
-    # Resource Allocation
-    content.append(Paragraph("5. Resource Allocation", heading_style))
-    
-    # High Risk Team
-    if audit_plan['team_members']['high_risk']:
-        content.append(Paragraph("High Risk Team:", subheading_style))
-        for member in audit_plan['team_members']['high_risk']:
-            content.append(Paragraph(f"• {member}", normal_style))
-        content.append(Spacer(1, 12))
-    
-    # Medium Risk Team
-    if audit_plan['team_members']['medium_risk']:
-        content.append(Paragraph("Medium Risk Team:", subheading_style))
-        for member in audit_plan['team_members']['medium_risk']:
-            content.append(Paragraph(f"• {member}", normal_style))
-        content.append(Spacer(1, 12))
-    
-    # Low Risk Team
-    if audit_plan['team_members']['low_risk']:
-        content.append(Paragraph("Low Risk Team:", subheading_style))
-        for member in audit_plan['team_members']['low_risk']:
-            content.append(Paragraph(f"• {member}", normal_style))
-    
-    # Build PDF
-    doc.build(content)
-
-def generate_pdf_download(audit_plan):
-    """Generate a PDF report and return it as bytes for download."""
-    # Create a temporary file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    temp_path = temp_file.name
-    temp_file.close()
-    
-    try:
-        # Generate the PDF
-        create_pdf_report(audit_plan, temp_path)
-        
-        # Read the generated PDF into bytes
-        with open(temp_path, 'rb') as f:
-            pdf_bytes = f.read()
-        
-        return pdf_bytes
-    finally:
-        # Clean up the temporary file
-        try:
-            os.unlink(temp_path)
-        except:
-            pass 
\ No newline at end of file
+
+def _render_pdf_bytes(audit_plan):
+    """Render ``audit_plan`` and return the PDF bytes."""
+    with span("pdf.render"):
+        return render_pdf_buffer(audit_plan).getvalue()
+
+def render_pdf_buffer(audit_plan):
+    """Render ``audit_plan`` straight into an in-memory buffer.
+
+    The returned ``io.BytesIO`` is rewound to the start. Use
+    ``buffer.getbuffer()`` for a zero-copy view of the document.
+    """
+    buffer = io.BytesIO()
+    create_pdf_report(audit_plan, buffer)
+    buffer.seek(0)
+    return buffer
+
+def iter_pdf_chunks(audit_plan, chunk_size=DEFAULT_CHUNK_SIZE, use_cache=True):
+    """Yield the rendered report as ``memoryview`` chunks of ``chunk_size`` bytes.
+
+    Chunks are slices over a single copy of the document, so the report can be
+    streamed to an HTTP response without materializing it more than once.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    view = memoryview(generate_pdf_download(audit_plan, use_cache=use_cache))
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+def write_pdf_file(audit_plan, output_path, use_cache=True):
+    """Write the rendered report to ``output_path`` and return the path."""
+    with open(output_path, 'wb') as f:
+        for chunk in iter_pdf_chunks(audit_plan, use_cache=use_cache):
+            f.write(chunk)
+    return output_path
@@ -0,0 +1,285 @@
+"""Background PDF rendering jobs for the Streamlit app.
+
+Rendering runs on a small pool of worker threads instead of the Streamlit
+script thread, so a slow report never freezes the page. Jobs are queued per
+owner (one Streamlit session) and the workers take turns between owners, so
+one session submitting many reports cannot starve the others. Both the total
+queue and the number of active jobs per owner are bounded; ``submit`` raises
+``QueueFull`` instead of letting work pile up on the server.
+
+Finished reports are put in the shared ``ArtifactStore``; a job only keeps
+the artifact id, so its bytes count against the store's memory budget. Jobs
+render without the report cache, which would hold a second copy under its own
+budget. Instead the queue remembers which artifact each plan fingerprint
+rendered to, and a plan whose artifact is still stored is not rendered again.
+"""
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from artifact_store import get_artifact_store
+from instrumentation import REGISTRY, profiled
+from report_cache import plan_fingerprint
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 32
+DEFAULT_MAX_PER_OWNER = 2
+DEFAULT_RESULT_TTL = 600.0
+# Plan fingerprints remembered with their artifact id; ids only, so this is small
+DEFAULT_MAX_RENDERED = 1024
+
+REGISTRY.add_collector(lambda: {
+    f"artifact_store_{name}": value for name, value in get_artifact_store().stats().items()
+})
+
+
+class QueueFull(RuntimeError):
+    """Raised when a job cannot be accepted without exceeding a queue limit."""
+
+
+class PDFJob:
+    """State of one background render, safe to read from any thread."""
+
+    def __init__(self, audit_plan, owner, profile=False):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.audit_plan = audit_plan
+        self.profile = profile
+        self.profile_path = None
+        self.state = QUEUED
+        self.artifact_id = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+
+def _default_render(audit_plan):
+    from pdf_generator import generate_pdf_download
+    return generate_pdf_download(audit_plan, use_cache=False)
+
+
+def _fingerprint(audit_plan):
+    try:
+        return plan_fingerprint(audit_plan)
+    except TypeError:
+        # Plans with streamed appendix rows cannot be fingerprinted.
+        return None
+
+
+class PDFJobQueue:
+    """Bounded, owner-fair queue of PDF render jobs served by worker threads."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 max_per_owner=DEFAULT_MAX_PER_OWNER, result_ttl=DEFAULT_RESULT_TTL,
+                 render=_default_render, store=None, max_rendered=DEFAULT_MAX_RENDERED):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_per_owner = max_per_owner
+        self.result_ttl = result_ttl
+        self.render = render
+        self.store = store if store is not None else get_artifact_store()
+        self.max_rendered = max_rendered
+        # plan fingerprint -> artifact id, least recently used first
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._jobs = {}
+        # owner -> deque of queued jobs; rotated so workers serve owners in turn
+        self._queues = OrderedDict()
+        self._pending = 0
+        self._workers = []
+        self._counter = itertools.count()
+
+    def submit(self, audit_plan, owner, profile=False):
+        """Queue ``audit_plan`` for rendering and return the new job id.
+
+        With ``profile=True`` the plan is always rendered, even if its report
+        is still stored, and the render is captured with cProfile; the dump's
+        location is stored on ``job.profile_path``.
+        """
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                REGISTRY.increment("pdf_jobs_rejected")
+                raise QueueFull("The report queue is full, please try again shortly.")
+            active = sum(1 for job in self._jobs.values() if job.owner == owner and job.active)
+            if active >= self.max_per_owner:
+                REGISTRY.increment("pdf_jobs_rejected")
+                raise QueueFull(
+                    f"You already have {active} reports in progress; wait for one to finish."
+                )
+            job = PDFJob(audit_plan, owner, profile=profile)
+            self._jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._pending += 1
+            self._start_workers()
+            self._ready.notify()
+            return job.id
+
+    def get(self, job_id):
+        """Return the job with ``job_id`` or ``None`` if unknown or expired."""
+        if job_id is None:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; returns ``True`` if it had not finished yet.
+
+        Queued jobs are dropped immediately. A running render cannot be
+        interrupted, so its result is discarded once it completes.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            if job.state == QUEUED:
+                queue = self._queues.get(job.owner)
+                if queue is not None and job in queue:
+                    queue.remove(job)
+                    self._pending -= 1
+                    if not queue:
+                        del self._queues[job.owner]
+            job.state = CANCELLED
+            job.finished_at = time.time()
+            job.audit_plan = None
+            return True
+
+    def stats(self):
+        """Return counts of jobs by state plus queue limits."""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+            counts["owners_waiting"] = len(self._queues)
+            counts["max_pending"] = self.max_pending
+            counts["workers"] = len(self._workers)
+            return counts
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f"pdf-job-worker-{next(self._counter)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_job(self):
+        with self._lock:
+            while not self._queues:
+                self._ready.wait()
+            owner, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # Move the owner to the back so the next worker serves someone else.
+            del self._queues[owner]
+            if queue:
+                self._queues[owner] = queue
+            self._pending -= 1
+            job.state = RUNNING
+            job.started_at = time.time()
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            REGISTRY.observe("pdf_jobs.queue_wait", job.started_at - job.submitted_at)
+            key = _fingerprint(job.audit_plan)
+            artifact_id = None if job.profile else self._stored_render(key)
+            if artifact_id is not None:
+                with self._lock:
+                    job.audit_plan = None
+                    if job.state != CANCELLED:
+                        job.finished_at = time.time()
+                        job.state, job.artifact_id = DONE, artifact_id
+                continue
+            with profiled("pdf_job", enabled=job.profile) as profile:
+                try:
+                    result = self.render(job.audit_plan)
+                    error = None
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+            with self._lock:
+                job.profile_path = profile["path"]
+                job.audit_plan = None
+                if job.state == CANCELLED:
+                    # Nothing refers to a cancelled job's report, so it is not stored.
+                    continue
+            if error is None:
+                try:
+                    artifact_id = self.store.put(result)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                # Drop the render before waiting on the lock; the store has it.
+                result = None
+            with self._lock:
+                if artifact_id is not None and key is not None:
+                    self._remember_render(key, artifact_id)
+                if job.state == CANCELLED:
+                    continue
+                job.finished_at = time.time()
+                if error is None:
+                    job.state, job.artifact_id = DONE, artifact_id
+                else:
+                    job.state, job.error = FAILED, error
+
+    def _stored_render(self, key):
+        """Return the artifact id ``key`` rendered to, if it is still stored."""
+        if key is None:
+            return None
+        with self._lock:
+            artifact_id = self._rendered.get(key)
+            if artifact_id is None:
+                return None
+            self._rendered.move_to_end(key)
+        if artifact_id in self.store:
+            REGISTRY.increment("pdf_jobs_reused")
+            return artifact_id
+        with self._lock:
+            if self._rendered.get(key) == artifact_id:
+                del self._rendered[key]
+        return None
+
+    def _remember_render(self, key, artifact_id):
+        self._rendered[key] = artifact_id
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self.max_rendered:
+            self._rendered.popitem(last=False)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if not job.active and job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide PDF job queue shared by all sessions."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = PDFJobQueue()
+    return _job_queue
@@ -0,0 +1,113 @@
+"""Audit plan assembly shared by the Streamlit UI and headless tools."""
+
+from sector_catalog import get_catalog
+
+# Used when no sector risks are given: one risk per level
+DEFAULT_RISK_COUNTS = {"High": 1, "Medium": 1, "Low": 1}
+# Lower bound of each level's "Financial Impact" band, in dollars
+IMPACT_CRITERION = "Financial Impact Threshold"
+DEFAULT_IMPACT_THRESHOLDS = {"High": 1_000_000, "Medium": 100_000, "Low": 0}
+FINDING_LEVELS = ("High", "Medium", "Low")
+
+def team_allocation(team_size, risks=None, audit_start_date=None, audit_end_date=None):
+    """Return staff and hours per risk team from the weighted allocation engine."""
+    # numpy is loaded on first use so it stays off the app's startup path
+    from allocation import allocate_team
+    if risks is None:
+        risks = {level: [None] * count for level, count in DEFAULT_RISK_COUNTS.items()}
+    return allocate_team(
+        team_size,
+        risks,
+        audit_start_date,
+        audit_end_date,
+        get_catalog().risk_criteria
+    )
+
+def team_allocation_sizes(team_size, risks=None):
+    """Return the number of team members assigned to each risk level."""
+    return {key: entry["staff"] for key, entry in team_allocation(team_size, risks).items()}
+
+def allocation_summary(entry):
+    """Describe one risk team's allocated staff and hours."""
+    summary = f"{entry['staff']} staff, {entry['hours']:,.0f} hours"
+    if entry.get("hours_per_risk"):
+        summary += f" ({entry['hours_per_risk']:,.0f} per risk area)"
+    return summary
+
+def split_team(members, team_size, risks=None):
+    """Split a flat, ordered roster into per-risk-level teams."""
+    teams = {}
+    start = 0
+    for key, size in team_allocation_sizes(team_size, risks).items():
+        teams[key] = list(members[start:start + size])
+        start += size
+    return teams
+
+def impact_level(amount, risk_criteria=None):
+    """Return the risk level whose financial-impact band contains ``amount``."""
+    if risk_criteria is None:
+        risk_criteria = get_catalog().risk_criteria
+    for level in FINDING_LEVELS:
+        criteria = risk_criteria.get(level, {})
+        if abs(amount) >= float(criteria.get(IMPACT_CRITERION, DEFAULT_IMPACT_THRESHOLDS[level])):
+            return level
+    return FINDING_LEVELS[-1]
+
+def make_finding(source, title, amount, count, detail="", risk_criteria=None, level=None):
+    """Return a data-analytics finding for the plan's Risk Assessment section.
+
+    ``level`` defaults to the financial-impact band of ``amount``.
+    """
+    return {
+        "source": source,
+        "title": title,
+        "level": level or impact_level(amount, risk_criteria),
+        "count": int(count),
+        "amount": float(amount),
+        "detail": detail
+    }
+
+def format_audit_period(audit_start_date, audit_end_date):
+    return f"{audit_start_date.strftime('%B %d, %Y')} to {audit_end_date.strftime('%B %d, %Y')}"
+
+def merge_risks(risks, added_risks=None):
+    """Return ``risks`` as plain lists with ``added_risks`` appended per level."""
+    added_risks = added_risks or {}
+    return {level: list(items) + list(added_risks.get(level, [])) for level, items in risks.items()}
+
+def build_audit_plan(company_name, sector, audit_start_date, audit_end_date, team_size,
+                     team_members, sector_plans=None, findings=None, appendices=None,
+                     added_risks=None):
+    """Assemble the ``audit_plan`` dict consumed by ``pdf_generator``.
+
+    ``sector_plans`` defaults to the current sector catalog. The sector's
+    sections are copied into plain lists, so callers may extend the plan
+    without touching the shared catalog. ``findings`` are ``make_finding``
+    dicts from the ledger analytics, and ``appendices`` are supporting tables
+    (``title``, ``columns``, ``rows`` and optional ``widths``/``note``).
+    ``added_risks`` maps levels to risk areas found by the analytics, such as
+    flagged accounts; they are listed after the sector's own.
+    """
+    if sector_plans is None:
+        sector_plans = get_catalog().sectors
+    if sector not in sector_plans:
+        raise KeyError(f"Unknown sector: {sector}")
+    sector_plan = sector_plans[sector]
+    risks = merge_risks(sector_plan["risks"], added_risks)
+    return {
+        "company_name": company_name,
+        "sector": sector,
+        "audit_period": format_audit_period(audit_start_date, audit_end_date),
+        "team_size": team_size,
+        "objectives": list(sector_plan["objectives"]),
+        "scope": list(sector_plan["scope"]),
+        "risks": risks,
+        "team_members": {
+            "high_risk": list(team_members.get("high_risk", [])),
+            "medium_risk": list(team_members.get("medium_risk", [])),
+            "low_risk": list(team_members.get("low_risk", []))
+        },
+        "resource_allocation": team_allocation(team_size, risks, audit_start_date, audit_end_date),
+        "findings": [dict(finding) for finding in findings or []],
+        "appendices": [dict(appendix) for appendix in appendices or []]
+    }
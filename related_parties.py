@@ -0,0 +1,633 @@
+"""Related-party and fraud-network analysis over vendor, employee and customer masters.
+
+Usage:
+    python related_parties.py --vendors vendors.csv --employees hr.xlsx --json clusters.json
+    python related_parties.py --vendors vendors.parquet --customers customers.csv --threshold 7.5
+
+Master records are linked when they share a bank account, tax ID, phone
+number or address. Values are normalized first: bank accounts and tax IDs
+are reduced to upper-case letters and digits, phones to their last ten
+digits, and addresses to upper-case words with common street abbreviations.
+
+Linking is done by blocking, not by comparing records pairwise. Each
+attribute's values are hashed into buckets (an Arrow dictionary encode), and
+every record in a bucket is linked to the bucket's first record, so there are
+fewer links than records. Buckets larger than ``MAX_BUCKET_SIZE`` are skipped:
+a head-office address or a switchboard number shared by hundreds of records
+is not evidence of a relationship. The links are then merged into clusters by
+a vectorized union-find (hook the larger root under the smaller one, then
+jump pointers until every record points at its root). Each pass is a handful
+of NumPy operations over the remaining links, so millions of records take
+seconds.
+
+A cluster's score is the sum over its shared buckets of the attribute weight
+times the role weight, times log2 of the bucket size. An employee sharing a
+bank account with a vendor scores 15 on its own. Clusters scoring at least
+``MIN_CLUSTER_SCORE`` are flagged and ranked by score.
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from data_sources import ResultCache, dataset_hash, match_columns
+from planning import FINDING_LEVELS, make_finding
+
+SOURCE = "Related-party analysis"
+ROLES = ("vendor", "employee", "customer")
+LINK_ATTRIBUTES = ("bank_account", "tax_id", "phone", "address")
+ATTRIBUTE_LABELS = {
+    "bank_account": "bank account",
+    "tax_id": "tax ID",
+    "phone": "phone",
+    "address": "address",
+}
+COLUMN_ALIASES = {
+    "record_id": ("id", "vendor_id", "vendor_number", "vendor_no", "supplier_id", "supplier_number",
+                  "employee_id", "employee_number", "employee_no", "emp_id", "customer_id",
+                  "customer_number", "customer_no", "record_id"),
+    "name": ("name", "vendor_name", "supplier_name", "employee_name", "full_name", "customer_name",
+             "company_name", "legal_name"),
+    "bank_account": ("bank_account", "bank_account_number", "bank_account_no", "account_number",
+                     "iban", "bank_details", "payee_account"),
+    "tax_id": ("tax_id", "tin", "ein", "vat", "vat_number", "vat_id", "tax_number", "ssn",
+               "national_id", "abn", "gst_number"),
+    "phone": ("phone", "phone_number", "telephone", "tel", "mobile", "mobile_number", "contact_phone"),
+    "address": ("address", "street", "street_address", "address_line_1", "address1", "address_line1",
+                "home_address", "billing_address", "remit_to_address"),
+    "address_2": ("address_line_2", "address2", "address_line2"),
+    "city": ("city", "town"),
+    "postal_code": ("postal_code", "postcode", "zip", "zip_code"),
+    "amount": ("amount", "spend", "annual_spend", "ytd_spend", "total_paid", "total_spend", "revenue",
+               "sales"),
+}
+ADDRESS_FIELDS = ("address", "address_2", "city", "postal_code")
+# Values shorter than this after normalization are too generic to link on
+MIN_KEY_LENGTH = {"bank_account": 6, "tax_id": 5, "phone": 7, "address": 8}
+PLACEHOLDERS = ("NA", "NONE", "NULL", "UNKNOWN", "TBD", "TBC", "NOTAPPLICABLE", "NOTPROVIDED")
+# Whole words, upper case, after punctuation is removed
+ADDRESS_ABBREVIATIONS = (
+    ("STREET", "ST"), ("AVENUE", "AVE"), ("ROAD", "RD"), ("DRIVE", "DR"), ("BOULEVARD", "BLVD"),
+    ("LANE", "LN"), ("COURT", "CT"), ("PLACE", "PL"), ("SUITE", "STE"), ("APARTMENT", "APT"),
+    ("FLOOR", "FL"), ("BUILDING", "BLDG"), ("NORTH", "N"), ("SOUTH", "S"), ("EAST", "E"), ("WEST", "W"),
+)
+MAX_BUCKET_SIZE = 50
+
+ATTRIBUTE_WEIGHTS = {"bank_account": 5.0, "tax_id": 4.0, "phone": 2.0, "address": 1.0}
+# Weight of the most suspicious pair of roles in a bucket
+EMPLOYEE_VENDOR_WEIGHT = 3.0
+CUSTOMER_VENDOR_WEIGHT = 2.0
+EMPLOYEE_CUSTOMER_WEIGHT = 1.5
+VENDOR_VENDOR_WEIGHT = 1.5
+SAME_ROLE_WEIGHT = 1.0
+MIN_CLUSTER_SCORE = 5.0
+# Lowest score of each finding level above Low
+SCORE_LEVELS = (("High", 15.0), ("Medium", 7.5))
+
+MAX_RISK_ITEMS = 10
+MAX_APPENDIX_ROWS = 500
+MAX_MEMBERS_SHOWN = 3
+APPENDIX_COLUMNS = ("Cluster", "Level", "Score", "Records", "Shared", "Members", "Amount")
+APPENDIX_WIDTHS = (40, 40, 36, 40, 96, 220, 60)
+MAX_CACHED_RESULTS = 8
+
+RECORD_SCHEMA = pa.schema([
+    ("role", pa.string()),
+    ("record_id", pa.string()),
+    ("name", pa.string()),
+    ("amount", pa.float64()),
+    ("bank_account", pa.string()),
+    ("tax_id", pa.string()),
+    ("phone", pa.string()),
+    ("address", pa.string()),
+])
+
+
+class MasterDataError(ValueError):
+    """Raised when a master file cannot be read or has no attribute to link on."""
+
+
+def resolve_columns(names, column_map=None):
+    """Map master-data fields to source column names.
+
+    ``column_map`` overrides the aliases with explicit ``{field: source}``
+    pairs. Raises ``MasterDataError`` when no linking attribute has a column.
+    """
+    resolved = match_columns(names, COLUMN_ALIASES, column_map, MasterDataError, "the master file")
+    if not any(field in resolved for field in LINK_ATTRIBUTES):
+        raise MasterDataError(
+            "Master file has none of the linking columns: bank account, tax ID, phone or address"
+        )
+    return resolved
+
+
+def _text(values):
+    """Return ``values`` as trimmed strings with blanks turned into nulls."""
+    if not pa.types.is_string(values.type):
+        values = pc.cast(values, pa.string())
+    values = pc.utf8_trim_whitespace(values)
+    return pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+
+
+def _map_bytes(values, table):
+    """Rewrite every byte of ``values`` through ``table``; bytes mapped to -1 are dropped.
+
+    A byte lookup over the whole string buffer is several times faster than
+    a regex replacement and is exact for the ASCII classes used here.
+    Multi-byte UTF-8 characters are mapped byte by byte, so a table must
+    keep or drop all of the bytes from 128 up together.
+    """
+    if values.offset:
+        values = pa.concat_arrays([values])
+    validity, offsets, data = values.buffers()
+    if data is None or not len(values):
+        return values
+    offsets = np.frombuffer(offsets, dtype=np.int32, count=len(values) + 1)
+    mapped = table[np.frombuffer(data, dtype=np.uint8, count=offsets[-1])]
+    kept = mapped >= 0
+    if not kept.all():
+        positions = np.zeros(len(mapped) + 1, dtype=np.int64)
+        np.cumsum(kept, out=positions[1:])
+        offsets = positions[offsets].astype(np.int32)
+        mapped = mapped[kept]
+    return pa.StringArray.from_buffers(
+        len(values),
+        pa.py_buffer(offsets),
+        pa.py_buffer(mapped.astype(np.uint8)),
+        validity,
+        values.null_count,
+    )
+
+
+def _byte_table(keep, replacement=-1, keep_non_ascii=False):
+    """Return a ``_map_bytes`` table keeping the characters in ``keep`` and upper-casing letters."""
+    table = np.full(256, replacement, dtype=np.int16)
+    if keep_non_ascii:
+        table[128:] = np.arange(128, 256)
+    for char in keep:
+        table[ord(char)] = ord(char)
+        table[ord(char.lower())] = ord(char)
+    return table
+
+
+ALPHANUMERIC = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+IDENTIFIER_BYTES = _byte_table(ALPHANUMERIC)
+DIGIT_BYTES = _byte_table("0123456789")
+ADDRESS_BYTES = _byte_table(ALPHANUMERIC, replacement=ord(" "), keep_non_ascii=True)
+
+
+def _clean_key(values, attribute):
+    """Null out keys that are too short, all zeros or placeholders."""
+    too_short = pc.less(pc.utf8_length(values), MIN_KEY_LENGTH[attribute])
+    generic = pc.or_(pc.match_substring_regex(values, "^0+$"),
+                     pc.is_in(values, value_set=pa.array(PLACEHOLDERS)))
+    return pc.if_else(pc.or_kleene(too_short, generic), pa.scalar(None, pa.string()), values)
+
+
+def normalize_identifier(values, attribute="bank_account"):
+    """Upper-case letters and digits only: ``gb29 nwbk-6016`` -> ``GB29NWBK6016``."""
+    return _clean_key(_map_bytes(values, IDENTIFIER_BYTES), attribute)
+
+
+def normalize_phone(values):
+    """Digits only, keeping the last ten so country and trunk prefixes do not matter."""
+    digits = _map_bytes(values, DIGIT_BYTES)
+    return _clean_key(pc.utf8_slice_codeunits(digits, -10, 2 ** 31 - 1), "phone")
+
+
+def normalize_address(values):
+    """Upper-case words without punctuation, with common street words abbreviated.
+
+    The words of every address are looked up in one pass rather than one
+    regex pass per abbreviation.
+    """
+    words = pc.ascii_split_whitespace(_map_bytes(values, ADDRESS_BYTES))
+    flat = pc.list_flatten(words)
+    position = pc.index_in(flat, value_set=pa.array([word for word, _ in ADDRESS_ABBREVIATIONS]))
+    abbreviated = pc.take(pa.array([abbreviation for _, abbreviation in ADDRESS_ABBREVIATIONS]), position)
+    flat = pc.if_else(pc.is_valid(position), abbreviated, flat)
+    words = pa.ListArray.from_arrays(words.offsets, flat, mask=pc.is_null(words))
+    return _clean_key(pc.binary_join(words, " "), "address")
+
+
+def _amounts(values):
+    """Parse amounts such as ``$1,234.50`` or ``(1,234)``; anything else is 0."""
+    if pa.types.is_integer(values.type) or pa.types.is_floating(values.type) or pa.types.is_decimal(values.type):
+        return pc.fill_null(pc.cast(values, pa.float64()), 0.0)
+    text = _text(values)
+    try:
+        return pc.fill_null(pc.cast(text, pa.float64()), 0.0)
+    except pa.ArrowInvalid:
+        pass
+    # Accounting negatives are written as "(1,234.50)"; currency signs and
+    # thousands separators are dropped.
+    text = pc.replace_substring_regex(text, r"^\((.*)\)$", r"-\1")
+    text = pc.replace_substring_regex(text, r"[,\s$]", "")
+    numeric = pc.match_substring_regex(text, r"^[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$")
+    text = pc.if_else(numeric, text, pa.scalar(None, pa.string()))
+    return pc.fill_null(pc.cast(text, pa.float64()), 0.0)
+
+
+def normalize_master(table, role, column_map=None):
+    """Return the raw master ``table`` (or record batch) as the engine's record table.
+
+    Columns are those of ``RECORD_SCHEMA``: ``role``, ``record_id``,
+    ``name``, ``amount`` (0 when absent) and the normalized
+    ``LINK_ATTRIBUTES`` (null when absent or too generic to link on).
+    """
+    if role not in ROLES:
+        raise MasterDataError(f"Unknown master data role {role!r}; expected one of {', '.join(ROLES)}")
+    columns = resolve_columns(table.schema.names, column_map)
+    rows = table.num_rows
+
+    def column(field):
+        values = table.column(columns[field])
+        return values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+
+    def text(field):
+        if field not in columns:
+            return pa.nulls(rows, pa.string())
+        return _text(column(field))
+
+    if "record_id" in columns:
+        record_id = pc.fill_null(text("record_id"), "")
+    else:
+        record_id = pc.cast(pa.array(np.arange(1, rows + 1)), pa.string())
+    # Blank parts join as empty strings, so the result always has one value
+    # per row; an address left empty is nulled by _clean_key
+    address_parts = [pc.fill_null(text(field), "") for field in ADDRESS_FIELDS if field in columns]
+    address = (
+        pc.binary_join_element_wise(*address_parts, " ")
+        if address_parts else pa.nulls(rows, pa.string())
+    )
+    return pa.Table.from_arrays([
+        pa.repeat(role, rows),
+        record_id,
+        pc.fill_null(text("name"), ""),
+        _amounts(column("amount")) if "amount" in columns else pa.repeat(0.0, rows),
+        normalize_identifier(text("bank_account"), "bank_account"),
+        normalize_identifier(text("tax_id"), "tax_id"),
+        normalize_phone(text("phone")),
+        normalize_address(address),
+    ], schema=RECORD_SCHEMA)
+
+
+def load_master(source, role, column_map=None, filename=None, sheet=None):
+    """Read one CSV, Excel or Parquet master file (path or binary file object) and normalize it.
+
+    The file is read and normalized in chunks. CSV and Excel values are read
+    as text, so IDs and account numbers keep their leading zeros.
+    """
+    from ledger_ingest import LedgerError, iter_source_batches
+    try:
+        tables = [
+            normalize_master(batch, role, column_map)
+            for batch in iter_source_batches(source, filename=filename, sheet=sheet)
+        ]
+    except LedgerError as e:
+        raise MasterDataError(str(e).replace("ledger", "master")) from None
+    except pa.ArrowInvalid as e:
+        raise MasterDataError(f"Could not read master file: {e}") from None
+    return pa.concat_tables(tables) if tables else RECORD_SCHEMA.empty_table()
+
+
+def load_masters(sources, column_map=None):
+    """Read and stack master files from ``{role: [source, ...]}``."""
+    tables = [
+        load_master(source, role, column_map)
+        for role, role_sources in sources.items()
+        for source in role_sources
+    ]
+    if not tables:
+        raise MasterDataError("No master files were given")
+    return pa.concat_tables(tables)
+
+
+def connected_components(count, left, right):
+    """Return each node's component label (its smallest member) for the edges ``left``-``right``.
+
+    Vectorized union-find: every pass hooks the larger root of each edge
+    under the smaller one, then compresses paths by pointer jumping. Edges
+    whose ends already share a root are dropped, so passes get cheaper.
+    """
+    parent = np.arange(count, dtype=np.int64)
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    while len(left):
+        left_root, right_root = parent[left], parent[right]
+        open_edges = left_root != right_root
+        if not open_edges.any():
+            break
+        left, right = left[open_edges], right[open_edges]
+        left_root, right_root = left_root[open_edges], right_root[open_edges]
+        np.minimum.at(parent, np.maximum(left_root, right_root), np.minimum(left_root, right_root))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return parent
+
+
+def _pair_weights(roles):
+    """Return the role weight of each bucket from its ``(buckets, 3)`` role counts."""
+    vendors, employees, customers = roles[:, 0], roles[:, 1], roles[:, 2]
+    return np.select(
+        [
+            (vendors > 0) & (employees > 0),
+            (vendors > 0) & (customers > 0),
+            (employees > 0) & (customers > 0),
+            vendors > 1,
+        ],
+        [EMPLOYEE_VENDOR_WEIGHT, CUSTOMER_VENDOR_WEIGHT, EMPLOYEE_CUSTOMER_WEIGHT, VENDOR_VENDOR_WEIGHT],
+        default=SAME_ROLE_WEIGHT,
+    )
+
+
+def block(records, max_bucket=MAX_BUCKET_SIZE):
+    """Bucket ``records`` by each linking attribute.
+
+    Returns ``(left, right, buckets, skipped)``: the links as index arrays,
+    a DataFrame with one row per kept bucket (``attribute``, ``value``,
+    ``anchor``, ``size``, role counts and ``score``), and the number of
+    oversized buckets skipped per attribute.
+    """
+    role_codes = pc.index_in(records.column("role"), value_set=pa.array(ROLES)).to_numpy(zero_copy_only=False)
+    lefts, rights, parts, skipped = [], [], [], {}
+    for attribute in LINK_ATTRIBUTES:
+        encoded = pc.dictionary_encode(records.column(attribute)).combine_chunks()
+        codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+        members = np.flatnonzero(codes >= 0)
+        codes = codes[members]
+        sizes = np.bincount(codes, minlength=len(encoded.dictionary))
+        skipped[attribute] = int((sizes > max_bucket).sum())
+        kept = (sizes[codes] >= 2) & (sizes[codes] <= max_bucket)
+        members, codes = members[kept], codes[kept]
+        if not len(members):
+            continue
+        # Members are in record order, so a bucket's first occurrence is its anchor
+        bucket_codes, first = np.unique(codes, return_index=True)
+        anchors = np.zeros(len(sizes), dtype=np.int64)
+        anchors[bucket_codes] = members[first]
+        linked = members != anchors[codes]
+        lefts.append(members[linked])
+        rights.append(anchors[codes][linked])
+        roles = np.bincount(codes * len(ROLES) + role_codes[members],
+                            minlength=len(sizes) * len(ROLES)).reshape(-1, len(ROLES))[bucket_codes]
+        bucket_sizes = sizes[bucket_codes]
+        parts.append(pd.DataFrame({
+            "attribute": attribute,
+            "value": encoded.dictionary.take(pa.array(bucket_codes)).to_pandas(),
+            "anchor": anchors[bucket_codes],
+            "size": bucket_sizes,
+            "vendors": roles[:, 0],
+            "employees": roles[:, 1],
+            "customers": roles[:, 2],
+            "score": ATTRIBUTE_WEIGHTS[attribute] * _pair_weights(roles) * np.log2(bucket_sizes),
+        }))
+    left = np.concatenate(lefts) if lefts else np.zeros(0, dtype=np.int64)
+    right = np.concatenate(rights) if rights else np.zeros(0, dtype=np.int64)
+    columns = ["attribute", "value", "anchor", "size", "vendors", "employees", "customers", "score"]
+    buckets = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    return left, right, buckets, skipped
+
+
+def score_level(scores):
+    """Return the finding level of each cluster score."""
+    scores = np.asarray(scores, dtype=float)
+    return np.select([scores >= bound for _, bound in SCORE_LEVELS], [level for level, _ in SCORE_LEVELS],
+                     default="Low").astype(object)
+
+
+def _shared_labels(buckets):
+    """Return the attributes each cluster shares, as text indexed by cluster."""
+    bits = np.zeros(len(buckets), dtype=np.int64)
+    for bit, attribute in enumerate(LINK_ATTRIBUTES):
+        bits[(buckets["attribute"] == attribute).to_numpy()] = 1 << bit
+    # Each attribute counts once per cluster, so the sum of its bits is the mask
+    flags = pd.DataFrame({"cluster": buckets["cluster"], "attribute": buckets["attribute"], "bit": bits})
+    masks = flags.drop_duplicates(["cluster", "attribute"]).groupby("cluster")["bit"].sum()
+    labels = {
+        mask: ", ".join(ATTRIBUTE_LABELS[name] for bit, name in enumerate(LINK_ATTRIBUTES) if mask >> bit & 1)
+        for mask in range(1, 1 << len(LINK_ATTRIBUTES))
+    }
+    return masks.map(labels)
+
+
+def find_related_parties(records, max_bucket=MAX_BUCKET_SIZE):
+    """Link ``records`` (a ``load_masters`` table) and score the resulting clusters.
+
+    Returns a dict with the record counts, the skipped buckets, a
+    ``clusters`` DataFrame ranked by score and a ``members`` DataFrame of the
+    linked records.
+    """
+    left, right, buckets, skipped = block(records, max_bucket)
+    labels = connected_components(records.num_rows, left, right)
+    roles = records.column("role").to_numpy(zero_copy_only=False)
+    result = {
+        "records": records.num_rows,
+        "by_role": {role: int((roles == role).sum()) for role in ROLES},
+        "skipped_buckets": skipped,
+        "links": len(buckets),
+        "buckets": buckets,
+    }
+    if buckets.empty:
+        result["clusters"] = pd.DataFrame(columns=[
+            "cluster", "records", "vendors", "employees", "customers", "shared", "score", "amount", "level",
+        ])
+        result["members"] = pd.DataFrame(columns=["cluster", "role", "record_id", "name", "amount"])
+        return result
+
+    buckets["cluster"] = labels[buckets["anchor"].to_numpy()]
+    linked = np.flatnonzero(np.bincount(labels, minlength=len(labels))[labels] > 1)
+    members = pd.DataFrame({
+        "cluster": labels[linked],
+        "role": roles[linked],
+        "record_id": records.column("record_id").take(pa.array(linked)).to_pandas(),
+        "name": records.column("name").take(pa.array(linked)).to_pandas(),
+        "amount": records.column("amount").to_numpy()[linked],
+    })
+    counts = pd.DataFrame({
+        "cluster": members["cluster"],
+        "records": 1,
+        "vendors": (members["role"] == "vendor").astype(np.int64),
+        "employees": (members["role"] == "employee").astype(np.int64),
+        "customers": (members["role"] == "customer").astype(np.int64),
+        "amount": members["amount"],
+    })
+    clusters = counts.groupby("cluster").sum()
+    clusters["score"] = buckets.groupby("cluster")["score"].sum()
+    clusters["shared"] = _shared_labels(buckets)
+    clusters["level"] = score_level(clusters["score"].to_numpy())
+    clusters = clusters.reset_index().sort_values(["score", "records", "cluster"], ascending=[False, False, True],
+                                                  kind="stable")
+    rank = pd.Series(np.arange(len(clusters)), index=clusters["cluster"])
+    members = members.assign(rank=members["cluster"].map(rank)).sort_values(["rank", "role", "record_id"])
+    result["clusters"] = clusters.reset_index(drop=True)
+    result["members"] = members.drop(columns="rank").reset_index(drop=True)
+    return result
+
+
+def run_related_parties(sources, column_map=None, max_bucket=MAX_BUCKET_SIZE):
+    """Load ``{role: [source, ...]}`` and analyse it, reusing a cached result for the same data.
+
+    File objects are rewound before they are read, so Streamlit uploads can
+    be passed directly.
+    """
+    sources = {role: list(role_sources) for role, role_sources in sources.items() if role_sources}
+    key = (
+        tuple((role, dataset_hash(role_sources)) for role, role_sources in sorted(sources.items())),
+        json.dumps(column_map, sort_keys=True),
+        max_bucket,
+    )
+
+    def build():
+        for role_sources in sources.values():
+            for source in role_sources:
+                if hasattr(source, "seek"):
+                    source.seek(0)
+        return find_related_parties(load_masters(sources, column_map), max_bucket)
+
+    return _cache.get_or_build(key, build)
+
+
+def flagged_clusters(result, threshold=MIN_CLUSTER_SCORE):
+    """Return the clusters scoring at least ``threshold``, highest first."""
+    clusters = result["clusters"]
+    return clusters[clusters["score"] >= threshold]
+
+
+def member_labels(result, clusters, limit=MAX_MEMBERS_SHOWN):
+    """Return ``{cluster: [label, ...]}`` naming up to ``limit`` members of each of ``clusters``."""
+    members = result["members"]
+    selected = members[members["cluster"].isin(set(clusters))]
+    labels = {cluster: [] for cluster in clusters}
+    for row in selected.groupby("cluster", sort=False).head(limit).itertuples(index=False):
+        labels[row.cluster].append(f"{row.role} {row.record_id} {row.name}".strip())
+    sizes = selected.groupby("cluster").size()
+    for cluster, size in sizes[sizes > limit].items():
+        labels[cluster].append(f"+{size - limit:,} more")
+    return labels
+
+
+def related_party_findings(result, risk_criteria=None, threshold=MIN_CLUSTER_SCORE):
+    """Summarize the flagged clusters as one plan finding per level."""
+    flagged = flagged_clusters(result, threshold)
+    findings = []
+    for level in FINDING_LEVELS:
+        selected = flagged[flagged["level"] == level]
+        if selected.empty:
+            continue
+        employee_vendor = int(((selected["employees"] > 0) & (selected["vendors"] > 0)).sum())
+        detail = (f"{int(selected['records'].sum()):,} master records share a bank account, tax ID, "
+                  f"phone or address")
+        if employee_vendor:
+            detail += f"; {employee_vendor:,} clusters link employees to vendors"
+        findings.append(make_finding(
+            SOURCE,
+            "Related-party clusters",
+            selected["amount"].sum(),
+            len(selected),
+            detail,
+            risk_criteria,
+            level=level
+        ))
+    return findings
+
+
+def related_party_risks(result, limit=MAX_RISK_ITEMS, threshold=MIN_CLUSTER_SCORE):
+    """Return ``{level: [risk area, ...]}`` for the highest-scoring clusters.
+
+    The items are meant for ``build_audit_plan(added_risks=...)``.
+    """
+    flagged = flagged_clusters(result, threshold).groupby("level", sort=False).head(limit)
+    labels = member_labels(result, flagged["cluster"], 2)
+    risks = {level: [] for level in FINDING_LEVELS}
+    for row in flagged.itertuples(index=False):
+        risks[row.level].append(f"Related parties sharing {row.shared}: {'; '.join(labels[row.cluster])}")
+    return {level: items for level, items in risks.items() if items}
+
+
+def related_party_appendix(result, limit=MAX_APPENDIX_ROWS, threshold=MIN_CLUSTER_SCORE):
+    """Return the flagged clusters as an ``audit_plan`` appendix table."""
+    flagged = flagged_clusters(result, threshold)
+    labels = member_labels(result, flagged["cluster"].head(limit))
+    rows = [
+        [
+            str(rank),
+            row.level,
+            f"{row.score:.1f}",
+            f"{row.records:,}",
+            row.shared,
+            "\n".join(labels[row.cluster]),
+            f"{row.amount:,.0f}",
+        ]
+        for rank, row in enumerate(flagged.head(limit).itertuples(index=False), start=1)
+    ]
+    note = (f"Clusters of vendor, employee and customer records scoring at least {threshold:g}, "
+            f"highest first.")
+    skipped = sum(result["skipped_buckets"].values())
+    if skipped:
+        note += f" Values shared by more than {MAX_BUCKET_SIZE} records were not linked on ({skipped:,})."
+    if len(flagged) > limit:
+        note += f" Showing the {limit:,} highest of {len(flagged):,} flagged clusters."
+    return {
+        "title": "Related-Party Clusters",
+        "columns": list(APPENDIX_COLUMNS),
+        "widths": list(APPENDIX_WIDTHS),
+        "rows": rows,
+        "note": note,
+    }
+
+
+_cache = ResultCache(MAX_CACHED_RESULTS)
+
+
+def clear_cache():
+    """Drop every cached result."""
+    _cache.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find related parties across master data files.")
+    parser.add_argument("--vendors", nargs="+", default=[], help="Vendor master files")
+    parser.add_argument("--employees", nargs="+", default=[], help="Employee master files")
+    parser.add_argument("--customers", nargs="+", default=[], help="Customer master files")
+    parser.add_argument("--column", action="append", default=[], metavar="FIELD=SOURCE",
+                        help="Map a field to a source column, e.g. bank_account=\"Payee IBAN\"")
+    parser.add_argument("--threshold", type=float, default=MIN_CLUSTER_SCORE,
+                        help="Lowest cluster score to flag")
+    parser.add_argument("--json", dest="json_path", help="Write the flagged clusters and members here")
+    args = parser.parse_args(argv)
+
+    sources = {"vendor": args.vendors, "employee": args.employees, "customer": args.customers}
+    column_map = dict(item.split("=", 1) for item in args.column)
+    try:
+        result = run_related_parties(sources, column_map=column_map or None)
+    except (OSError, MasterDataError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    flagged = flagged_clusters(result, args.threshold)
+    if args.json_path:
+        members = result["members"]
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump([
+                dict(cluster, members=members[members["cluster"] == cluster["cluster"]]
+                     .drop(columns="cluster").to_dict("records"))
+                for cluster in flagged.to_dict("records")
+            ], f, indent=2, default=str)
+    print(json.dumps({
+        "records": result["by_role"],
+        "clusters": len(result["clusters"]),
+        "flagged": len(flagged),
+        "skipped_buckets": result["skipped_buckets"],
+    }, indent=2), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
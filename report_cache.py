@@ -0,0 +1,237 @@
+"""Content-addressed cache for rendered audit PDF reports.
+
+Streamlit reruns the whole script on every interaction, so the same
+``audit_plan`` is often rendered many times in a row. Rendered reports are
+keyed by a stable hash of the normalized plan and kept in a bounded
+in-memory LRU tier, optionally backed by an on-disk tier with size-based
+eviction.
+"""
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Bump whenever the report layout changes so stale on-disk entries are not reused.
+RENDER_VERSION = "4"
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+
+def normalize_plan(value):
+    """Return a JSON-serializable, order-stable copy of an audit plan."""
+    if isinstance(value, dict):
+        return {str(k): normalize_plan(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_plan(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(normalize_plan(v) for v in value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Cannot fingerprint value of type {type(value).__name__}")
+
+
+def plan_fingerprint(audit_plan):
+    """Compute a stable SHA-256 hex digest for an audit plan."""
+    payload = json.dumps(
+        normalize_plan(audit_plan),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    digest = hashlib.sha256()
+    digest.update(RENDER_VERSION.encode("ascii"))
+    digest.update(b"\0")
+    digest.update(payload.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PDFCache:
+    """Two-tier (memory LRU + optional disk) cache of rendered PDF bytes."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 disk_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key):
+        """Return cached bytes for ``key`` or ``None``."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return data
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        """Store rendered bytes under ``key`` in every enabled tier."""
+        data = bytes(data)
+        with self._lock:
+            self._counters["stores"] += 1
+            self._store_memory(key, data)
+        self._write_disk(key, data)
+
+    def get_or_render(self, audit_plan, render):
+        """Return cached bytes for ``audit_plan``, calling ``render`` on a miss."""
+        key = plan_fingerprint(audit_plan)
+        data = self.get(key)
+        if data is None:
+            data = bytes(render(audit_plan))
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        """Return a snapshot of hit/miss/eviction counters and tier sizes."""
+        with self._lock:
+            snapshot = dict(self._counters)
+            snapshot["memory_entries"] = len(self._memory)
+            snapshot["memory_bytes"] = self._memory_bytes
+            snapshot["disk_bytes"] = self._disk_bytes
+        snapshot["hits"] = snapshot["memory_hits"] + snapshot["disk_hits"]
+        return snapshot
+
+    def clear(self):
+        """Drop every cached report from all tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self.disk_dir:
+                for path, _, _ in self._disk_entries():
+                    _remove_quietly(path)
+                self._disk_bytes = 0
+
+    def _store_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory and (len(self._memory) > self.max_entries
+                                or self._memory_bytes > self.max_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["memory_evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pdf")
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".pdf"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            # Refresh the mtime so disk eviction approximates LRU order.
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            _remove_quietly(temp_path)
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_disk_bytes:
+                break
+            if _remove_quietly(path):
+                total -= size
+                self._counters["disk_evictions"] += 1
+        self._disk_bytes = total
+
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+        return True
+    except OSError:
+        return False
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide PDF cache, configured from the environment.
+
+    ``AUDIT_PDF_CACHE_DIR`` enables the on-disk tier and
+    ``AUDIT_PDF_CACHE_ENTRIES`` bounds the in-memory tier.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PDFCache(
+                    max_entries=int(os.environ.get("AUDIT_PDF_CACHE_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    disk_dir=os.environ.get("AUDIT_PDF_CACHE_DIR") or None,
+                )
+    return _default_cache
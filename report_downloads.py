@@ -0,0 +1,98 @@
+"""Download route that streams reports straight from the artifact store.
+
+``st.download_button`` copies its data into Streamlit's in-memory media
+file manager on every rerun of every session, so a report would be held
+again per session outside the store's memory budget. Instead the Streamlit
+server gets one extra route::
+
+    /<base url>/reports/<artifact id>?name=<file name>
+
+It streams the stored artifact in ``CHUNK_BYTES`` pieces from memory or from
+the spill file. The page only renders a link to it.
+
+The pinned Streamlit has no API for extra routes. Its server is a Tornado
+``Application`` in the same process, so the route is added with Tornado's
+public ``add_handlers`` the first time a report link is rendered.
+"""
+import gc
+import re
+import threading
+
+from artifact_store import get_artifact_store
+
+ROUTE = "reports"
+CHUNK_BYTES = 256 * 1024
+ARTIFACT_ID = r"[0-9a-f]{64}"
+DEFAULT_FILE_NAME = "report.pdf"
+
+_registered = None
+_register_lock = threading.Lock()
+
+
+def _handler_class():
+    import tornado.web
+
+    class ArtifactDownloadHandler(tornado.web.RequestHandler):
+        async def get(self, artifact_id):
+            report = get_artifact_store().open(artifact_id)
+            if report is None:
+                raise tornado.web.HTTPError(404, reason="Report expired; generate it again")
+            name = safe_file_name(self.get_query_argument("name", DEFAULT_FILE_NAME))
+            self.set_header("Content-Type", "application/pdf")
+            self.set_header("Content-Disposition", f'attachment; filename="{name}"')
+            self.set_header("Cache-Control", "private, max-age=0")
+            with report:
+                while True:
+                    chunk = report.read(CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    self.write(chunk)
+                    # Hand each chunk to the socket before reading the next
+                    await self.flush()
+
+    return ArtifactDownloadHandler
+
+
+def safe_file_name(name):
+    """Return ``name`` reduced to characters that are safe in a header."""
+    name = re.sub(r"[^0-9A-Za-z._ -]+", "_", name).strip(" .")
+    return name or DEFAULT_FILE_NAME
+
+
+def _base_path():
+    import streamlit as st
+    base = (st.get_option("server.baseUrlPath") or "").strip("/")
+    return f"/{base}" if base else ""
+
+
+def _server_applications():
+    import tornado.web
+    return [obj for obj in gc.get_objects() if isinstance(obj, tornado.web.Application)]
+
+
+def register_route():
+    """Add the download route to the running Streamlit server.
+
+    Returns ``False`` when there is no server in this process (e.g. under
+    ``AppTest``). The lookup runs once per process.
+    """
+    global _registered
+    if _registered is not None:
+        return _registered
+    with _register_lock:
+        if _registered is None:
+            applications = _server_applications()
+            pattern = rf"{re.escape(_base_path())}/{ROUTE}/({ARTIFACT_ID})"
+            handler = _handler_class()
+            for application in applications:
+                application.add_handlers(r".*", [(pattern, handler)])
+            _registered = bool(applications)
+    return _registered
+
+
+def download_url(artifact_id, file_name):
+    """Return the page-relative URL of ``artifact_id``, or ``None`` without a server route."""
+    if not register_route():
+        return None
+    from urllib.parse import quote
+    return f"{_base_path()}/{ROUTE}/{artifact_id}?name={quote(safe_file_name(file_name))}"
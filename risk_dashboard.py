@@ -0,0 +1,206 @@
+"""Server-side aggregates for the risk dashboard.
+
+Charts never receive raw ledger lines. The ledger is streamed once through
+``LedgerAggregates``, which keeps:
+- a log-binned histogram of absolute amounts (count and value per bin)
+- daily counts of all lines and of lines flagged by the journal-entry tests
+
+Both are fixed-size or bounded by the number of days in the ledger. The
+daily series is reduced with largest-triangle-three-buckets (LTTB) before it
+is drawn, so a multi-year ledger still produces a few hundred points.
+
+Aggregates are cached per dataset version: a hash of the ledger file's path,
+size and modification time, or of the catalog signature for the sector
+heatmap. Reruns that do not change the data reuse the cached result.
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from data_sources import ResultCache, dataset_hash
+from planning import DEFAULT_IMPACT_THRESHOLDS, FINDING_LEVELS, IMPACT_CRITERION, impact_level
+
+DASHBOARD_COLUMNS = ("posting_date", "entered_at", "amount")
+# Histogram bins: one underflow bin for amounts below 1, then 10 per decade up to 10^12
+BINS_PER_DECADE = 10
+MAX_DECADE = 12
+AMOUNT_EDGES = np.concatenate(([0.0], 10.0 ** (np.arange(MAX_DECADE * BINS_PER_DECADE + 1) / BINS_PER_DECADE)))
+MAX_TREND_POINTS = 400
+MAX_CACHED_DATASETS = 8
+
+
+def dataset_version(path):
+    """Return a short hash identifying the current contents of the file at ``path``."""
+    return dataset_hash([path])
+
+
+def sector_risk_matrix(catalog):
+    """Return ``(sector, level, risk areas)`` rows for the sector heatmap."""
+    return _cache.get_or_build(("sectors", catalog.version), lambda: [
+        {"sector": name, "level": level, "risks": len(template["risks"][level])}
+        for name, template in catalog.sectors.items()
+        for level in FINDING_LEVELS
+    ])
+
+
+class _DailySeries:
+    """Per-day counters that grow to cover whatever date range is seen."""
+
+    def __init__(self):
+        self.origin = None
+        self.lines = np.zeros(0, dtype=np.int64)
+        self.flagged = np.zeros(0, dtype=np.int64)
+
+    def add(self, days, flagged):
+        if not len(days):
+            return
+        first, last = int(days.min()), int(days.max())
+        if self.origin is None:
+            self.origin = first
+        if first < self.origin:
+            self._pad(self.origin - first, 0)
+            self.origin = first
+        if last - self.origin + 1 > len(self.lines):
+            self._pad(0, last - self.origin + 1 - len(self.lines))
+        index = days - self.origin
+        size = len(self.lines)
+        self.lines += np.bincount(index, minlength=size)
+        self.flagged += np.bincount(index[flagged], minlength=size)
+
+    def _pad(self, before, after):
+        self.lines = np.pad(self.lines, (before, after))
+        self.flagged = np.pad(self.flagged, (before, after))
+
+    def dates(self):
+        return np.arange(len(self.lines)) + self.origin
+
+
+class LedgerAggregates:
+    """Streaming histogram and daily flag counts for one ledger."""
+
+    def __init__(self, **options):
+        from je_tests import JournalEntryTests
+        self.tests = JournalEntryTests(**options)
+        self.counts = np.zeros(len(AMOUNT_EDGES) - 1, dtype=np.int64)
+        self.amounts = np.zeros(len(AMOUNT_EDGES) - 1)
+        self.daily = _DailySeries()
+        self.rows = 0
+        self.flagged = 0
+
+    def update(self, batch):
+        """Fold one ledger batch into the aggregates."""
+        if batch.num_rows == 0:
+            return self
+        absolute = np.abs(pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False))
+        index = np.clip(np.searchsorted(AMOUNT_EDGES, absolute, side="right") - 1, 0, len(self.counts) - 1)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+        self.amounts += np.bincount(index, weights=absolute, minlength=len(self.counts))
+
+        flagged = self.tests.flagged_rows(batch)
+        self.rows += batch.num_rows
+        self.flagged += int(flagged.sum())
+        posting_dates = batch.column("posting_date")
+        valid = pc.is_valid(posting_dates).to_numpy(zero_copy_only=False)
+        days = pc.fill_null(posting_dates.cast(pa.int32()), 0).to_numpy(zero_copy_only=False)
+        self.daily.add(days[valid], flagged[valid])
+        return self
+
+
+def ledger_aggregates(ledger_path, **options):
+    """Return the cached ``LedgerAggregates`` for a normalized ledger file.
+
+    ``options`` are passed to ``JournalEntryTests``; the cache assumes they
+    are the same for every call on one dataset.
+    """
+    def build():
+        from ledger_ingest import iter_ledger_batches
+        aggregates = LedgerAggregates(**options)
+        for batch in iter_ledger_batches(ledger_path, columns=list(DASHBOARD_COLUMNS)):
+            aggregates.update(batch)
+        return aggregates
+    return _cache.get_or_build(("ledger", dataset_version(ledger_path)), build)
+
+
+def amount_histogram(aggregates, risk_criteria=None):
+    """Return the non-empty histogram bins, each tagged with its impact level."""
+    occupied = np.flatnonzero(aggregates.counts)
+    return [
+        {
+            "lower": float(AMOUNT_EDGES[i]),
+            "upper": float(AMOUNT_EDGES[i + 1]),
+            "lines": int(aggregates.counts[i]),
+            "amount": float(aggregates.amounts[i]),
+            "level": impact_level(AMOUNT_EDGES[i], risk_criteria),
+        }
+        for i in occupied
+    ]
+
+
+def impact_thresholds(risk_criteria=None):
+    """Return ``(level, amount)`` for the non-zero financial impact thresholds."""
+    thresholds = []
+    for level in FINDING_LEVELS:
+        criteria = (risk_criteria or {}).get(level, {})
+        amount = criteria.get(IMPACT_CRITERION, DEFAULT_IMPACT_THRESHOLDS[level])
+        if amount:
+            thresholds.append((level, float(amount)))
+    return thresholds
+
+
+def flag_trend(aggregates, max_points=MAX_TREND_POINTS):
+    """Return the daily line and flagged-line series, each reduced with LTTB.
+
+    Every row is ``{"date", "series", "lines"}``; the two series are reduced
+    independently so each keeps its own peaks.
+    """
+    daily = aggregates.daily
+    if daily.origin is None:
+        return []
+    dates = daily.dates()
+    rows = []
+    for series, values in (("All lines", daily.lines), ("Flagged lines", daily.flagged)):
+        x, y = lttb(dates, values, max_points)
+        days = x.astype("datetime64[D]").astype(object)
+        rows.extend({"date": day, "series": series, "lines": int(value)} for day, value in zip(days, y))
+    return rows
+
+
+def lttb(x, y, threshold):
+    """Downsample ``(x, y)`` to ``threshold`` points with largest-triangle-three-buckets.
+
+    The first and last points are always kept. Within each bucket the point
+    forming the largest triangle with the previous pick and the next bucket's
+    mean is kept, which preserves peaks that plain striding drops.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    xf = x.astype(float)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        mean_x = xf[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+        area = np.abs(
+            (xf[previous] - mean_x) * (y[start:end] - y[previous])
+            - (xf[previous] - xf[start:end]) * (mean_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return x[selected], y[selected]
+
+
+_cache = ResultCache(MAX_CACHED_DATASETS)
+
+
+def clear_cache():
+    """Drop every cached aggregate."""
+    _cache.clear()
@@ -1,23 +1,42 @@
 @echo off
+setlocal
 cd /d "%~dp0"
 
+if not defined STREAMLIT_SERVER_PORT set STREAMLIT_SERVER_PORT=8501
+set STARTUP_TIMEOUT=120
+
+rem Prefer the one-dir release build; fall back to the one-file debug build.
+set APP_EXE=dist\Financial_Audit_Assistant\Financial_Audit_Assistant.exe
+if not exist "%APP_EXE%" set APP_EXE=dist\Financial_Audit_Assistant.exe
+
 echo Starting Financial Audit Assistant...
 echo Creating log directory...
 if not exist "logs" mkdir logs
 
 echo Starting application with logging...
-"dist\Financial_Audit_Assistant.exe" > logs\app.log 2>&1
+start "Financial Audit Assistant" /b cmd /c ""%APP_EXE%" > logs\app.log 2>&1"
 
-echo Waiting for server to start...
-timeout /t 15 /nobreak
+echo Waiting for the server on port %STREAMLIT_SERVER_PORT%...
+powershell -NoProfile -ExecutionPolicy Bypass -Command ^
+  "$deadline = (Get-Date).AddSeconds(%STARTUP_TIMEOUT%);" ^
+  "while ((Get-Date) -lt $deadline) {" ^
+  "  try { if ((Invoke-WebRequest -UseBasicParsing -TimeoutSec 2 'http://localhost:%STREAMLIT_SERVER_PORT%/_stcore/health').StatusCode -eq 200) { exit 0 } } catch {};" ^
+  "  Start-Sleep -Milliseconds 250;" ^
+  "}; exit 1"
+if errorlevel 1 goto not_ready
 
-echo Attempting to open browser...
-start http://localhost:8501
+echo Opening browser...
+start http://localhost:%STREAMLIT_SERVER_PORT%
+echo The application is running.
+goto wait
 
-echo If the application doesn't open automatically, please:
-echo 1. Wait a few more seconds and try refreshing your browser
-echo 2. Check logs\app.log for any error messages
-echo 3. Make sure no other Streamlit applications are running on port 8501
+:not_ready
+echo The server did not answer within %STARTUP_TIMEOUT% seconds. Please:
+echo 1. Check logs\app.log for any error messages
+echo 2. Make sure no other application is using port %STREAMLIT_SERVER_PORT%
+echo 3. Try again, or set STREAMLIT_SERVER_PORT to a free port
 
-echo Press any key to exit this window...
-pause > nul 
\ No newline at end of file
+:wait
+echo Press any key to stop the application and exit this window...
+pause > nul
+taskkill /f /im Financial_Audit_Assistant.exe > nul 2>&1
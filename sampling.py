@@ -0,0 +1,388 @@
+"""Statistical audit sampling over normalized ledgers in one streaming pass.
+
+Three methods are offered, all reproducible from a seed:
+
+- Monetary-unit sampling (MUS): a random start and a fixed sampling interval
+  over the cumulative absolute amount. With no misstatement expected, the
+  interval is ``tolerable / reliability factor``, so it is known before the
+  pass and the population total never has to be.
+- Simple random sampling: every line gets a uniform random key, and the
+  lines with the smallest keys are kept in a bounded reservoir.
+- Stratified sampling by risk level: lines are banded High/Medium/Low by
+  the ``RISK_ASSESSMENT_CRITERIA`` financial-impact thresholds, with one
+  random-key reservoir per stratum. At the end of the pass the sample is
+  allocated across strata by monetary value times severity weight.
+
+Random keys come from one NumPy generator stream, so the same seed selects
+the same lines however the ledger is chunked.
+"""
+import math
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from allocation import apportion, level_weights
+from planning import DEFAULT_IMPACT_THRESHOLDS, FINDING_LEVELS, IMPACT_CRITERION
+
+MUS = "Monetary unit"
+RANDOM = "Simple random"
+STRATIFIED = "Stratified by risk level"
+METHODS = (MUS, RANDOM, STRATIFIED)
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_TOLERABLE_RATE = 0.05
+# AICPA expansion factors for expected misstatement, by confidence level
+EXPANSION_FACTORS = ((0.80, 1.3), (0.90, 1.5), (0.95, 1.6), (0.99, 1.9))
+SAMPLE_COLUMNS = ("entry_id", "posting_date", "account", "vendor", "description", "amount")
+APPENDIX_COLUMNS = ["#", "Entry", "Date", "Account", "Vendor", "Amount", "Basis"]
+APPENDIX_WIDTHS = [30, 78, 66, 64, 120, 84, 70]
+
+
+def reliability_factor(confidence, expected_errors=0):
+    """Return the Poisson upper bound on errors at ``confidence``.
+
+    With no expected errors this is ``-ln(1 - confidence)``: 3.0 at 95%.
+    """
+    if not 0 < confidence < 1:
+        raise ValueError("Confidence must be between 0 and 1")
+    if expected_errors == 0:
+        return -math.log(1 - confidence)
+    low, high = 0.0, expected_errors + 50.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if _poisson_cdf(expected_errors, mid) > 1 - confidence:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+def _poisson_cdf(k, mean):
+    term = total = math.exp(-mean)
+    for i in range(1, k + 1):
+        term *= mean / i
+        total += term
+    return total
+
+
+def expansion_factor(confidence):
+    for level, factor in EXPANSION_FACTORS:
+        if confidence <= level:
+            return factor
+    return EXPANSION_FACTORS[-1][1]
+
+
+def mus_interval(tolerable, confidence=DEFAULT_CONFIDENCE, expected=0.0):
+    """Return the MUS sampling interval for a tolerable and expected misstatement."""
+    headroom = tolerable - expected * expansion_factor(confidence)
+    if headroom <= 0:
+        raise ValueError("Expected misstatement leaves no room under the tolerable misstatement")
+    return headroom / reliability_factor(confidence)
+
+
+def mus_sample_size(population_value, tolerable, confidence=DEFAULT_CONFIDENCE, expected=0.0):
+    """Return the MUS sample size for a population of ``population_value``."""
+    return math.ceil(abs(population_value) / mus_interval(tolerable, confidence, expected))
+
+
+def attribute_sample_size(confidence=DEFAULT_CONFIDENCE, tolerable_rate=DEFAULT_TOLERABLE_RATE,
+                          expected_rate=0.0):
+    """Return the sample size for a tolerable deviation rate (Poisson model).
+
+    This is the smallest ``n`` for which the upper deviation limit, with
+    ``expected_rate * n`` deviations found, stays within ``tolerable_rate``.
+    """
+    if not 0 <= expected_rate < tolerable_rate < 1:
+        raise ValueError("Expected rate must be below the tolerable rate")
+    n = math.ceil(reliability_factor(confidence) / tolerable_rate)
+    while True:
+        errors = math.ceil(expected_rate * n)
+        if reliability_factor(confidence, errors) / n <= tolerable_rate:
+            return n
+        n += 1
+
+
+def _select(batch, positions, extra):
+    """Return the chosen rows as a small table with plain string columns."""
+    names = [name for name in SAMPLE_COLUMNS if name in batch.schema.names]
+    table = pa.Table.from_batches([batch.select(names)]).take(pa.array(positions, pa.int64()))
+    columns = [
+        pc.cast(table.column(name), pa.string()) if pa.types.is_dictionary(table.schema.field(name).type)
+        else table.column(name)
+        for name in names
+    ]
+    columns += [pa.array(values) for values in extra.values()]
+    return pa.table(columns, names=names + list(extra))
+
+
+def _concat(tables):
+    tables = [table for table in tables if table is not None and table.num_rows]
+    return pa.concat_tables(tables).combine_chunks() if tables else None
+
+
+class MonetaryUnitSampler:
+    """Fixed-interval MUS selection over the cumulative absolute amount."""
+
+    method = MUS
+
+    def __init__(self, interval, seed=0):
+        self.interval = float(interval)
+        self.start = float(np.random.default_rng(seed).uniform(0, self.interval))
+        self.items = 0
+        self.value = 0.0
+        self._selected = []
+
+    def update(self, batch, offset):
+        amounts = np.abs(pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False))
+        cumulative = self.value + np.cumsum(amounts)
+        before = cumulative - amounts
+        # A line is hit once for every selection point in (before, cumulative].
+        hits = (np.floor((cumulative - self.start) / self.interval)
+                - np.floor((before - self.start) / self.interval)).astype(np.int64)
+        hits[cumulative < self.start] = 0
+        positions = np.flatnonzero(hits > 0)
+        if len(positions):
+            self._selected.append(_select(batch, positions, {
+                "population_index": offset + positions,
+                "hits": hits[positions],
+                "basis": np.where(amounts[positions] >= self.interval, "Key item", "Interval"),
+            }))
+        self.items += batch.num_rows
+        self.value = float(cumulative[-1]) if len(cumulative) else self.value
+
+    def sample(self):
+        return _concat(self._selected)
+
+
+class _Reservoir:
+    """Keep the ``size`` rows with the smallest random keys seen so far."""
+
+    def __init__(self, size):
+        self.size = size
+        self.table = None
+        self.keys = np.empty(0)
+
+    def offer(self, batch, positions, keys, extra):
+        if self.size <= 0 or not len(positions):
+            return
+        if len(keys) > self.size:
+            keep = np.sort(np.argpartition(keys, self.size - 1)[:self.size])
+            positions, keys = positions[keep], keys[keep]
+            extra = {name: values[keep] for name, values in extra.items()}
+        if len(self.keys) >= self.size:
+            # Only keys below the current cut-off can enter the reservoir.
+            cutoff = self.keys.max()
+            keep = keys < cutoff
+            positions, keys = positions[keep], keys[keep]
+            extra = {name: values[keep] for name, values in extra.items()}
+            if not len(positions):
+                return
+        candidates = _select(batch, positions, dict(extra, random_key=keys))
+        table = _concat([self.table, candidates])
+        all_keys = np.concatenate([self.keys, keys])
+        if len(all_keys) > self.size:
+            keep = np.sort(np.argpartition(all_keys, self.size - 1)[:self.size])
+            table = table.take(pa.array(keep))
+            all_keys = all_keys[keep]
+        self.table, self.keys = table, all_keys
+
+    def smallest(self, count):
+        if self.table is None or count <= 0:
+            return None
+        order = np.argsort(self.keys, kind="stable")[:count]
+        return self.table.take(pa.array(np.sort(order)))
+
+
+class RandomSampler:
+    """Simple random sample of ``size`` lines by random-key reservoir."""
+
+    method = RANDOM
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.items = 0
+        self.value = 0.0
+        self._reservoir = _Reservoir(size)
+
+    def update(self, batch, offset):
+        amounts = np.abs(pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False))
+        keys = self.rng.random(batch.num_rows)
+        positions = np.arange(batch.num_rows)
+        self._reservoir.offer(batch, positions, keys, {
+            "population_index": offset + positions,
+            "basis": np.full(batch.num_rows, "Random"),
+        })
+        self.items += batch.num_rows
+        self.value += float(amounts.sum())
+
+    def sample(self):
+        table = self._reservoir.smallest(self.size)
+        return table.drop_columns(["random_key"]) if table is not None else None
+
+
+class StratifiedSampler:
+    """Per-risk-level reservoirs allocated by value times severity weight."""
+
+    method = STRATIFIED
+
+    def __init__(self, size, seed=0, risk_criteria=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.thresholds = np.array([
+            float((risk_criteria or {}).get(level, {}).get(IMPACT_CRITERION, DEFAULT_IMPACT_THRESHOLDS[level]))
+            for level in FINDING_LEVELS
+        ])
+        self.weights = level_weights(risk_criteria)
+        self.items = 0
+        self.value = 0.0
+        self.stratum_items = np.zeros(len(FINDING_LEVELS), dtype=np.int64)
+        self.stratum_values = np.zeros(len(FINDING_LEVELS))
+        # Each stratum could receive the whole sample, so each keeps ``size``.
+        self._reservoirs = [_Reservoir(size) for _ in FINDING_LEVELS]
+
+    def update(self, batch, offset):
+        amounts = np.abs(pc.fill_null(batch.column("amount"), 0.0).to_numpy(zero_copy_only=False))
+        keys = self.rng.random(batch.num_rows)
+        # Thresholds run High to Low, so the first one met gives the stratum.
+        strata = np.argmax(amounts[:, None] >= self.thresholds[None, :], axis=1)
+        strata[amounts < self.thresholds.min()] = len(FINDING_LEVELS) - 1
+        self.stratum_items += np.bincount(strata, minlength=len(FINDING_LEVELS))
+        self.stratum_values += np.bincount(strata, weights=amounts, minlength=len(FINDING_LEVELS))
+        for index, level in enumerate(FINDING_LEVELS):
+            positions = np.flatnonzero(strata == index)
+            self._reservoirs[index].offer(batch, positions, keys[positions], {
+                "population_index": offset + positions,
+                "basis": np.full(len(positions), f"{level} stratum"),
+            })
+        self.items += batch.num_rows
+        self.value += float(amounts.sum())
+
+    def allocation(self):
+        """Return the sample size drawn from each stratum."""
+        remaining = min(self.size, int(self.stratum_items.sum()))
+        sizes = np.zeros(len(FINDING_LEVELS), dtype=np.int64)
+        open_strata = self.stratum_items > 0
+        # Strata smaller than their share are taken whole; the rest is
+        # re-apportioned among the others.
+        while remaining > 0 and open_strata.any():
+            scores = np.where(open_strata, np.maximum(self.stratum_values, 1e-9) * self.weights, 0.0)
+            share = apportion([remaining], [scores])[0]
+            capacity = self.stratum_items - sizes
+            share = np.minimum(share, capacity)
+            sizes += share
+            remaining -= int(share.sum())
+            open_strata &= sizes < self.stratum_items
+        return dict(zip(FINDING_LEVELS, sizes.tolist()))
+
+    def sample(self):
+        parts = [
+            reservoir.smallest(count)
+            for reservoir, count in zip(self._reservoirs, self.allocation().values())
+        ]
+        table = _concat(parts)
+        return table.drop_columns(["random_key"]) if table is not None else None
+
+
+def draw_sample(ledger_path, method=MUS, confidence=DEFAULT_CONFIDENCE, tolerable=None, expected=0.0,
+                tolerable_rate=DEFAULT_TOLERABLE_RATE, expected_rate=0.0, size=None, seed=0,
+                risk_criteria=None):
+    """Select a sample from a normalized ledger file in one pass.
+
+    MUS needs ``tolerable`` (and optionally ``expected``) misstatement in
+    currency units. Random and stratified samples use ``size`` or, when it is
+    not given, ``attribute_sample_size(confidence, tolerable_rate,
+    expected_rate)``. Returns a dict with the method, its parameters,
+    population totals and the selected lines as a ``pa.Table``.
+    """
+    from ledger_ingest import iter_ledger_batches
+    parameters = {"confidence": confidence, "seed": seed}
+    if method == MUS:
+        if not tolerable:
+            raise ValueError("Monetary-unit sampling needs a tolerable misstatement")
+        interval = mus_interval(tolerable, confidence, expected)
+        sampler = MonetaryUnitSampler(interval, seed)
+        parameters.update(tolerable=tolerable, expected=expected, interval=interval)
+    elif method in (RANDOM, STRATIFIED):
+        size = size or attribute_sample_size(confidence, tolerable_rate, expected_rate)
+        if method == RANDOM:
+            sampler = RandomSampler(size, seed)
+        else:
+            sampler = StratifiedSampler(size, seed, risk_criteria)
+        parameters.update(size=size, tolerable_rate=tolerable_rate, expected_rate=expected_rate)
+    else:
+        raise ValueError(f"Unknown sampling method: {method}")
+
+    offset = 0
+    for batch in iter_ledger_batches(ledger_path, columns=list(SAMPLE_COLUMNS)):
+        sampler.update(batch, offset)
+        offset += batch.num_rows
+    sample = sampler.sample()
+    if sample is None:
+        sample = pa.table({name: pa.array([], pa.string()) for name in SAMPLE_COLUMNS})
+    result = {
+        "method": method,
+        "parameters": parameters,
+        "population_items": sampler.items,
+        "population_value": sampler.value,
+        "sample": sample,
+    }
+    if method == STRATIFIED:
+        result["strata"] = {
+            level: {"items": int(items), "value": float(value), "sampled": sampled}
+            for level, items, value, sampled in zip(
+                FINDING_LEVELS, sampler.stratum_items, sampler.stratum_values, sampler.allocation().values()
+            )
+        }
+    return result
+
+
+def export_sample(result, destination):
+    """Write the selected lines as CSV to a path or binary file object."""
+    import pyarrow.csv as pacsv
+    pacsv.write_csv(result["sample"], destination)
+
+
+def sample_summary(result):
+    """Describe the population and sample in one sentence."""
+    parameters = result["parameters"]
+    text = (
+        f"{result['method']} sample of {result['sample'].num_rows:,} lines from "
+        f"{result['population_items']:,} lines (${result['population_value']:,.0f}) at "
+        f"{parameters['confidence']:.0%} confidence, seed {parameters['seed']}"
+    )
+    if "interval" in parameters:
+        text += (f"; tolerable misstatement ${parameters['tolerable']:,.0f}, "
+                 f"sampling interval ${parameters['interval']:,.0f}")
+    if "strata" in result:
+        text += "; " + ", ".join(
+            f"{level} {stratum['sampled']:,}/{stratum['items']:,}" for level, stratum in result["strata"].items()
+        )
+    return text + "."
+
+
+def sample_appendix(result):
+    """Return the selected lines as an ``audit_plan`` appendix table."""
+    sample = result["sample"]
+    data = {name: sample.column(name).to_pylist() if name in sample.column_names else [None] * sample.num_rows
+            for name in ("entry_id", "posting_date", "account", "vendor", "amount", "basis")}
+    rows = [
+        [
+            str(index + 1),
+            data["entry_id"][index] or "",
+            str(data["posting_date"][index] or ""),
+            data["account"][index] or "",
+            data["vendor"][index] or "",
+            f"{data['amount'][index]:,.2f}" if data["amount"][index] is not None else "",
+            data["basis"][index] or "",
+        ]
+        for index in range(sample.num_rows)
+    ]
+    return {
+        "title": f"{result['method']} Sample Selection",
+        "columns": list(APPENDIX_COLUMNS),
+        "widths": list(APPENDIX_WIDTHS),
+        "rows": rows,
+        "note": sample_summary(result),
+    }
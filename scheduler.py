@@ -0,0 +1,325 @@
+"""Portfolio scheduling of engagements and staff bookings.
+
+Each staff member's booked load over time lives in a sparse segment tree
+indexed by day. Adding or removing an engagement is a range update, and
+asking whether someone is over capacity in a date window, or on which day
+they first are, is a range query. Both take O(log D) per staff member, with
+D the number of days in the calendar horizon. Nothing is recomputed for the
+rest of the portfolio when one plan is saved.
+"""
+import bisect
+import datetime
+import threading
+
+HORIZON_START = datetime.date(2000, 1, 1)
+HORIZON_END = datetime.date(2100, 1, 1)
+DEFAULT_CAPACITY = 1
+
+
+class _LoadTree:
+    """Sparse segment tree over days supporting range add and range max.
+
+    Node values are never pushed down: ``add[n]`` applies to the node's whole
+    range and ``peak[n]`` is the node's maximum including its own ``add``.
+    Missing children therefore have an implicit load of zero.
+    """
+
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+        self.left = [-1]
+        self.right = [-1]
+        self.add = [0]
+        self.peak = [0]
+
+    def _new_node(self):
+        self.left.append(-1)
+        self.right.append(-1)
+        self.add.append(0)
+        self.peak.append(0)
+        return len(self.add) - 1
+
+    def update(self, start, end, delta):
+        """Add ``delta`` to every day in ``[start, end)``."""
+        self._update(0, self.lo, self.hi, start, end, delta)
+
+    def _update(self, node, lo, hi, start, end, delta):
+        if end <= lo or hi <= start:
+            return
+        if start <= lo and hi <= end:
+            self.add[node] += delta
+            self.peak[node] += delta
+            return
+        mid = (lo + hi) // 2
+        if self.left[node] < 0:
+            child = self._new_node()
+            self.left[node] = child
+        if self.right[node] < 0:
+            child = self._new_node()
+            self.right[node] = child
+        self._update(self.left[node], lo, mid, start, end, delta)
+        self._update(self.right[node], mid, hi, start, end, delta)
+        self.peak[node] = self.add[node] + max(self.peak[self.left[node]], self.peak[self.right[node]])
+
+    def max_load(self, start, end):
+        """Return the highest load on any day in ``[start, end)``."""
+        return self._max(0, self.lo, self.hi, start, end)
+
+    def _max(self, node, lo, hi, start, end):
+        if end <= lo or hi <= start:
+            return 0
+        if node < 0:
+            return 0
+        if start <= lo and hi <= end:
+            return self.peak[node]
+        mid = (lo + hi) // 2
+        return self.add[node] + max(
+            self._max(self.left[node], lo, mid, start, end),
+            self._max(self.right[node], mid, hi, start, end),
+        )
+
+    def first_at_least(self, start, end, threshold):
+        """Return the first day in ``[start, end)`` with load >= ``threshold``."""
+        return self._first(0, self.lo, self.hi, start, end, threshold, 0)
+
+    def _first(self, node, lo, hi, start, end, threshold, inherited):
+        if end <= lo or hi <= start:
+            return None
+        if node < 0:
+            # An absent subtree carries only its ancestors' load.
+            return max(lo, start) if inherited >= threshold else None
+        if inherited + self.peak[node] < threshold:
+            return None
+        if self.left[node] < 0 and self.right[node] < 0:
+            return max(lo, start)
+        mid = (lo + hi) // 2
+        inherited += self.add[node]
+        found = self._first(self.left[node], lo, mid, start, end, threshold, inherited)
+        if found is None:
+            found = self._first(self.right[node], mid, hi, start, end, threshold, inherited)
+        return found
+
+
+class Engagement:
+    """A planned audit with its inclusive date range and assigned staff."""
+
+    def __init__(self, engagement_id, company_name, start, end, staff):
+        if end < start:
+            raise ValueError("Audit end date is before the start date")
+        self.id = engagement_id
+        self.company_name = company_name
+        self.start = start
+        self.end = end
+        self.staff = tuple(dict.fromkeys(name for name in staff if name))
+
+    @property
+    def days(self):
+        return (self.end - self.start).days + 1
+
+
+class StaffConflict:
+    """Capacity problem for one staff member in a requested window."""
+
+    def __init__(self, staff, first_day, peak_load, capacity, engagements):
+        self.staff = staff
+        self.first_day = first_day
+        self.peak_load = peak_load
+        self.capacity = capacity
+        self.engagements = engagements
+
+    def __repr__(self):
+        return (f"StaffConflict({self.staff!r}, first_day={self.first_day}, "
+                f"peak_load={self.peak_load}, capacity={self.capacity})")
+
+
+class _StaffCalendar:
+    def __init__(self, lo, hi):
+        self.load = _LoadTree(lo, hi)
+        # (start_ordinal, engagement_id) sorted by start, plus the longest
+        # booking, so overlapping bookings are found without a full scan.
+        self.starts = []
+        self.longest = 0
+
+
+class PortfolioScheduler:
+    """Thread-safe index of every planned engagement and staff booking.
+
+    ``capacity`` is how many engagements a person may work on the same day.
+    """
+
+    def __init__(self, default_capacity=DEFAULT_CAPACITY,
+                 horizon_start=HORIZON_START, horizon_end=HORIZON_END):
+        self.default_capacity = default_capacity
+        self._lo = horizon_start.toordinal()
+        self._hi = horizon_end.toordinal()
+        self._engagements = {}
+        self._calendars = {}
+        self._capacity = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._engagements)
+
+    def get(self, engagement_id):
+        return self._engagements.get(engagement_id)
+
+    def set_capacity(self, staff, capacity):
+        with self._lock:
+            self._capacity[staff] = capacity
+
+    def capacity(self, staff):
+        return self._capacity.get(staff, self.default_capacity)
+
+    def save(self, engagement_id, company_name, start, end, staff):
+        """Add or replace an engagement and return the conflicts it causes.
+
+        Re-saving an id only moves that engagement's own bookings.
+        """
+        engagement = Engagement(engagement_id, company_name, start, end, staff)
+        self._check_horizon(start, end)
+        with self._lock:
+            if engagement_id in self._engagements:
+                self._unbook(self._engagements[engagement_id])
+            self._engagements[engagement_id] = engagement
+            self._book(engagement)
+            return self.conflicts(engagement.staff, start, end, allowed_extra=0)
+
+    def save_many(self, engagements):
+        """Bulk-load ``(id, company, start, end, staff)`` tuples."""
+        with self._lock:
+            for engagement_id, company_name, start, end, staff in engagements:
+                engagement = Engagement(engagement_id, company_name, start, end, staff)
+                self._check_horizon(start, end)
+                if engagement_id in self._engagements:
+                    self._unbook(self._engagements[engagement_id])
+                self._engagements[engagement_id] = engagement
+                self._book(engagement)
+
+    def remove(self, engagement_id):
+        with self._lock:
+            engagement = self._engagements.pop(engagement_id, None)
+            if engagement is not None:
+                self._unbook(engagement)
+            return engagement is not None
+
+    def conflicts(self, staff, start, end, exclude=None, allowed_extra=1):
+        """Return a ``StaffConflict`` for each person who cannot take the window.
+
+        With the default ``allowed_extra=1`` this answers "can these people
+        take one more engagement from ``start`` to ``end``?". Pass
+        ``allowed_extra=0`` to report people who are already overloaded.
+        Bookings of the ``exclude`` engagement are ignored, so an engagement
+        being edited does not conflict with itself.
+        """
+        self._check_horizon(start, end)
+        first, last = start.toordinal(), end.toordinal() + 1
+        excluded = self._engagements.get(exclude)
+        found = []
+        with self._lock:
+            for name in dict.fromkeys(s for s in staff if s):
+                calendar = self._calendars.get(name)
+                if calendar is None:
+                    continue
+                own = 1 if excluded is not None and name in excluded.staff else 0
+                if own:
+                    calendar.load.update(excluded.start.toordinal(), excluded.end.toordinal() + 1, -1)
+                try:
+                    threshold = self.capacity(name) - allowed_extra + 1
+                    day = calendar.load.first_at_least(first, last, threshold)
+                    if day is None:
+                        continue
+                    peak = calendar.load.max_load(first, last)
+                finally:
+                    if own:
+                        calendar.load.update(excluded.start.toordinal(), excluded.end.toordinal() + 1, 1)
+                overlapping = [
+                    engagement_id for engagement_id in self._overlapping(calendar, first, last)
+                    if engagement_id != exclude
+                ]
+                found.append(StaffConflict(
+                    name, datetime.date.fromordinal(day), peak, self.capacity(name), overlapping
+                ))
+        return found
+
+    def propose_start(self, staff, days, earliest, latest=None, exclude=None):
+        """Return the first start date on or after ``earliest`` that fits everyone.
+
+        The engagement lasts ``days`` calendar days. Returns ``None`` when no
+        date up to ``latest`` (default: the end of the horizon) works.
+        """
+        staff = [name for name in dict.fromkeys(staff) if name]
+        candidate = earliest.toordinal()
+        last_start = (latest.toordinal() if latest else self._hi - days)
+        while candidate <= last_start:
+            window_end = datetime.date.fromordinal(candidate + days - 1)
+            found = self.conflicts(staff, datetime.date.fromordinal(candidate), window_end, exclude=exclude)
+            if not found:
+                return datetime.date.fromordinal(candidate)
+            # Jump past the latest blocking day among everyone who conflicts.
+            candidate = max(conflict.first_day.toordinal() for conflict in found) + 1
+        return None
+
+    def staff_engagements(self, staff):
+        """Return the ids of every engagement ``staff`` is booked on, by start date."""
+        calendar = self._calendars.get(staff)
+        return [engagement_id for _, engagement_id in calendar.starts] if calendar else []
+
+    def _overlapping(self, calendar, first, last):
+        # Bookings overlapping [first, last) start before ``last`` and no
+        # earlier than ``first - longest``.
+        lo = bisect.bisect_left(calendar.starts, (first - calendar.longest, ""))
+        hi = bisect.bisect_left(calendar.starts, (last, ""))
+        result = []
+        for start, engagement_id in calendar.starts[lo:hi]:
+            engagement = self._engagements[engagement_id]
+            if engagement.end.toordinal() + 1 > first:
+                result.append(engagement_id)
+        return result
+
+    def _book(self, engagement):
+        first, last = engagement.start.toordinal(), engagement.end.toordinal() + 1
+        for name in engagement.staff:
+            calendar = self._calendars.get(name)
+            if calendar is None:
+                calendar = self._calendars[name] = _StaffCalendar(self._lo, self._hi)
+            calendar.load.update(first, last, 1)
+            bisect.insort(calendar.starts, (first, engagement.id))
+            calendar.longest = max(calendar.longest, last - first)
+
+    def _unbook(self, engagement):
+        first, last = engagement.start.toordinal(), engagement.end.toordinal() + 1
+        for name in engagement.staff:
+            calendar = self._calendars[name]
+            calendar.load.update(first, last, -1)
+            index = bisect.bisect_left(calendar.starts, (first, engagement.id))
+            if index < len(calendar.starts) and calendar.starts[index] == (first, engagement.id):
+                del calendar.starts[index]
+
+    def _check_horizon(self, start, end):
+        if start.toordinal() < self._lo or end.toordinal() >= self._hi:
+            raise ValueError(f"Engagement dates must fall between {HORIZON_START} and {HORIZON_END}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(load=None):
+    """Return the process-wide portfolio scheduler shared by all sessions.
+
+    ``load`` returns the ``(id, company, start, end, staff)`` bookings to start
+    from. It is only called when the scheduler is created; bookings outside
+    the calendar horizon are left out.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = PortfolioScheduler()
+                if load is not None:
+                    scheduler.save_many(
+                        booking for booking in load()
+                        if HORIZON_START <= booking[2] and booking[3] < HORIZON_END
+                    )
+                _scheduler = scheduler
+    return _scheduler
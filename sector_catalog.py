@@ -0,0 +1,219 @@
+"""Sector template catalog loaded from the ``sectors/`` data directory.
+
+Every ``*.json`` file in the catalog directory holds either a single sector
+template or ``{"sectors": [...]}``. A template has a ``name``, ``objectives``,
+``scope`` and ``risks`` keyed by ``High``/``Medium``/``Low``. Sub-sector
+templates may name a ``parent`` and inherit any field they leave out.
+``risk_criteria.json`` holds ``RISK_ASSESSMENT_CRITERIA``.
+
+Templates are compiled once into read-only mappings and tuples that every
+session shares. ``get_catalog`` reloads the directory when file mtimes
+change. A reload builds a new catalog and swaps the reference, so renders
+already holding the previous catalog are never disturbed.
+"""
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
+CATALOG_DIR = os.environ.get(
+    "AUDIT_SECTOR_CATALOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sectors")
+)
+RISK_CRITERIA_FILE = "risk_criteria.json"
+RISK_LEVELS = ("High", "Medium", "Low")
+TEMPLATE_FIELDS = ("objectives", "scope", "risks")
+RELOAD_CHECK_INTERVAL = 2.0
+
+
+class CatalogError(ValueError):
+    """Raised when the sector catalog files are malformed."""
+
+
+class SectorCatalog:
+    """Immutable, indexed view over a set of compiled sector templates."""
+
+    def __init__(self, sectors, risk_criteria, version=None):
+        self.sectors = MappingProxyType(sectors)
+        self.risk_criteria = risk_criteria
+        self.version = version
+
+        by_level = {level: {} for level in RISK_LEVELS}
+        by_risk = {}
+        for sector_name, template in sectors.items():
+            for level in RISK_LEVELS:
+                for risk in template["risks"][level]:
+                    by_level[level].setdefault(risk, []).append(sector_name)
+                    by_risk.setdefault(risk.casefold(), []).append((sector_name, level))
+        self._by_level = MappingProxyType({
+            level: MappingProxyType({risk: tuple(names) for risk, names in risks.items()})
+            for level, risks in by_level.items()
+        })
+        self._by_risk = MappingProxyType({risk: tuple(hits) for risk, hits in by_risk.items()})
+
+    def __contains__(self, sector_name):
+        return sector_name in self.sectors
+
+    def __len__(self):
+        return len(self.sectors)
+
+    def names(self):
+        """Return sector names in catalog order."""
+        return tuple(self.sectors)
+
+    def get(self, sector_name):
+        """Return the compiled template for ``sector_name`` or ``None``."""
+        return self.sectors.get(sector_name)
+
+    def risks_at_level(self, level):
+        """Return a mapping of risk name to the sectors rating it at ``level``."""
+        return self._by_level[level]
+
+    def sectors_with_risk(self, risk_name):
+        """Return ``(sector, level)`` pairs for every sector listing ``risk_name``."""
+        return self._by_risk.get(risk_name.casefold(), ())
+
+
+def _freeze_template(template):
+    risks = template["risks"]
+    missing = [level for level in RISK_LEVELS if level not in risks]
+    if missing:
+        raise CatalogError(f"Sector {template['name']!r} is missing risk levels: {', '.join(missing)}")
+    return MappingProxyType({
+        "name": template["name"],
+        "parent": template.get("parent"),
+        "objectives": tuple(template["objectives"]),
+        "scope": tuple(template["scope"]),
+        "risks": MappingProxyType({level: tuple(risks[level]) for level in RISK_LEVELS}),
+    })
+
+
+def compile_templates(raw_templates):
+    """Resolve sub-sector inheritance and freeze every template."""
+    raw = {}
+    for template in raw_templates:
+        name = template.get("name")
+        if not name:
+            raise CatalogError("Sector template without a name")
+        if name in raw:
+            raise CatalogError(f"Duplicate sector template: {name!r}")
+        raw[name] = template
+
+    resolved = {}
+
+    def resolve(name, chain=()):
+        if name in resolved:
+            return resolved[name]
+        if name in chain:
+            raise CatalogError(f"Cyclic sector inheritance: {' -> '.join(chain + (name,))}")
+        if name not in raw:
+            raise CatalogError(f"Unknown parent sector: {name!r}")
+        template = dict(raw[name])
+        parent_name = template.get("parent")
+        if parent_name:
+            parent = resolve(parent_name, chain + (name,))
+            for field in TEMPLATE_FIELDS:
+                template.setdefault(field, parent[field])
+        for field in TEMPLATE_FIELDS:
+            if field not in template:
+                raise CatalogError(f"Sector {name!r} is missing {field!r}")
+        resolved[name] = _freeze_template(template)
+        return resolved[name]
+
+    # Resolve in file order so the catalog keeps the order sectors were written in.
+    return {name: resolve(name) for name in raw}
+
+
+def _catalog_files(directory):
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.endswith(".json") and name != RISK_CRITERIA_FILE
+    )
+
+
+def catalog_signature(directory=CATALOG_DIR):
+    """Return a cheap fingerprint of the catalog files' names, sizes and mtimes."""
+    signature = []
+    for name in _catalog_files(directory) + [RISK_CRITERIA_FILE]:
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def load_catalog(directory=CATALOG_DIR):
+    """Read and compile every template file in ``directory``."""
+    raw_templates = []
+    for name in _catalog_files(directory):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise CatalogError(f"{name}: {e}") from e
+        raw_templates.extend(data["sectors"] if "sectors" in data else [data])
+
+    criteria_path = os.path.join(directory, RISK_CRITERIA_FILE)
+    risk_criteria = {}
+    if os.path.exists(criteria_path):
+        with open(criteria_path, encoding="utf-8") as f:
+            risk_criteria = json.load(f)
+    risk_criteria = MappingProxyType({
+        level: MappingProxyType(dict(criteria)) for level, criteria in risk_criteria.items()
+    })
+    return SectorCatalog(
+        compile_templates(raw_templates),
+        risk_criteria,
+        version=catalog_signature(directory)
+    )
+
+
+class CatalogLoader:
+    """Holds the current catalog and hot-reloads it when the files change."""
+
+    def __init__(self, directory=CATALOG_DIR, check_interval=RELOAD_CHECK_INTERVAL):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._catalog = load_catalog(directory)
+        self._checked_at = time.monotonic()
+
+    def get(self):
+        """Return the current catalog, reloading it first if the files changed."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval and self._lock.acquire(blocking=False):
+            # Only one thread checks; the others keep serving the current catalog.
+            try:
+                self._checked_at = now
+                if catalog_signature(self.directory) != self._catalog.version:
+                    self._reload()
+            finally:
+                self._lock.release()
+        return self._catalog
+
+    def _reload(self):
+        try:
+            catalog = load_catalog(self.directory)
+        except (OSError, KeyError, TypeError, ValueError) as e:
+            # Keep serving the last good catalog until the files are fixed.
+            self.last_error = e
+            return
+        self.last_error = None
+        self._catalog = catalog
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the process-wide sector catalog."""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = CatalogLoader()
+    return _loader.get()
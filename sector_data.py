@@ -1,98 +1,12 @@
-SECTOR_AUDIT_PLANS = {
-    "Technology": {
-        "objectives": [
-            "Evaluate cybersecurity measures and data protection protocols",
-            "Assess software development lifecycle and quality control",
-            "Review IT infrastructure and system reliability",
-            "Examine intellectual property management"
-        ],
-        "scope": [
-            "Information security systems",
-            "Software development processes",
-            "IT infrastructure",
-            "Data management and privacy",
-            "Intellectual property controls"
-        ],
-        "risks": {
-            "High": [
-                "Data breaches and cybersecurity vulnerabilities",
-                "Intellectual property theft",
-                "System downtime and reliability issues"
-            ],
-            "Medium": [
-                "Software quality control deficiencies",
-                "Regulatory compliance gaps",
-                "Third-party vendor management"
-            ],
-            "Low": [
-                "Documentation inconsistencies",
-                "Minor process inefficiencies",
-                "Training program gaps"
-            ]
-        }
-    },
-    "Financial Services": {
-        "objectives": [
-            "Verify compliance with financial regulations",
-            "Assess risk management practices",
-            "Evaluate internal controls",
-            "Review financial reporting accuracy"
-        ],
-        "scope": [
-            "Regulatory compliance",
-            "Risk management systems",
-            "Internal control framework",
-            "Financial reporting processes",
-            "Anti-fraud measures"
-        ],
-        "risks": {
-            "High": [
-                "Regulatory non-compliance",
-                "Fraud risk",
-                "Financial misstatement"
-            ],
-            "Medium": [
-                "Operational inefficiencies",
-                "System access controls",
-                "Data quality issues"
-            ],
-            "Low": [
-                "Documentation gaps",
-                "Minor policy deviations",
-                "Training needs"
-            ]
-        }
-    },
-    "Manufacturing": {
-        "objectives": [
-            "Evaluate production efficiency and quality control",
-            "Assess supply chain management",
-            "Review safety and compliance measures",
-            "Examine inventory management"
-        ],
-        "scope": [
-            "Production processes",
-            "Quality control systems",
-            "Supply chain operations",
-            "Inventory management",
-            "Safety compliance"
-        ],
-        "risks": {
-            "High": [
-                "Quality control failures",
-                "Safety violations",
-                "Supply chain disruptions"
-            ],
-            "Medium": [
-                "Inventory management issues",
-                "Production inefficiencies",
-                "Equipment maintenance"
-            ],
-            "Low": [
-                "Documentation gaps",
-                "Minor process deviations",
-                "Training program updates"
-            ]
-        }
-    }
-} 
\ No newline at end of file
+"""Sector-specific audit data.
+
+Kept for backwards compatibility: the sector templates and risk criteria now
+live in the ``sectors/`` catalog (see ``sector_catalog``). These names are a
+snapshot of the catalog taken at import time.
+"""
+from sector_catalog import get_catalog
+
+_catalog = get_catalog()
+
+SECTOR_AUDIT_PLANS = _catalog.sectors
+RISK_ASSESSMENT_CRITERIA = _catalog.risk_criteria
@@ -0,0 +1,55 @@
+"""Engagement team rosters: bulk import and paging for large teams."""
+import csv
+import io
+
+NAME_COLUMNS = ("name", "member", "team_member", "staff", "auditor")
+PAGE_SIZE = 50
+
+
+def read_roster_names(data, filename):
+    """Return the member names from a CSV or Parquet roster.
+
+    ``data`` is the file's bytes (or a binary file object). The names come
+    from the first column whose header matches ``NAME_COLUMNS``, falling back
+    to the first column. Blank names are skipped.
+    """
+    if hasattr(data, "read"):
+        data = data.read()
+    if filename.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(data))
+        column = _name_column(table.column_names)
+        values = table.column(column).to_pylist()
+    else:
+        reader = csv.reader(io.StringIO(data.decode("utf-8-sig")))
+        header = next(reader, [])
+        column = _name_column(header)
+        index = header.index(column) if column in header else 0
+        values = [row[index] if index < len(row) else "" for row in reader]
+    return [str(value).strip() for value in values if value is not None and str(value).strip()]
+
+
+def _name_column(columns):
+    for column in columns:
+        if column.strip().lower() in NAME_COLUMNS:
+            return column
+    if not columns:
+        raise ValueError("The roster file has no columns")
+    return columns[0]
+
+
+def resize_roster(names, size):
+    """Return ``names`` padded with blanks or truncated to ``size`` entries."""
+    names = list(names[:size])
+    names.extend([""] * (size - len(names)))
+    return names
+
+
+def page_count(size, page_size=PAGE_SIZE):
+    return max(1, -(-size // page_size))
+
+
+def page_bounds(page, size, page_size=PAGE_SIZE):
+    """Return the ``[start, end)`` roster slice for a 1-based ``page``."""
+    start = (page - 1) * page_size
+    return start, min(start + page_size, size)